@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import rasterio as rio
+from file_manager.file_discovery import split_vsizip_path
+
+
+class DatasetPool:
+    """
+    Bounded LRU pool of open rasterio dataset handles.
+
+    Handles are keyed by absolute path and mode, so stages that open the same
+    file one after another (schema update, validation, projection, resampling)
+    share one open instead of paying a metadata round-trip each. A handle is
+    reopened when its file changed on disk (size or mtime; for members of zip
+    archives, their archive) or when it was closed by its user, and handles of
+    a path are closed before it is written.
+
+    The pool is process-wide; handles must not be used from several threads
+    at the same time.
+
+    Attributes
+    ----------
+    max_size : int
+        Maximum number of open handles kept in the pool.
+    hits : int
+        Number of requests served by an open handle.
+    misses : int
+        Number of requests that had to open the file.
+    evictions : int
+        Number of handles closed to keep the pool within max_size.
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._handles = OrderedDict()  # (path, mode) : (dataset, file signature)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(path: str, mode: str) -> tuple:
+        # GDAL virtual file system paths (/vsimem, /vsizip, ...) are kept as they are
+        return (path if path.startswith("/vsi") else os.path.abspath(path), mode)
+
+    @staticmethod
+    def _signature(path: str):
+        # archive members change whenever their archive is rewritten
+        archive, _ = split_vsizip_path(path)
+        try:
+            stat = os.stat(archive if archive is not None else path)
+            return (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            # not a local file; rely on explicit invalidation
+            return None
+
+    def get(self, path: str, mode: str = "r"):
+        """
+        Get an open dataset handle, opening the file on a miss.
+
+        Opening a path in "r+" closes its "r" handles and vice versa, so reads
+        never see a stale copy of a file being updated in place.
+
+        Parameters
+        ----------
+        path : str
+            Path to the raster file.
+        mode : str
+            "r" or "r+".
+
+        Returns
+        -------
+        rio.DatasetReader
+            The pooled handle. Callers must not close it.
+        """
+        if mode not in ("r", "r+"):
+            raise ValueError(f"Dataset pool only holds 'r' and 'r+' handles, not '{mode}'")
+        key = self._key(path, mode)
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is not None:
+                dataset, signature = entry
+                if not dataset.closed and signature == self._signature(path):
+                    self._handles.move_to_end(key)
+                    self.hits += 1
+                    return dataset
+                self._close(key)
+
+            # close handles of the same file in the other mode
+            self._close((key[0], "r+" if mode == "r" else "r"))
+            dataset = rio.open(path, mode)
+            self.misses += 1
+            self._handles[key] = (dataset, self._signature(path))
+            while len(self._handles) > self.max_size:
+                self._close(next(iter(self._handles)))
+                self.evictions += 1
+            return dataset
+
+    @contextmanager
+    def open(self, path: str, mode: str = "r"):
+        """
+        Context manager form of get(). The handle stays open in the pool on exit.
+        """
+        yield self.get(path, mode)
+
+    def _close(self, key: tuple) -> None:
+        entry = self._handles.pop(key, None)
+        if entry is not None and not entry[0].closed:
+            entry[0].close()
+
+    def invalidate(self, path: str) -> None:
+        """
+        Close and drop the handles of a file, or of every file under a directory.
+
+        Call this before a file is written, moved or deleted.
+
+        Parameters
+        ----------
+        path : str
+            Path to a raster file or directory.
+        """
+        path = self._key(path, "r")[0]
+        prefix = path.rstrip("/\\") + os.sep
+        with self._lock:
+            for key in [key for key in self._handles if key[0] == path or key[0].startswith(prefix)]:
+                self._close(key)
+
+    def clear(self) -> None:
+        """
+        Close all handles.
+        """
+        with self._lock:
+            for key in list(self._handles):
+                self._close(key)
+
+    def stats(self) -> dict:
+        """
+        Get hit and miss counts of the pool.
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "open_handles": len(self._handles),
+                    "hit_rate": self.hits / requests if requests else None}
+
+
+# process-wide pool shared by the pipeline stages
+dataset_pool = DatasetPool()
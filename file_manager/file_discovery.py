@@ -0,0 +1,304 @@
+import os
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from fnmatch import fnmatch
+
+
+# default patterns for raster files, matched case-insensitively (.tif, .TIF, .tiff)
+TIFF_PATTERNS = ("*.tif", "*.tiff")
+
+# archives read in place through GDAL's virtual zip file system
+ARCHIVE_SUFFIXES = (".zip",)
+
+
+@dataclass(frozen=True)
+class RasterFileEntry:
+    """
+    A raster file found during discovery.
+
+    Attributes
+    ----------
+    path : str
+        Full path to the file. Archive members have a GDAL /vsizip/ path.
+    root : str
+        The root directory (or archive) the file was discovered under.
+    size : int
+        File size in bytes (uncompressed size for archive members).
+    mtime : float
+        Last modification time (seconds since epoch).
+    rel_path : str
+        Path of the file relative to its discovery root.
+    """
+    path: str
+    root: str
+    size: int
+    mtime: float
+    rel_path: str
+
+    @property
+    def name(self) -> str:
+        """File name including extension."""
+        return os.path.basename(self.path)
+
+    @property
+    def is_virtual(self) -> bool:
+        """Whether the file is read through a GDAL virtual file system."""
+        return self.path.startswith("/vsi")
+
+
+@dataclass
+class _Inventory:
+    # cached scan result of a single root
+    entries: list
+    dir_mtimes: dict  # directory (or archive) path : st_mtime_ns at scan time
+
+
+# maximum number of root inventories kept, least recently used ones are dropped first
+MAX_CACHED_INVENTORIES = 256
+
+# process-wide inventory cache: (root, include, exclude, recursive) : _Inventory
+_inventory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _matches(name: str, patterns: tuple) -> bool:
+    """Case-insensitive match of a file name against any of the patterns."""
+    name = name.lower()
+    return any(fnmatch(name, pattern.lower()) for pattern in patterns)
+
+
+def _scan_dir(dir_path: str, root: str, include: tuple, exclude: tuple) -> tuple:
+    """
+    Scan a single directory with os.scandir.
+
+    Returns
+    -------
+    tuple
+        (directory mtime_ns, matching file entries, sub-directory paths)
+    """
+    files, sub_dirs = [], []
+    dir_mtime = os.stat(dir_path).st_mtime_ns
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if _matches(entry.name, exclude):
+                continue
+            # symlinked directories are not followed, they may point back up the tree
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            elif entry.is_file() and _matches(entry.name, include):
+                stat = entry.stat()
+                files.append(RasterFileEntry(entry.path, root, stat.st_size, stat.st_mtime,
+                                             os.path.relpath(entry.path, root)))
+    return dir_mtime, files, sub_dirs
+
+
+def split_archive_path(root: str) -> tuple:
+    """
+    Split a root that points into a zip archive, e.g. 'drive-download.zip/ept_NY5023/canopy_metrics',
+    into the archive path and the directory inside the archive.
+
+    Returns
+    -------
+    tuple
+        (archive path, inner directory) or (None, None) if the root is not inside an archive.
+    """
+    parts = root.replace("\\", "/").split("/")
+    for index in range(1, len(parts) + 1):
+        candidate = "/".join(parts[:index])
+        if candidate.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(candidate):
+            return candidate, "/".join(part for part in parts[index:] if part)
+    return None, None
+
+
+def split_vsizip_path(path: str) -> tuple:
+    """
+    Split a /vsizip/ path produced by discovery into the archive path and the member name.
+
+    Returns
+    -------
+    tuple
+        (archive path, member name) or (None, None) if the path is not a /vsizip/ path.
+    """
+    if not path.startswith("/vsizip/"):
+        return None, None
+    return split_archive_path(path[len("/vsizip"):])
+
+
+def file_signature(path: str) -> list:
+    """
+    Signature that changes whenever the content of a file changes: [size, mtime_ns]
+    for regular files and [size, CRC-32] for archive members, so that adding a
+    member to an archive does not mark its other members as changed.
+    """
+    archive, member = split_vsizip_path(path)
+    if archive is None:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    with zipfile.ZipFile(archive) as zip_file:
+        info = zip_file.getinfo(member)
+    return [info.file_size, info.CRC]
+
+
+def _scan_archive(root: str, archive: str, inner: str, include: tuple, exclude: tuple,
+                  recursive: bool) -> tuple:
+    """
+    List the matching members of a zip archive without extracting them.
+
+    Returns
+    -------
+    tuple
+        (archive mtime_ns, matching file entries with /vsizip/ paths)
+    """
+    archive_mtime = os.stat(archive).st_mtime_ns
+    vsi_prefix = "/vsizip/" + os.path.abspath(archive).replace("\\", "/") + "/"
+    prefix = inner + "/" if inner else ""
+    files = []
+    with zipfile.ZipFile(archive) as zip_file:
+        for info in zip_file.infolist():
+            if info.is_dir() or not info.filename.startswith(prefix):
+                continue
+            rel_path = info.filename[len(prefix):]
+            components = rel_path.split("/")
+            if not recursive and len(components) > 1:
+                continue
+            if any(_matches(component, exclude) for component in components):
+                continue
+            if _matches(components[-1], include):
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                files.append(RasterFileEntry(vsi_prefix + info.filename, root, info.file_size, mtime, rel_path))
+    return archive_mtime, files
+
+
+def _scan_roots(roots: list[str], include: tuple, exclude: tuple,
+                recursive: bool, max_workers: int) -> dict:
+    """
+    Scan roots concurrently. Every directory and archive, across all roots, is its
+    own task so trees with many site folders are spread over the whole thread pool.
+    """
+    inventories = {root: _Inventory([], {}) for root in roots}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for root in roots:
+            archive, inner = split_archive_path(root)
+            if archive is not None:
+                future = executor.submit(_scan_archive, root, archive, inner, include, exclude, recursive)
+                pending[future] = (root, archive)
+            else:
+                pending[executor.submit(_scan_dir, root, root, include, exclude)] = (root, root)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root, dir_path = pending.pop(future)
+                result = future.result()
+                # archives come back as (mtime, files), directories also list their sub-directories
+                dir_mtime, files = result[:2]
+                inventories[root].dir_mtimes[dir_path] = dir_mtime
+                inventories[root].entries.extend(files)
+                if recursive and len(result) == 3:
+                    for sub_dir in result[2]:
+                        future = executor.submit(_scan_dir, sub_dir, root, include, exclude)
+                        pending[future] = (root, sub_dir)
+    for inventory in inventories.values():
+        inventory.entries.sort(key=lambda e: e.path)
+    return inventories
+
+
+def _is_fresh(inventory: _Inventory) -> bool:
+    """Check that no directory of a cached inventory changed since it was scanned."""
+    try:
+        return all(os.stat(dir_path).st_mtime_ns == mtime
+                   for dir_path, mtime in inventory.dir_mtimes.items())
+    except OSError:
+        return False
+
+
+def discover_files(roots: list[str], include: tuple = TIFF_PATTERNS, exclude: tuple = (),
+                   recursive: bool = True, max_workers: int = None) -> list[RasterFileEntry]:
+    """
+    Discover files under one or more root directories.
+
+    Roots are scanned recursively and in parallel with os.scandir. A root may also
+    be a zip archive, or a directory inside one ('sites.zip/ept_NY5023'); its
+    members are listed without extraction and get /vsizip/ paths that rasterio
+    reads in place. Symlinked directories are not followed. Results are
+    cached per root and reused until the mtime of any scanned directory changes,
+    so repeated listings of the same directory within (or across) pipeline
+    stages cost one stat per directory instead of a full scan. At most
+    MAX_CACHED_INVENTORIES inventories are kept, least recently used first out.
+
+    Parameters
+    ----------
+    roots : list[str]
+        Directories or zip archives to scan.
+    include : tuple
+        Glob patterns of file names to keep (case-insensitive).
+    exclude : tuple
+        Glob patterns of file or directory names to skip (case-insensitive).
+    recursive : bool
+        Descend into sub-directories.
+    max_workers : int
+        Number of scanning threads (defaults to the ThreadPoolExecutor default).
+
+    Returns
+    -------
+    list[RasterFileEntry]
+        Entries of all matching files, grouped by root in the given order.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a root directory or archive cannot be accessed.
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    include, exclude = tuple(include), tuple(exclude)
+    for root in roots:
+        if not os.path.isdir(root) and split_archive_path(root)[0] is None:
+            raise FileNotFoundError(f"Error accessing directory: {root}")
+
+    inventories, stale = {}, []
+    with _cache_lock:
+        for root in roots:
+            key = (root, include, exclude, recursive)
+            inventory = _inventory_cache.get(key)
+            if inventory is not None and _is_fresh(inventory):
+                _inventory_cache.move_to_end(key)
+                inventories[root] = inventory
+            else:
+                # stale or vanished roots are dropped rather than kept around
+                _inventory_cache.pop(key, None)
+                if root not in stale:
+                    stale.append(root)
+
+    if stale:
+        scanned = _scan_roots(stale, include, exclude, recursive, max_workers)
+        with _cache_lock:
+            for root, inventory in scanned.items():
+                _inventory_cache[(root, include, exclude, recursive)] = inventory
+            while len(_inventory_cache) > MAX_CACHED_INVENTORIES:
+                _inventory_cache.popitem(last=False)
+        inventories.update(scanned)
+
+    return [entry for root in roots for entry in inventories[root].entries]
+
+
+def invalidate_inventory(root: str = None) -> None:
+    """
+    Drop cached inventories.
+
+    Directory mtimes do not change when a file is rewritten in place, so stages
+    that overwrite files should invalidate the root if they need fresh sizes.
+
+    Parameters
+    ----------
+    root : str, optional
+        Root whose inventories are dropped. All inventories are dropped if None.
+    """
+    with _cache_lock:
+        for key in list(_inventory_cache):
+            if root is None or key[0] == root:
+                del _inventory_cache[key]
@@ -0,0 +1,193 @@
+import os
+import uuid
+import numpy as np
+from dataclasses import dataclass, field
+import rasterio.shutil as rio_shutil
+from file_manager.dataset_pool import dataset_pool
+from file_manager.transfer_engine import TransferEngine, temporary_path
+from raster_metadata.band_statistics import (read_stats_sidecar, write_stats_sidecar, discard_stats_sidecar,
+                                             compute_statistics)
+
+
+# intermediates up to this many (uncompressed) bytes are kept in memory
+DEFAULT_MEMORY_THRESHOLD = 256 * 1024 ** 2
+
+
+def is_virtual_path(path: str) -> bool:
+    """Check whether a path is on a GDAL virtual file system (/vsimem, /vsizip, ...)."""
+    return path.startswith("/vsi")
+
+
+def raster_nbytes(path: str) -> int:
+    """Uncompressed size in bytes of the data of all bands of a raster, read from its header."""
+    with dataset_pool.open(path) as src:
+        itemsize = max(np.dtype(dtype).itemsize for dtype in src.dtypes)
+        return src.width * src.height * src.count * itemsize
+
+
+@dataclass
+class IntermediateStore:
+    """
+    Storage for intermediate rasters passed between pipeline stages.
+
+    Intermediates up to `memory_threshold` bytes live in GDAL's in-memory file
+    system (/vsimem) and larger ones spill to `spill_dir`, so most variables
+    never make a disk round-trip between stitching, validation and warping.
+    Stages read and write the returned paths with rasterio as usual.
+
+    Attributes
+    ----------
+    spill_dir : str
+        Directory receiving intermediates above the memory threshold.
+    memory_threshold : int
+        Uncompressed size in bytes up to which an intermediate is kept in memory.
+
+    Methods
+    -------
+    path_for(name: str, nbytes: int) -> str:
+        Reserve the path of a new intermediate of (about) nbytes uncompressed bytes.
+    add_file(src_path: str) -> str:
+        Bring an existing raster file into the store.
+    add_files(src_paths: list[str], engine: TransferEngine = None) -> list[str]:
+        Bring existing raster files into the store in parallel.
+    move_all(dest_dir: str, engine: TransferEngine = None) -> None:
+        Materialise all intermediates in a destination directory.
+    cleanup() -> None:
+        Delete all in-memory intermediates.
+    """
+
+    spill_dir: str
+    memory_threshold: int = DEFAULT_MEMORY_THRESHOLD
+    _entries: dict = field(init=False, default_factory=dict)  # file name : path
+    _memory_dir: str = field(init=False, default_factory=lambda: f"/vsimem/intermediate_{uuid.uuid4().hex}")
+
+    def path_for(self, name: str, nbytes: int) -> str:
+        """
+        Reserve the path of a new intermediate.
+
+        Parameters
+        ----------
+        name : str
+            File name of the intermediate, e.g. 'agb.tif'.
+        nbytes : int
+            Expected uncompressed size of the data of the intermediate in bytes.
+
+        Returns
+        -------
+        str
+            A /vsimem path if nbytes is within the memory threshold, otherwise a
+            path in the spill directory.
+        """
+        if name in self._entries:
+            self.remove(name)
+        if nbytes <= self.memory_threshold:
+            path = f"{self._memory_dir}/{name}"
+        else:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, name)
+        self._entries[name] = path
+        return path
+
+    def add_file(self, src_path: str) -> str:
+        """
+        Copy an existing raster file (and its statistics sidecar) into the store; see add_files().
+        """
+        return self.add_files([src_path])[0]
+
+    def add_files(self, src_paths: list[str], engine: TransferEngine = None) -> list[str]:
+        """
+        Copy existing raster files (and their statistics sidecars) into the store.
+        Whether a file is kept in memory depends on the uncompressed size of its
+        data, as for every other intermediate, not on its size on disk.
+
+        The files are copied in parallel by the transfer engine, so reading
+        many inputs from slow or network storage overlaps.
+
+        Parameters
+        ----------
+        src_paths : list[str]
+            Paths of the raster files, possibly on a GDAL virtual file system (e.g. /vsizip).
+        engine : TransferEngine, optional
+            Engine copying the files (default settings if None).
+
+        Returns
+        -------
+        list[str]
+            Paths of the copies in the store, in the order of src_paths.
+        """
+        paths = [self.path_for(os.path.basename(src_path), raster_nbytes(src_path)) for src_path in src_paths]
+        # a later file of the same name replaces an earlier one, as when copied one after another
+        jobs = [(src_path, path) for path, src_path in dict(zip(paths, src_paths)).items()]
+        if jobs:
+            (engine or TransferEngine()).copy(jobs)
+        for src_path, path in jobs:
+            stats = read_stats_sidecar(src_path)
+            if stats is not None:
+                write_stats_sidecar(path, stats)
+        return paths
+
+    def paths(self) -> list[str]:
+        """Paths of all intermediates."""
+        return list(self._entries.values())
+
+    def remove(self, name: str) -> None:
+        """Delete an intermediate."""
+        path = self._entries.pop(name)
+        dataset_pool.invalidate(path)
+        discard_stats_sidecar(path)
+        if is_virtual_path(path):
+            if rio_shutil.exists(path):
+                rio_shutil.delete(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def move_all(self, dest_dir: str, engine: TransferEngine = None) -> None:
+        """
+        Materialise all intermediates (with their statistics sidecars) in a
+        destination directory and remove them from the store.
+
+        Every raster is written under a temporary name and renamed into place,
+        so no partial raster is ever visible in dest_dir. Spilled intermediates
+        are moved in parallel by the transfer engine. Rasters that were brought
+        in without statistics (e.g. inputs that already conform) get them here,
+        so every final raster has its sidecar without a separate QA pass.
+
+        Parameters
+        ----------
+        dest_dir : str
+            The path to the destination directory.
+        engine : TransferEngine, optional
+            Engine moving the spilled intermediates (default settings if None).
+        """
+        spilled = []
+        for name, path in list(self._entries.items()):
+            dest_path = os.path.join(dest_dir, name)
+            dataset_pool.invalidate(path)
+            dataset_pool.invalidate(dest_path)
+            if read_stats_sidecar(path) is None:
+                compute_statistics(path)
+            if is_virtual_path(path):
+                tmp_path = temporary_path(dest_path)
+                rio_shutil.copyfiles(path, tmp_path)
+                os.replace(tmp_path, dest_path)
+            else:
+                spilled.append((path, dest_path))
+        if spilled:
+            (engine or TransferEngine()).move(spilled)
+
+        for name, path in list(self._entries.items()):
+            stats = read_stats_sidecar(path)
+            if stats is not None:
+                write_stats_sidecar(os.path.join(dest_dir, name), stats)
+            self.remove(name)
+
+    def cleanup(self) -> None:
+        """Delete all remaining intermediates."""
+        for name in list(self._entries):
+            self.remove(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
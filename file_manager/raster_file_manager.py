@@ -1,6 +1,9 @@
 import os 
-import shutil
 from dataclasses import dataclass, field
+from file_manager.file_discovery import discover_files, RasterFileEntry, TIFF_PATTERNS
+from file_manager.transfer_engine import TransferEngine, DEFAULT_STREAMS, DEFAULT_BUFFER_SIZE, print_progress
+from raster_metadata.band_statistics import stats_sidecar_path
+from file_manager.dataset_pool import dataset_pool
 
     
 
@@ -15,14 +18,28 @@ class RasterFileManager:
     Attributes
     ----------
     raster_file_dir : str
-        The path to the directory containing raster files.
+        The path to the directory containing raster files. May also be a zip
+        archive, or a directory inside one, whose members are read in place.
     file_list : list[str]
         A list of predefined variable names for ML models.
+    recursive : bool
+        Whether raster files in sub-directories are included. They keep their
+        relative path when moved or copied.
+    exclude : tuple
+        Glob patterns of file or directory names to skip.
+    streams : int
+        Number of files moved or copied in parallel.
+    buffer_size : int
+        Size in bytes of the copy buffer of every stream.
+    verify : bool
+        Verify copies against a checksum of their source.
 
     Methods
     -------
+    tif_entries() -> list[RasterFileEntry]:
+        Get the discovery entries of the TIFF files in the given directory.
     tif_ext_file() -> list[str]:
-        Get a list of TIFF files in the given directory.
+        Get a list of TIFF files in the given directory (relative paths).
     move_file(dest_dir: str) -> None:
         Move raster files from a source directory to a destination directory.
     copy_files(dest_dir: str) -> None:
@@ -35,22 +52,78 @@ class RasterFileManager:
                                     ['agb', 'int', 'ele', '_p75', '_p99', 
                                      '_std', '_kur', '_ske', 'red', 'green',
                                      'blue', 'nir', '_dns'])    
+    recursive: bool = False
+    exclude: tuple = ()
+    streams: int = DEFAULT_STREAMS
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+    verify: bool = False
     
+    def tif_entries(self) -> list[RasterFileEntry]:
+        """
+        Get the discovery entries (full path, size, mtime) of the TIFF files
+        (.tif/.tiff, any case) in the given directory.
+
+        The listing comes from the shared, mtime-invalidated file inventory,
+        so repeated calls do not rescan an unchanged directory.
+
+        Returns
+        -------
+        List[RasterFileEntry]
+            Entries of the TIFF files. Files inside a zip archive have /vsizip/ paths.
+        """ 
+        return discover_files([self.raster_file_dir], include=TIFF_PATTERNS,
+                              exclude=self.exclude, recursive=self.recursive)
+
     def tif_ext_file(self) -> list[str]:
         """
-        Get a list of TIFF files in the given directory.
+        Get a list of TIFF files (.tif/.tiff, any case) in the given directory.
 
         Returns
         -------
         List[str]
-            A list of TIFF files in the directory.
+            A list of TIFF file paths relative to the directory.
         """ 
-        tif_files = [file.lower() for file in os.listdir(self.raster_file_dir) if file.endswith('.tif')]
+        tif_files = [entry.rel_path for entry in self.tif_entries()]
         return tif_files
     
+    @staticmethod
+    def _with_sidecars(src_path: str) -> list[str]: 
+        """
+        Get a raster file path together with the paths of its existing sidecar files.
+        """
+        sidecar = stats_sidecar_path(src_path)
+        return [src_path, sidecar] if os.path.exists(sidecar) else [src_path]
+    
+    def _transfer_jobs(self, dest_dir: str) -> list[tuple]: 
+        """
+        Get the (source, destination) pairs of all raster files and their sidecars.
+        Files keep their path relative to raster_file_dir, so same-named files in
+        different sub-directories do not overwrite each other.
+        """
+        jobs = []
+        for entry in self.tif_entries(): 
+            src_paths = [entry.path] if entry.is_virtual else self._with_sidecars(entry.path)
+            dest_sub_dir = os.path.join(dest_dir, os.path.dirname(entry.rel_path))
+            os.makedirs(dest_sub_dir, exist_ok=True)
+            for src_path in src_paths: 
+                dest_path = os.path.join(dest_sub_dir, os.path.basename(src_path))
+                # pooled handles must not outlive the transfer
+                dataset_pool.invalidate(src_path)
+                dataset_pool.invalidate(dest_path)
+                jobs.append((src_path, dest_path))
+        return jobs
+    
+    def _engine(self) -> TransferEngine: 
+        return TransferEngine(streams=self.streams, buffer_size=self.buffer_size, 
+                              verify=self.verify, progress=print_progress)
+    
     def move_file (self, dest_dir: str) -> None: 
         """
         Move raster files from a source directory to a destination directory.
+        Band statistics sidecars are moved along with their raster files.
+        Files are moved in parallel, and across filesystems every file is copied
+        under a temporary name first, so no partial file appears in dest_dir.
+        Archives are read-only, files inside them can only be copied.
 
         Parameters
         ----------
@@ -69,15 +142,13 @@ class RasterFileManager:
         """
         try: 
             # extracting files in the source directory
-            files = self.tif_ext_file()
+            if any(entry.is_virtual for entry in self.tif_entries()): 
+                raise ValueError(f"files inside archive {self.raster_file_dir} can not be moved")
             
-            # initalizing and moving source files to destination path
-            for file in files: 
-                src_path = os.path.join(self.raster_file_dir, file)
-                dest_path = os.path.join(dest_dir, file)
-                shutil.move(src_path, dest_path)
+            # moving source files (and their statistics sidecars) to destination path
+            report = self._engine().move(self._transfer_jobs(dest_dir))
 
-            print("successfully moved all raster file in the source directory")
+            print(f"successfully moved all raster file in the source directory ({report['files']} files)")
         except Exception as e: 
             raise Exception (f"Error moving file: {e}")
     
@@ -85,6 +156,10 @@ class RasterFileManager:
     def copy_files(self, dest_dir:str) -> None: 
         """
         Copy raster files from a source directory to a destination directory.
+        Band statistics sidecars are copied along with their raster files.
+        Files are copied in parallel, each under a temporary name that is renamed
+        once complete (and verified, if enabled). Files inside a zip archive are
+        streamed out of it.
 
         Parameters
         ----------
@@ -102,12 +177,8 @@ class RasterFileManager:
             If an error occurs while copying files.
         """
         try: 
-            files = self.tif_ext_file()
-            
-            for file in files: 
-                src_path = os.path.join(self.raster_file_dir, file)
-                shutil.copy2(src_path, dest_dir)
-            print("successfully copied all raster file in the source directory")
+            report = self._engine().copy(self._transfer_jobs(dest_dir))
+            print(f"successfully copied all raster file in the source directory ({report['files']} files)")
         except Exception as e: 
             raise Exception (f"Error copying file: {e}")
         
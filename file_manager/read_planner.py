@@ -0,0 +1,102 @@
+import math
+import numpy as np
+from rasterio.windows import Window
+from raster_metadata import run_trace
+
+
+# upper bound of the (uncompressed, all bands) data covered by one planned window
+DEFAULT_READ_BUDGET = 16 * 1024 ** 2
+
+
+def _block_unit(datasets: list) -> tuple:
+    """
+    Smallest (rows, cols) unit aligned to the blocks of all datasets, clipped to
+    their extent: a window made of whole units covers whole blocks of every dataset.
+    """
+    height, width = datasets[0].height, datasets[0].width
+    unit_rows = math.lcm(*(dataset.block_shapes[0][0] for dataset in datasets))
+    unit_cols = math.lcm(*(dataset.block_shapes[0][1] for dataset in datasets))
+    return min(unit_rows, height), min(unit_cols, width)
+
+
+def plan_windows(dataset, max_bytes: int = DEFAULT_READ_BUDGET, align_to: list = ()) -> list[Window]:
+    """
+    Plan the windows for a full pass over a dataset.
+
+    Windows are aligned to the internal blocks (tiles or strips) of the dataset,
+    and of the datasets in align_to (rasters on the same grid read in the same
+    pass), so GDAL decompresses every block exactly once, and adjacent blocks are
+    coalesced into larger windows up to max_bytes. Whole rows of blocks are
+    preferred; when one row of blocks exceeds the budget it is split into runs
+    of tiles. Windows are returned in row-major order, the order GeoTIFF stores
+    its blocks in.
+
+    Parameters
+    ----------
+    dataset : rio.io.DatasetReader or rio.io.DatasetWriter
+        Open dataset.
+    max_bytes : int
+        Maximum size of the data of all bands within one window.
+    align_to : list, optional
+        Other open datasets on the same grid whose blocks the windows are aligned to as well.
+
+    Returns
+    -------
+    list[Window]
+        Non-overlapping windows covering the whole dataset.
+    """
+    datasets = [dataset, *align_to]
+    block_rows, block_cols = _block_unit(datasets)
+    itemsize = max(np.dtype(dtype).itemsize for ds in datasets for dtype in ds.dtypes)
+    count = sum(ds.count for ds in datasets)
+    block_bytes = block_rows * block_cols * count * itemsize
+    blocks_per_window = max(max_bytes // block_bytes, 1)
+    blocks_per_row = math.ceil(dataset.width / block_cols)
+
+    windows = []
+    if blocks_per_window >= blocks_per_row:
+        # several whole rows of blocks per window
+        rows_per_window = (blocks_per_window // blocks_per_row) * block_rows
+        for row_off in range(0, dataset.height, rows_per_window):
+            windows.append(Window(0, row_off, dataset.width, min(rows_per_window, dataset.height - row_off)))
+    else:
+        # runs of tiles within one row of blocks
+        cols_per_window = blocks_per_window * block_cols
+        for row_off in range(0, dataset.height, block_rows):
+            for col_off in range(0, dataset.width, cols_per_window):
+                windows.append(Window(col_off, row_off, min(cols_per_window, dataset.width - col_off),
+                                      min(block_rows, dataset.height - row_off)))
+    return windows
+
+
+def count_block_reads(windows: list[Window], block_shape: tuple) -> int:
+    """
+    Number of block decompressions needed to read the windows one after another,
+    counting blocks shared by several windows once per window.
+    """
+    block_rows, block_cols = block_shape
+    reads = 0
+    for window in windows:
+        rows = math.ceil((window.row_off + window.height) / block_rows) - int(window.row_off) // block_rows
+        cols = math.ceil((window.col_off + window.width) / block_cols) - int(window.col_off) // block_cols
+        reads += rows * cols
+    return reads
+
+
+def record_plan(stage: str, dataset, windows: list[Window], nbytes: int, seconds: float,
+                baseline: list[Window] = None) -> None:
+    """
+    Add a planned windowed read of a dataset to the run trace: its windows,
+    the block decompressions they cost (against the number of blocks and, if
+    given, against the baseline windows the pass would otherwise have used)
+    and its throughput.
+    """
+    block_shape = dataset.block_shapes[0]
+    blocks = math.ceil(dataset.height / block_shape[0]) * math.ceil(dataset.width / block_shape[1])
+    fields = {"reader": stage, "path": dataset.name, "block_shape": list(block_shape),
+              "windows": len(windows), "blocks": blocks, "block_reads": count_block_reads(windows, block_shape),
+              "bytes": int(nbytes), "seconds": seconds,
+              "mb_per_s": nbytes / 1024 ** 2 / seconds if seconds > 0 else None}
+    if baseline is not None:
+        fields["baseline_block_reads"] = count_block_reads(baseline, block_shape)
+    run_trace.record("read_plan", **fields)
@@ -0,0 +1,187 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from file_manager.file_discovery import discover_files, TIFF_PATTERNS
+
+
+# seconds the inputs of a site must stay unchanged before it is processed
+DEFAULT_SETTLE_SECONDS = 5.0
+
+# a site failing with unchanged inputs is retried this many times, after a delay
+# doubling from DEFAULT_RETRY_DELAY seconds, then only once its inputs change
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_DELAY = 30.0
+
+
+def site_roots(site: dict) -> list[str]:
+    """Input roots of a site: its canopy metrics directories and its raster directory."""
+    return list(site['canopy_metrics_dirs']) + [site['raster_dir']]
+
+
+def snapshot_site(site: dict) -> dict:
+    """
+    Take a snapshot of the input files of a site.
+
+    The file list comes from the shared discovery inventory, so unchanged
+    directories are not rescanned. Files on disk are stat'ed again because a
+    file rewritten in place does not change the mtime of its directory.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping file path to (size, mtime).
+    """
+    snapshot = {}
+    for entry in discover_files(site_roots(site), include=TIFF_PATTERNS):
+        if entry.is_virtual:
+            snapshot[entry.path] = (entry.size, entry.mtime)
+            continue
+        try:
+            stat = os.stat(entry.path)
+        except FileNotFoundError:
+            # removed since the inventory was taken, the next poll sees the new listing
+            continue
+        snapshot[entry.path] = (stat.st_size, stat.st_mtime)
+    return snapshot
+
+
+@dataclass
+class SiteWatcher:
+    """
+    Polling watcher of the input roots of many sites.
+
+    A site becomes due when its input files differ from the snapshot it was
+    last processed with, and stay unchanged for `settle_seconds` (debouncing
+    tiles that are still being copied in). On the first poll every site is due,
+    right away if none of its files was modified within `settle_seconds`.
+    A site whose run failed is retried with unchanged inputs up to
+    `max_retries` times, after `retry_delay` seconds doubling with every
+    failure, and after that only once its inputs change.
+
+    Attributes
+    ----------
+    sites : list[dict]
+        Sites as returned by load_batch_config.
+    settle_seconds : float
+        Time the inputs of a site must be stable before it is processed.
+    max_retries : int
+        Number of retries of a failed site with unchanged inputs.
+    retry_delay : float
+        Delay before the first retry of a failed site, doubled for every further one.
+
+    Methods
+    -------
+    poll(now: float = None) -> list[dict]:
+        Get the sites that are due for processing.
+    done(site: dict, succeeded: bool, now: float = None):
+        Report the outcome of processing a due site.
+    """
+
+    sites: list[dict]
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS
+    max_retries: int = DEFAULT_MAX_RETRIES
+    retry_delay: float = DEFAULT_RETRY_DELAY
+    _processed: dict = field(init=False, default_factory=dict)  # site name : snapshot last processed
+    _failures: dict = field(init=False, default_factory=dict)  # site name : failed runs with these inputs
+    _retries: dict = field(init=False, default_factory=dict)  # site name : time of the next retry
+    _candidates: dict = field(init=False, default_factory=dict)  # site name : (snapshot, first seen)
+    _running: dict = field(init=False, default_factory=dict)  # site name : snapshot handed out by poll
+
+    def poll(self, now: float = None) -> list[dict]:
+        """
+        Check the inputs of all sites.
+
+        Sites returned as due are not polled again until `done` is called for them.
+
+        Parameters
+        ----------
+        now : float, optional
+            Current time in seconds since the epoch (time.time() by default).
+
+        Returns
+        -------
+        list[dict]
+            The sites whose inputs changed and have settled, and the failed
+            sites whose next retry is due.
+        """
+        now = time.time() if now is None else now
+        due = []
+        for site in self.sites:
+            name = site['name']
+            if name in self._running:
+                continue
+            try:
+                snapshot = snapshot_site(site)
+            except FileNotFoundError:
+                # a root is not there (yet)
+                self._candidates.pop(name, None)
+                continue
+            if snapshot == self._processed.get(name):
+                self._candidates.pop(name, None)
+                if name in self._retries and now >= self._retries[name]:
+                    del self._retries[name]
+                    self._running[name] = snapshot
+                    due.append(site)
+                continue
+            # changed inputs: earlier failures no longer count
+            self._retries.pop(name, None)
+            self._failures.pop(name, None)
+            candidate = self._candidates.get(name)
+            if name not in self._processed and candidate is None and snapshot \
+                    and now - max(mtime for _, mtime in snapshot.values()) >= self.settle_seconds:
+                # first poll and the inputs are old enough to be complete
+                self._running[name] = snapshot
+                due.append(site)
+                continue
+            if candidate is None or candidate[0] != snapshot:
+                # new change: restart the settle period
+                self._candidates[name] = (snapshot, now)
+                candidate = self._candidates[name]
+            if now - candidate[1] >= self.settle_seconds:
+                self._running[name] = snapshot
+                del self._candidates[name]
+                due.append(site)
+        return due
+
+    def done(self, site: dict, succeeded: bool, now: float = None) -> None:
+        """
+        Report the outcome of processing a site returned by `poll`.
+
+        A site that succeeded is due again only after its inputs change again.
+        A site that failed is retried with unchanged inputs after a delay
+        doubling with every failure, up to `max_retries` times; after that it
+        waits for its inputs to change, as after a success.
+
+        Parameters
+        ----------
+        site : dict
+            A site returned by `poll`.
+        succeeded : bool
+            Whether the site was processed without error.
+        now : float, optional
+            Current time in seconds since the epoch (time.time() by default).
+        """
+        name = site['name']
+        self._processed[name] = self._running.pop(name)
+        if succeeded:
+            self._failures.pop(name, None)
+            return
+        failures = self._failures[name] = self._failures.get(name, 0) + 1
+        if failures <= self.max_retries:
+            now = time.time() if now is None else now
+            self._retries[name] = now + self.retry_delay * 2 ** (failures - 1)
+
+    def pending(self) -> list[str]:
+        """Names of the sites with changed inputs that are still settling, or with a retry to come."""
+        return list(self._candidates) + [name for name in self._retries if name not in self._candidates]
+
+
+def write_status(status_file: str, status: dict) -> None:
+    """
+    Write the watch status JSON atomically, so readers never see a partial file.
+    """
+    tmp_file = f"{status_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as json_file:
+        json.dump(status, json_file, indent=2)
+    os.replace(tmp_file, status_file)
@@ -0,0 +1,208 @@
+import errno
+import hashlib
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+import rasterio.shutil as rio_shutil
+from file_manager.file_discovery import split_vsizip_path, file_signature
+from raster_metadata import run_trace
+
+
+# number of files transferred in parallel
+DEFAULT_STREAMS = 4
+
+# size of the copy buffer of every stream
+DEFAULT_BUFFER_SIZE = 8 * 1024 ** 2
+
+
+def temporary_path(dest_path: str) -> str:
+    """
+    Hidden temporary name next to dest_path, used to write a file before renaming
+    it into place, so a partial file is never visible under its final name.
+    """
+    dest_dir, name = os.path.split(dest_path)
+    return os.path.join(dest_dir, f".{name}.{uuid.uuid4().hex[:8]}.part")
+
+
+@contextmanager
+def _open_source(src_path: str):
+    """Open a file, or a member of a zip archive given by its /vsizip/ path, for reading."""
+    archive, member = split_vsizip_path(src_path)
+    if archive is None:
+        with open(src_path, 'rb') as src_file:
+            yield src_file
+    else:
+        with zipfile.ZipFile(archive) as zip_file, zip_file.open(member) as src_file:
+            yield src_file
+
+
+def file_digest(path: str, buffer_size: int = DEFAULT_BUFFER_SIZE) -> bytes:
+    """
+    BLAKE2 digest of the bytes of a file, or of a zip archive member given by its /vsizip/ path.
+    """
+    checksum = hashlib.blake2b()
+    buffer = memoryview(bytearray(buffer_size))
+    with _open_source(path) as file:
+        while True:
+            count = file.readinto(buffer)
+            if not count:
+                break
+            checksum.update(buffer[:count])
+    return checksum.digest()
+
+
+@dataclass
+class TransferEngine:
+    """
+    Concurrent bulk file transfers for slow and network storage.
+
+    Files are transferred by `streams` threads in parallel, each copying with a
+    large buffer, so many files in flight hide the per-file latency of NAS and
+    SMB mounts. Every file is written to a hidden temporary name and renamed
+    into place once complete. Moves within one filesystem are plain renames;
+    moves across filesystems are always verified before the source is deleted.
+    Raster files may also be copied to a GDAL virtual file system (e.g. the
+    /vsimem intermediates of IntermediateStore), which GDAL writes.
+
+    Attributes
+    ----------
+    streams : int
+        Number of files transferred in parallel.
+    buffer_size : int
+        Size in bytes of the copy buffer of every stream.
+    verify : bool
+        Hash the data while copying and compare it with a hash of the written
+        file before renaming it into place (files on disk only).
+    progress : Callable, optional
+        Called after every file as progress(files_done, files_total, bytes_done, seconds).
+
+    Methods
+    -------
+    copy(jobs: list[tuple]) -> dict:
+        Copy files to their destinations.
+    move(jobs: list[tuple]) -> dict:
+        Move files to their destinations.
+    """
+
+    streams: int = DEFAULT_STREAMS
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+    verify: bool = False
+    progress: Callable = None
+
+    def copy(self, jobs: list[tuple]) -> dict:
+        """
+        Copy files to their destinations.
+
+        Parameters
+        ----------
+        jobs : list[tuple]
+            (source path, destination path) pairs. Sources may be members of zip
+            archives given by their /vsizip/ path, and destinations of raster
+            files may be on a GDAL virtual file system.
+
+        Returns
+        -------
+        dict
+            Transfer report with the number of files and bytes, the duration and the throughput.
+
+        Raises
+        ------
+        IOError
+            If the checksum of a copy does not match its source.
+        """
+        return self._transfer(jobs, move=False)
+
+    def move(self, jobs: list[tuple]) -> dict:
+        """
+        Move files to their destinations; see copy().
+        """
+        return self._transfer(jobs, move=True)
+
+    def _transfer(self, jobs: list[tuple], move: bool) -> dict:
+        start = time.perf_counter()
+        done, nbytes = 0, 0
+        with ThreadPoolExecutor(max_workers=max(self.streams, 1)) as executor:
+            futures = [executor.submit(self._transfer_file, src, dest, move) for src, dest in jobs]
+            for future in as_completed(futures):
+                nbytes += future.result()
+                done += 1
+                if self.progress is not None:
+                    self.progress(done, len(jobs), nbytes, time.perf_counter() - start)
+
+        seconds = time.perf_counter() - start
+        report = {"operation": "move" if move else "copy", "files": done, "bytes": nbytes,
+                  "seconds": seconds, "mb_per_s": nbytes / 1024 ** 2 / seconds if seconds > 0 else None,
+                  "streams": self.streams, "verified": self.verify}
+        run_trace.record("transfer", **report)
+        return report
+
+    def _transfer_file(self, src_path: str, dest_path: str, move: bool) -> int:
+        """Transfer one file and return the number of bytes transferred."""
+        is_virtual = src_path.startswith("/vsi")
+        if move and is_virtual:
+            raise ValueError(f"{src_path} is read-only and can not be moved")
+        if dest_path.startswith("/vsi"):
+            if move:
+                raise ValueError(f"{dest_path} is virtual, files can only be copied to it")
+            rio_shutil.copyfiles(src_path, dest_path)
+            return file_signature(src_path)[0]
+        if move:
+            try:
+                # same filesystem: an atomic rename, nothing to copy
+                nbytes = os.path.getsize(src_path)
+                os.replace(src_path, dest_path)
+                return nbytes
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+
+        # the source of a move is deleted below, so its copy is always verified
+        verify = self.verify or move
+        tmp_path = temporary_path(dest_path)
+        try:
+            nbytes, digest = self._copy_stream(src_path, tmp_path, verify)
+            if verify and self._file_digest(tmp_path) != digest:
+                raise IOError(f"Checksum mismatch copying {src_path} to {dest_path}")
+            if not is_virtual:
+                shutil.copystat(src_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if move:
+            os.remove(src_path)
+        return nbytes
+
+    def _copy_stream(self, src_path: str, dest_path: str, verify: bool) -> tuple:
+        """Copy with a large buffer, hashing the data on the way if verifying."""
+        checksum = hashlib.blake2b() if verify else None
+        buffer = memoryview(bytearray(self.buffer_size))
+        nbytes = 0
+        with _open_source(src_path) as src_file, open(dest_path, 'wb') as dest_file:
+            while True:
+                count = src_file.readinto(buffer)
+                if not count:
+                    break
+                dest_file.write(buffer[:count])
+                if checksum is not None:
+                    checksum.update(buffer[:count])
+                nbytes += count
+            dest_file.flush()
+            os.fsync(dest_file.fileno())
+        return nbytes, checksum.digest() if checksum is not None else None
+
+    def _file_digest(self, path: str) -> bytes:
+        return file_digest(path, self.buffer_size)
+
+
+def print_progress(files_done: int, files_total: int, bytes_done: int, seconds: float) -> None:
+    """Progress callback printing the files and throughput transferred so far."""
+    rate = bytes_done / 1024 ** 2 / seconds if seconds > 0 else 0.0
+    print(f"Transferred {files_done}/{files_total} files ({bytes_done / 1024 ** 2:.1f} MiB, {rate:.1f} MiB/s)")
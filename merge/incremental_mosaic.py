@@ -0,0 +1,322 @@
+import json
+import math
+import os
+import time
+import numpy as np
+import rasterio as rio
+from rasterio.merge import merge
+from rasterio.windows import Window, from_bounds
+from file_manager.dataset_pool import dataset_pool
+from file_manager.file_discovery import file_signature
+from file_manager.read_planner import plan_windows, record_plan
+from merge.merge_raster import get_all_tiff_paths, group_tiffs_by_name, merge_img_by_name
+from merge.tile_dedup import deduplicate_tiles, DEFAULT_OVERLAP_RULE, LOSSLESS_RULES
+from raster_metadata.band_statistics import (read_stats_sidecar, write_stats_sidecar,
+                                             discard_stats_sidecar, update_window_statistics)
+from raster_metadata import run_trace
+
+
+# suffix of the manifest recording the source tiles a mosaic was built from
+MANIFEST_SUFFIX = ".sources.json"
+
+
+def _read_manifest(mosaic_path: str) -> dict:
+    manifest_path = mosaic_path + MANIFEST_SUFFIX
+    if not os.path.exists(manifest_path) or not os.path.exists(mosaic_path):
+        return None
+    with open(manifest_path, 'r') as json_file:
+        manifest = json.load(json_file)
+    manifest.setdefault("skipped", {})
+    manifest.setdefault("pending", [])
+    return manifest
+
+
+def _write_manifest(mosaic_path: str, sources: dict, skipped: dict, pending: list) -> None:
+    manifest_path = mosaic_path + MANIFEST_SUFFIX
+    with open(manifest_path + ".tmp", 'w') as json_file:
+        json.dump({"mosaic": os.path.basename(mosaic_path), "sources": sources, "skipped": skipped,
+                   "pending": [list(bounds) for bounds in pending]}, json_file)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _add_pending(pending: list, regions: list) -> list:
+    pending = [tuple(bounds) for bounds in pending]
+    return pending + [tuple(bounds) for bounds in regions if tuple(bounds) not in pending]
+
+
+def pending_regions(mosaic_path: str) -> list[tuple]:
+    """
+    Bounds of the mosaic regions rewritten since the outputs derived from the mosaic
+    were last brought up to date (see clear_pending_regions).
+    """
+    manifest = _read_manifest(mosaic_path)
+    return [] if manifest is None else [tuple(bounds) for bounds in manifest["pending"]]
+
+
+def clear_pending_regions(mosaic_path: str) -> None:
+    """
+    Record that the outputs derived from a mosaic are up to date with it. Until
+    then its rewritten regions stay pending and are returned again by every
+    stitch_incremental, so a failed downstream update is replayed by the next run.
+    """
+    manifest = _read_manifest(mosaic_path)
+    if manifest is not None and manifest["pending"]:
+        _write_manifest(mosaic_path, manifest["sources"], manifest["skipped"], [])
+
+
+def _intersects(a: tuple, b: tuple) -> bool:
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
+
+
+def _snap_window(mosaic, bounds: tuple) -> Window:
+    """Window of the mosaic covering bounds, rounded outward to whole pixels and clipped to the mosaic."""
+    window = from_bounds(*bounds, transform=mosaic.transform)
+    col_off, row_off = math.floor(round(window.col_off, 6)), math.floor(round(window.row_off, 6))
+    col_end = math.ceil(round(window.col_off + window.width, 6))
+    row_end = math.ceil(round(window.row_off + window.height, 6))
+    col_off, row_off = max(col_off, 0), max(row_off, 0)
+    col_end, row_end = min(col_end, mosaic.width), min(row_end, mosaic.height)
+    return Window(col_off, row_off, max(col_end - col_off, 0), max(row_end - row_off, 0))
+
+
+def _grow_mosaic(mosaic_path: str, bounds: tuple) -> bool:
+    """
+    Grow the mosaic extent, on its own pixel grid, so that it covers bounds.
+
+    Returns
+    -------
+    bool
+        True if the mosaic was grown.
+    """
+    with dataset_pool.open(mosaic_path) as mosaic:
+        res_x, res_y = mosaic.res
+        left, bottom, right, top = mosaic.bounds
+        # number of whole pixels to add on every side
+        add_left = max(math.ceil(round((left - bounds[0]) / res_x, 6)), 0)
+        add_right = max(math.ceil(round((bounds[2] - right) / res_x, 6)), 0)
+        add_top = max(math.ceil(round((bounds[3] - top) / res_y, 6)), 0)
+        add_bottom = max(math.ceil(round((bottom - bounds[1]) / res_y, 6)), 0)
+        if not (add_left or add_right or add_top or add_bottom):
+            return False
+
+        profile = mosaic.profile.copy()
+        profile.update({
+            "width": mosaic.width + add_left + add_right,
+            "height": mosaic.height + add_top + add_bottom,
+            "transform": mosaic.transform * rio.Affine.translation(-add_left, -add_top)
+        })
+        grown_path = mosaic_path + ".grow.tif"
+        with rio.open(grown_path, 'w', **profile) as grown:
+            if grown.nodata is not None:
+                # new areas start as nodata
+                for _, window in grown.block_windows(1):
+                    grown.write(np.full((grown.count, window.height, window.width), grown.nodata,
+                                        dtype=grown.dtypes[0]), window=window)
+            start = time.perf_counter()
+            windows = plan_windows(mosaic)
+            for window in windows:
+                grown.write(mosaic.read(window=window),
+                            window=Window(window.col_off + add_left, window.row_off + add_top,
+                                          window.width, window.height))
+            record_plan("grow_mosaic", mosaic, windows, mosaic.width * mosaic.height * mosaic.count
+                        * np.dtype(mosaic.dtypes[0]).itemsize, time.perf_counter() - start)
+            for bidx in range(1, mosaic.count + 1):
+                grown.update_tags(bidx, **mosaic.tags(bidx))
+
+    stats_list = read_stats_sidecar(mosaic_path)
+    dataset_pool.invalidate(mosaic_path)
+    os.replace(grown_path, mosaic_path)
+    if stats_list is not None:
+        # the added pixels are nodata
+        for stats in stats_list:
+            stats["count"] = profile["width"] * profile["height"]
+            stats["nodata_fraction"] = 1 - stats["valid_count"] / stats["count"]
+        write_stats_sidecar(mosaic_path, stats_list)
+    return True
+
+
+def _union(sources) -> tuple:
+    """Union of the bounds of manifest source entries."""
+    sources = list(sources)
+    return (min(s["bounds"][0] for s in sources), min(s["bounds"][1] for s in sources),
+            max(s["bounds"][2] for s in sources), max(s["bounds"][3] for s in sources))
+
+
+def _covers(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]
+
+
+def _source_entry(path: str, signature: list) -> dict:
+    with dataset_pool.open(path) as src:
+        return {"signature": signature, "bounds": list(src.bounds)}
+
+
+def update_mosaic(img_paths: list[str], mosaic_path: str, img_name: str, crs: int = None,
+                  skipped: list[str] = (), lossless: bool = True) -> list[tuple]:
+    """
+    Bring a mosaic up to date with its source tiles, rewriting only what changed.
+
+    A manifest next to the mosaic records the signature and bounds of the tiles
+    it was built from, the signature of the tiles skipped by the overlap rule,
+    and the regions rewritten but not yet applied to the outputs derived from
+    the mosaic (see pending_regions). Tiles that were added or changed since then
+    are merged again only within their old and new windows of the mosaic,
+    together with the other tiles overlapping that window (in the same order as
+    a full merge), and so are the windows of source tiles that were removed. The
+    mosaic extent is grown on its own pixel grid if new tiles reach beyond it.
+    Without a manifest, or when the remaining tiles no longer cover the mosaic
+    extent, the mosaic is rebuilt.
+
+    Under a lossless overlap rule skipped tiles make no difference to the mosaic,
+    so a tile that arrives or leaves as a skipped one (e.g. a duplicate of an
+    earlier tile), or an unchanged tile that moves between the sources and the
+    skipped tiles, rewrites nothing. Under a lossy rule the window of a source
+    that became a skipped tile is merged again.
+
+    Parameters
+    ----------
+    img_paths : list[str]
+        Paths to the source tiles, in merge order.
+    mosaic_path : str
+        Path of the mosaic.
+    img_name : str
+        The name of the images (used for informative messages).
+    crs : int, optional
+        EPSG code assigned to the mosaic if its sources have no CRS.
+    skipped : list[str]
+        Paths to the tiles of the mosaic skipped by the overlap rule.
+    lossless : bool
+        Whether the skipped tiles make no difference to the mosaic
+        (see merge.tile_dedup.LOSSLESS_RULES).
+
+    Returns
+    -------
+    list[tuple]
+        Bounds (left, bottom, right, top) of the mosaic regions that were rewritten.
+        Empty if the mosaic was up to date.
+    """
+    manifest = _read_manifest(mosaic_path)
+    signatures = {path: file_signature(path) for path in img_paths}
+    skipped = {path: {"signature": file_signature(path)} for path in skipped}
+
+    if manifest is not None:
+        old_sources, old_skipped = manifest["sources"], manifest["skipped"]
+
+        def unchanged(path: str) -> bool:
+            if path in old_sources:
+                return old_sources[path]["signature"] == signatures[path]
+            # skipped before: under a lossless rule it already made no difference to the mosaic
+            return lossless and old_skipped.get(path) == {"signature": signatures[path]}
+
+        dirty_paths = [path for path in img_paths if not unchanged(path)]
+        # sources no longer merged, unless they only became (unchanged) skipped tiles under a lossless rule
+        dropped = [path for path, source in old_sources.items() if path not in signatures
+                   and not (lossless and skipped.get(path) == {"signature": source["signature"]})]
+        sources = {path: old_sources[path] if path in old_sources and path not in dirty_paths
+                   else _source_entry(path, signatures[path]) for path in img_paths}
+
+    if manifest is None or not _covers(_union(sources.values()), _union(old_sources.values())):
+        # no previous build to update, or the remaining tiles do not cover the mosaic extent
+        pending = []
+        if manifest is not None:
+            # the outputs still show the old extent, which the rebuilt mosaic may no longer cover
+            with dataset_pool.open(mosaic_path) as mosaic:
+                pending = _add_pending(manifest["pending"], [tuple(mosaic.bounds)])
+        dataset_pool.invalidate(mosaic_path)
+        discard_stats_sidecar(mosaic_path)
+        merge_img_by_name(img_paths, mosaic_path, img_name, crs=crs)
+        sources = {path: _source_entry(path, signatures[path]) for path in img_paths}
+        with dataset_pool.open(mosaic_path) as mosaic:
+            full_bounds = tuple(mosaic.bounds)
+        _write_manifest(mosaic_path, sources, skipped, _add_pending(pending, [full_bounds]))
+        run_trace.record("incremental_stitch", path=mosaic_path, mode="full", tiles=len(img_paths))
+        return [full_bounds]
+
+    # regions to merge again: the new windows of added or changed tiles, and the old
+    # windows of changed tiles and of dropped sources
+    regions = [sources[path]["bounds"] for path in dirty_paths]
+    regions += [old_sources[path]["bounds"] for path in dirty_paths
+                if path in old_sources and old_sources[path]["bounds"] != sources[path]["bounds"]]
+    regions += [old_sources[path]["bounds"] for path in dropped]
+    if not regions:
+        if sources != old_sources or skipped != old_skipped:
+            _write_manifest(mosaic_path, sources, skipped, manifest["pending"])
+        return []
+
+    grown = _grow_mosaic(mosaic_path, _union(sources.values()))
+
+    dirty_bounds = []
+    dataset_pool.invalidate(mosaic_path)
+    with rio.open(mosaic_path, 'r+') as mosaic:
+        for bounds in regions:
+            window = _snap_window(mosaic, bounds)
+            if window.width == 0 or window.height == 0:
+                continue
+            window_bounds = mosaic.window_bounds(window)
+            if tuple(window_bounds) in dirty_bounds:
+                continue
+            # every tile overlapping the window, in full merge order
+            overlapping = [p for p in img_paths if _intersects(sources[p]["bounds"], window_bounds)]
+            if not overlapping:
+                # the window of a removed or moved tile that no other tile reaches: empty, as in a full merge
+                data = np.full((mosaic.count, window.height, window.width),
+                               0 if mosaic.nodata is None else mosaic.nodata, dtype=mosaic.dtypes[0])
+            else:
+                datasets = [rio.open(p) for p in overlapping]
+                try:
+                    data, _ = merge(datasets, bounds=window_bounds, res=mosaic.res,
+                                    nodata=mosaic.nodata, dtype=mosaic.dtypes[0])
+                finally:
+                    for ds in datasets:
+                        ds.close()
+            if data.shape[1:] != (window.height, window.width):
+                raise ValueError(f"Merged window of {img_name} has shape {data.shape[1:]}, "
+                                 f"expected {(window.height, window.width)}")
+            old_data = mosaic.read(window=window)
+            mosaic.write(data, window=window)
+            update_window_statistics(mosaic, old_data, data)
+            dirty_bounds.append(tuple(window_bounds))
+
+    _write_manifest(mosaic_path, sources, skipped, _add_pending(manifest["pending"], dirty_bounds))
+    run_trace.record("incremental_stitch", path=mosaic_path, mode="incremental", tiles=len(img_paths),
+                     dirty_tiles=len(dirty_paths), dropped_tiles=len(dropped), grown=grown, dirty_bounds=dirty_bounds,
+                     dirty_bytes=sum(signatures[p][0] for p in dirty_paths))
+    return dirty_bounds
+
+
+def stitch_incremental(dirs: list[str], dest_path: str, crs: int = None,
+                       overlap_rule: str = DEFAULT_OVERLAP_RULE) -> dict:
+    """
+    Stitches TIFF files by filename pattern into persistent mosaics, updating existing
+    mosaics only where new or changed tiles arrived.
+
+    Args:
+        dirs: A list of directory paths containing the TIFF files.
+        dest_path: The directory holding the mosaics and their source manifests.
+        crs: EPSG code stamped on mosaics whose sources have no CRS (optional).
+        overlap_rule: Which tiles are skipped besides byte-identical duplicates,
+            one of merge.tile_dedup.OVERLAP_RULES.
+
+    Returns:
+        A dictionary mapping mosaic file name to the bounds of its pending regions:
+        those rewritten now, and those rewritten by earlier runs whose outputs were
+        not brought up to date (see clear_pending_regions).
+
+    Raises:
+        Exception: If an error occurs during the stitching process.
+    """
+    try:
+        os.makedirs(dest_path, exist_ok=True)
+        dirty_regions, updated = {}, 0
+        for img_name, img_paths in group_tiffs_by_name(get_all_tiff_paths(dirs)).items():
+            mosaic_path = os.path.join(dest_path, img_name + '.tif')
+            kept = deduplicate_tiles(img_paths, img_name, overlap_rule)
+            # skipped tiles are recorded too, so a tile only moving in or out of them rewrites nothing
+            updated += bool(update_mosaic(kept, mosaic_path, img_name, crs=crs,
+                                          skipped=[path for path in img_paths if path not in kept],
+                                          lossless=overlap_rule in LOSSLESS_RULES))
+            dirty_regions[img_name + '.tif'] = pending_regions(mosaic_path)
+        print(f"Raster files incremental stitching completed: {updated} of {len(dirty_regions)} mosaics updated")
+        return dirty_regions
+    except Exception as e:
+        raise Exception(f"Error stitching raster file") from e
@@ -6,17 +6,31 @@ import os
 from collections import defaultdict
 from os.path import join
 import shutil
+import rasterio.shutil as rio_shutil
+from file_manager.file_discovery import discover_files, TIFF_PATTERNS
+from raster_metadata.band_statistics import write_with_statistics
+from file_manager.dataset_pool import dataset_pool
+from file_manager.intermediate_store import IntermediateStore
+from merge.tile_dedup import deduplicate_tiles, DEFAULT_OVERLAP_RULE
 
 
 
-def stitch_tiffs_by_pattern(dirs:list[str], dest_path:str) -> str: 
+def stitch_tiffs_by_pattern(dirs:list[str], dest_path:str, crs:int = None, 
+                            store: IntermediateStore = None, 
+                            overlap_rule: str = DEFAULT_OVERLAP_RULE) -> str: 
     """
     Stitches TIFF files based on filename patterns and saves the result to a specified path.
 
     Args:
-        dirs: A list of directory paths containing the TIFF files.
+        dirs: A list of directory paths containing the TIFF files. Zip archives
+            (or directories inside them) are read in place, without extraction.
         dest_path: The destination path where the stitched image will be saved.
-        output_format: The format of the stitched image (optional, defaults to the format of the input files).
+        crs: EPSG code stamped on stitched images whose sources have no CRS (optional).
+        store: Intermediate store receiving the stitched images instead of dest_path (optional).
+            Images within its memory threshold are kept in memory.
+        overlap_rule: Which tiles are skipped before stitching besides byte-identical
+            duplicates, one of merge.tile_dedup.OVERLAP_RULES (default "valid": tiles
+            whose pixels the earlier tiles already filled with valid data).
 
     Raises:
         RasterioIOError: If there's an error opening a raster file.
@@ -24,16 +38,21 @@ def stitch_tiffs_by_pattern(dirs:list[str], dest_path:str) -> str:
     """
     try:   
         tif_file_paths = get_all_tiff_paths(dirs) 
-        os.makedirs(dest_path, exist_ok = True)
-        filename_groups = defaultdict(list) # filename : paths[list]
-        for path in tif_file_paths: 
-            path = path.replace("\\", "/") # Consistent path separator
-            filename = path.split("/")[-1].split(".")[0] # Extract filename without extension
-            filename_groups[filename].append(path)
+        if store is None: 
+            os.makedirs(dest_path, exist_ok = True)
+        filename_groups = group_tiffs_by_name(tif_file_paths)
         for img_name, img_paths in filename_groups.items():
+            # duplicate and fully covered tiles are not read by the merge
+            img_paths = deduplicate_tiles(img_paths, img_name, overlap_rule)
             dest_file = join(dest_path, img_name + '.tif')
-            if len(img_paths) > 1: 
-                merge_img_by_name(img_paths, dest_file, img_name)
+            # close pooled handles of a mosaic from a previous run before overwriting it
+            dataset_pool.invalidate(dest_file)
+            if len(img_paths) > 1 or crs is not None or store is not None: 
+                # single images are rewritten too, so the CRS is stamped in the same write
+                merge_img_by_name(img_paths, dest_file, img_name, crs=crs, store=store)
+            elif img_paths[0].startswith("/vsi"): 
+                # archive member: let GDAL stream it out of the archive
+                rio_shutil.copyfiles(img_paths[0], dest_file)
             else: 
                 shutil.copyfile(img_paths[0], dest_file)
         # return destination path string 
@@ -43,36 +62,58 @@ def stitch_tiffs_by_pattern(dirs:list[str], dest_path:str) -> str:
         raise Exception(f"Error stitching raster file") from e
         
 
+def group_tiffs_by_name(tif_file_paths: list[str]) -> dict: 
+    """
+    Groups TIFF file paths by file name (without extension, case-insensitive).
+
+    Args:
+        tif_file_paths: A list of TIFF file paths.
+
+    Returns:
+        A dictionary mapping file name to the list of paths with that name, in input order.
+    """
+    filename_groups = defaultdict(list) # filename : paths[list]
+    for path in tif_file_paths: 
+        path = path.replace("\\", "/") # Consistent path separator
+        filename = path.split("/")[-1].split(".")[0].lower() # Extract filename without extension (.tif/.TIF alike)
+        filename_groups[filename].append(path)
+    return filename_groups
+
+
 def get_all_tiff_paths(dirs:list[str]) -> list[str]:  
     """
-    Extracts all TIFF file paths from a list of directories.
+    Extracts all TIFF file paths (.tif/.tiff, any case) from a list of directories,
+    including their sub-directories.
 
     Args:
-        dirs: A list of directory paths to search for TIFF files.
+        dirs: A list of directory paths to search for TIFF files. A directory may
+            also be a zip archive or a directory inside one.
 
     Returns:
         A list containing absolute paths to all TIFF files found within the directories.
+        Files inside archives are returned as /vsizip/ paths that rasterio opens in place.
 
     Raises:
         FileNotFoundError: If any directory in the provided list cannot be accessed.
         Exception: If any other error occurs during file path extraction.
     """ 
-    tif_filepaths= [] 
-    for dir in dirs:  
-        try: 
-            files = os.listdir(dir)
-            if files: 
-                tif_files = [f for f in files if f.endswith('.tif')]
-                tif_filepaths.extend(list(map(lambda f: os.path.join(dir, f), tif_files)))
-            else: 
-                print(f"No TIFF files found in directory: {dir}")    
-        except FileNotFoundError as e: 
-            raise FileNotFoundError(f"Error accessing directory: {dir}") from e
-        except Exception as e: 
-            raise Exception(f"Error extracting file file path {dir}") from e
+    try: 
+        # all directories are scanned concurrently in one discovery pass
+        entries = discover_files(dirs, include=TIFF_PATTERNS)
+    except FileNotFoundError: 
+        raise
+    except Exception as e: 
+        raise Exception(f"Error extracting file file path {dirs}") from e
+    
+    found_roots = {entry.root for entry in entries}
+    for dir in dirs: 
+        if dir not in found_roots: 
+            print(f"No TIFF files found in directory: {dir}")    
+    tif_filepaths = [entry.path for entry in entries]
     return tif_filepaths
             
-def merge_img_by_name(img_paths:list[str], file_dest: str, img_name: str) -> None: 
+def merge_img_by_name(img_paths:list[str], file_dest: str, img_name: str, crs: int = None, 
+                      store: IntermediateStore = None) -> str: 
     """
         Stitches a list of TIFF files based on filename and saves the result.
 
@@ -80,6 +121,12 @@ def merge_img_by_name(img_paths:list[str], file_dest: str, img_name: str) -> Non
         img_paths: A list of paths to the TIFF images to be stitched.
         file_dest: The destination path for the stitched image.
         img_name: The name of the images (used for informative messages).
+        crs: EPSG code assigned to the stitched image if its sources have no CRS (optional).
+        store: Intermediate store deciding where the stitched image is written (optional). 
+            The image is stored under the file name of file_dest.
+
+        Returns:
+        The path the stitched image was written to.
 
         Raises:
         RasterioIOError: If there's an error opening a raster file.
@@ -92,11 +139,26 @@ def merge_img_by_name(img_paths:list[str], file_dest: str, img_name: str) -> Non
             #append rasterio.io.DatasetReader type to the list
             rast_imgs.append(img) 
         # merging the respective similar image name before closing
-        merge(rast_imgs,  dst_path= file_dest)
+        merged, transform = merge(rast_imgs)
+        
+        # extract metadata for merged image from the first one, as rasterio's merge does
+        out_meta = rast_imgs[0].profile.copy()
+        out_meta.update({"height": merged.shape[1], "width": merged.shape[2], 
+                         "count": merged.shape[0], "dtype": merged.dtype, "transform": transform})
+        if out_meta.get("crs") is None and crs is not None: 
+            # stamping the schema CRS in the stitch write instead of a separate r+ pass
+            out_meta["crs"] = rio.crs.CRS.from_epsg(crs)
+        if store is not None: 
+            file_dest = store.path_for(os.path.basename(file_dest), merged.nbytes)
+        
+        # write merged image to path, collecting band statistics on the way
+        with open(file_dest, 'w', **out_meta) as mg_rast:
+            write_with_statistics(mg_rast, merged)
         
         # Close all opened images if no exception is raised. 
         for ds in rast_imgs:
             ds.close()
+        return file_dest
     except RasterioIOError as e: 
         # Close all opened images before raising RasterioIOError
         for ds in rast_imgs:
@@ -108,15 +170,3 @@ def merge_img_by_name(img_paths:list[str], file_dest: str, img_name: str) -> Non
             ds.close()
         raise Exception(f"Error merging raster files {img_name}") from e
 
-
-    
-    
-
-        # # extract metadata for merged image from old one
-        # out_meta = rast_imgs[0].meta.copy()
-        # out_meta.update(
-        #     {"driver": "GTiff", "height": merged.shape[1], "width": merged.shape[2], 
-        #     "transform": transform})
-        # # write new merged image to path using updated metadata
-        # with open(file_dest, 'w', **out_meta) as mg_rast:
-        #     mg_rast.write(merged)   
\ No newline at end of file
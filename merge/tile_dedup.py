@@ -0,0 +1,274 @@
+import math
+from collections import defaultdict
+import numpy as np
+from rasterio.windows import Window
+from file_manager.dataset_pool import dataset_pool
+from file_manager.file_discovery import file_signature
+from file_manager.transfer_engine import file_digest
+from raster_metadata import run_trace
+
+
+# how tiles overlapping earlier tiles of a mosaic are treated before stitching:
+# "exact"     only byte-identical duplicates are dropped
+# "valid"     also tiles whose every pixel the merge already filled from earlier tiles (the output is unchanged)
+# "footprint" also tiles fully covered by the footprints of earlier tiles, whatever their nodata
+OVERLAP_RULES = ("exact", "valid", "footprint")
+DEFAULT_OVERLAP_RULE = "valid"
+# rules whose skipped tiles make no difference to the mosaic
+LOSSLESS_RULES = ("exact", "valid")
+
+# path : (signature, fingerprint stages computed so far), kept across runs of a process
+_fingerprints = {}
+
+
+def header_key(src) -> tuple:
+    """Everything a tile's header says about its content: grid, bands, data type and nodata."""
+    crs = src.crs.to_wkt() if src.crs is not None else None
+    # str() so that NaN nodata values compare equal
+    return (crs, tuple(src.transform), src.width, src.height, src.count,
+            src.dtypes, str(src.nodata), src.block_shapes[0])
+
+
+def block_sizes(src) -> tuple:
+    """Compressed byte sizes of the blocks of the first band, read from the TIFF block index."""
+    rows, cols = src.block_shapes[0]
+    return tuple(src.block_size(1, i, j) for i in range(math.ceil(src.height / rows))
+                 for j in range(math.ceil(src.width / cols)))
+
+
+def _fingerprint(path: str, stage: str) -> object:
+    """
+    Fingerprint stage of a tile, computed once per version of the file:
+    "header" (header key and file size), "extent" (grid and nodata), "blocks" (block sizes)
+    or "digest" (hash of the bytes).
+    """
+    signature = file_signature(path)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != signature:
+        cached = _fingerprints[path] = (signature, {})
+    stages = cached[1]
+    if stage not in stages:
+        if stage == "digest":
+            stages[stage] = file_digest(path)
+        else:
+            with dataset_pool.open(path) as src:
+                if stage == "blocks":
+                    stages[stage] = block_sizes(src)
+                else:
+                    stages["header"] = (header_key(src), signature[0])
+                    stages["extent"] = (src.crs, src.transform, src.width, src.height, src.nodata)
+    return stages[stage]
+
+
+def find_duplicates(img_paths: list[str]) -> tuple:
+    """
+    Find byte-identical tiles.
+
+    Tiles are compared in stages that get more expensive: the header and file
+    size, then the compressed size of every block, and only for tiles still
+    alike, a hash of their bytes. Tiles with a unique header or block layout are
+    never read.
+
+    Parameters
+    ----------
+    img_paths : list[str]
+        Paths to the tiles, in merge order.
+
+    Returns
+    -------
+    tuple
+        (dictionary mapping every duplicate to the first tile it duplicates,
+         bytes of the tiles that had to be hashed)
+    """
+    groups, bytes_hashed = [list(img_paths)], 0
+    for stage in ("header", "blocks", "digest"):
+        refined = []
+        for group in groups:
+            if len(group) < 2:
+                continue
+            if stage == "digest":
+                bytes_hashed += sum(_fingerprint(path, "header")[1] for path in group)
+            by_key = defaultdict(list)
+            for path in group:
+                by_key[_fingerprint(path, stage)].append(path)
+            refined += by_key.values()
+        groups = refined
+
+    duplicates = {}
+    for group in groups:
+        for path in group[1:]:
+            duplicates[path] = group[0]
+    return duplicates, bytes_hashed
+
+
+def _pixel_extent(extent: tuple, grid: tuple) -> tuple:
+    """
+    Pixel rectangle (col_off, row_off, col_end, row_end) of a tile on the grid of
+    the first tile, or None if the tile is not aligned with that grid.
+    """
+    crs, transform, width, height, _ = extent
+    grid_crs, grid_transform = grid
+    if crs != grid_crs or transform.b or transform.d or \
+            (transform.a, transform.e) != (grid_transform.a, grid_transform.e):
+        return None
+    col_off = (transform.c - grid_transform.c) / transform.a
+    row_off = (transform.f - grid_transform.f) / transform.e
+    if abs(col_off - round(col_off)) > 1e-6 or abs(row_off - round(row_off)) > 1e-6:
+        return None
+    col_off, row_off = round(col_off), round(row_off)
+    return (col_off, row_off, col_off + width, row_off + height)
+
+
+def _is_covered(rect: tuple, covering: list[tuple]) -> bool:
+    """Whether the pixel rectangle lies within the union of the covering rectangles."""
+    clipped = [(max(rect[0], c[0]), max(rect[1], c[1]), min(rect[2], c[2]), min(rect[3], c[3]))
+               for c in covering]
+    clipped = [c for c in clipped if c[0] < c[2] and c[1] < c[3]]
+    if not clipped:
+        return False
+    # cut the rectangle at every covering edge; each cell is then in or out of a covering rectangle
+    cols = sorted({rect[0], rect[2], *(c[0] for c in clipped), *(c[2] for c in clipped)})
+    rows = sorted({rect[1], rect[3], *(c[1] for c in clipped), *(c[3] for c in clipped)})
+    for col_off, col_end in zip(cols, cols[1:]):
+        for row_off, row_end in zip(rows, rows[1:]):
+            if not any(c[0] <= col_off and col_end <= c[2] and c[1] <= row_off and row_end <= c[3]
+                       for c in clipped):
+                return False
+    return True
+
+
+def _merge_empty(values: np.ndarray, nodataval: float) -> np.ndarray:
+    """Pixels of merged data the merge still treats as empty, compared as rasterio's merge does."""
+    if math.isnan(nodataval):
+        return np.isnan(values)
+    if np.issubdtype(values.dtype, np.floating):
+        return np.isclose(values, nodataval)
+    return values == nodataval
+
+
+def _window_cost(path: str, window: Window) -> int:
+    """
+    Compressed bytes of the blocks of a tile that a window of it touches, from
+    the TIFF block index (the blocks of all bands, if they are stored apart).
+    """
+    with dataset_pool.open(path) as src:
+        rows, cols = src.block_shapes[0]
+        bands = src.count if src.profile.get("interleave") == "band" else 1
+        blocks_per_row = math.ceil(src.width / cols)
+    sizes = _fingerprint(path, "blocks")
+    return bands * sum(sizes[i * blocks_per_row + j]
+                       for i in range(window.row_off // rows, math.ceil((window.row_off + window.height) / rows))
+                       for j in range(window.col_off // cols, math.ceil((window.col_off + window.width) / cols)))
+
+
+def _filled_mask(path: str, window: Window, nodataval: float, dtype: str) -> np.ndarray:
+    """
+    Pixels (per band) within a window of a tile that the merge copies and that
+    are no longer empty afterwards: valid in the tile's own mask, and not equal
+    to the nodata value of the merge once cast to the mosaic data type.
+    """
+    with dataset_pool.open(path) as src:
+        data = src.read(masked=True, window=window)
+    values = np.asarray(data.data, dtype=dtype)
+    return ~(np.ma.getmaskarray(data) | _merge_empty(values, nodataval))
+
+
+def _is_filled(rect: tuple, parts: list[tuple]) -> bool:
+    """
+    Whether every pixel of the rectangle, in every band, is filled, given the
+    (rectangle within rect, filled mask) parts of the covering tiles.
+    """
+    filled = np.zeros((parts[0][1].shape[0], rect[3] - rect[1], rect[2] - rect[0]), dtype=bool)
+    for part, mask in parts:
+        filled[:, part[1] - rect[1]:part[3] - rect[1], part[0] - rect[0]:part[2] - rect[0]] |= mask
+    return bool(filled.all())
+
+
+def deduplicate_tiles(img_paths: list[str], img_name: str, overlap_rule: str = DEFAULT_OVERLAP_RULE) -> list[str]:
+    """
+    Drop the tiles of a mosaic that do not need to be read by the stitch.
+
+    Byte-identical duplicates of an earlier tile are always dropped. Depending
+    on the overlap rule, tiles whose footprint is fully covered by earlier tiles
+    on the same pixel grid are skipped too. The merge copies a pixel of a tile
+    only where the mosaic is still empty, i.e. equal to the nodata value of the
+    first tile, or 0 if it has none. Under "valid" a covered tile is skipped only
+    if the earlier tiles left no empty pixel within it, so the mosaic cannot
+    change. Deciding this reads the covering tiles within its footprint, which
+    is only done if those blocks are smaller than the tile itself, and the
+    bytes read are subtracted from the bytes avoided. "footprint" skips every
+    covered tile without reading anything, giving up values the later tile may
+    have where the earlier tiles are empty.
+
+    Parameters
+    ----------
+    img_paths : list[str]
+        Paths to the tiles of one mosaic, in merge order.
+    img_name : str
+        The name of the mosaic (used for informative messages).
+    overlap_rule : str
+        One of OVERLAP_RULES.
+
+    Returns
+    -------
+    list[str]
+        The tiles to stitch, in merge order. The first tile is always kept.
+
+    Raises
+    ------
+    ValueError
+        If the overlap rule is unknown.
+    """
+    if overlap_rule not in OVERLAP_RULES:
+        raise ValueError(f"Unknown overlap rule {overlap_rule}, expected one of {OVERLAP_RULES}")
+    if len(img_paths) < 2:
+        return list(img_paths)
+
+    duplicates, bytes_hashed = find_duplicates(img_paths)
+    first_extent = _fingerprint(img_paths[0], "extent")
+    grid = (first_extent[0], first_extent[1])
+    # the empty value of the merge, and the data type its output is compared in
+    nodataval = 0 if first_extent[4] is None else first_extent[4]
+    dtype = _fingerprint(img_paths[0], "header")[0][5][0]
+    kept, covered, covering = [], [], []
+    coverage_reads, coverage_bytes_read = 0, 0
+    for path in img_paths:
+        if path in duplicates:
+            continue
+        rect = _pixel_extent(_fingerprint(path, "extent"), grid)
+        if overlap_rule != "exact" and rect is not None and kept and \
+                _is_covered(rect, [c for _, c in covering]):
+            if overlap_rule == "footprint":
+                covered.append(path)
+                continue
+            # the part of the tile every covering tile overlaps, and the window of it to read
+            parts = []
+            for p, c in covering:
+                part = (max(rect[0], c[0]), max(rect[1], c[1]), min(rect[2], c[2]), min(rect[3], c[3]))
+                if part[0] < part[2] and part[1] < part[3]:
+                    parts.append((p, part, Window(part[0] - c[0], part[1] - c[1],
+                                                  part[2] - part[0], part[3] - part[1])))
+            cost = sum(_window_cost(p, window) for p, _, window in parts)
+            # checking must cost less than reading the tile
+            if cost < _fingerprint(path, "header")[1]:
+                coverage_reads += len(parts)
+                coverage_bytes_read += cost
+                if _is_filled(rect, [(part, _filled_mask(p, window, nodataval, dtype))
+                                     for p, part, window in parts]):
+                    covered.append(path)
+                    continue
+        kept.append(path)
+        if rect is not None:
+            covering.append((path, rect))
+
+    # net of the covering blocks read to decide coverage
+    bytes_avoided = sum(_fingerprint(path, "header")[1] for path in [*duplicates, *covered]) - coverage_bytes_read
+    run_trace.record("tile_dedup", name=img_name, rule=overlap_rule, tiles=len(img_paths),
+                     duplicates=len(duplicates), covered=len(covered),
+                     bytes_avoided=bytes_avoided, bytes_hashed=bytes_hashed,
+                     coverage_reads=coverage_reads, coverage_bytes_read=coverage_bytes_read)
+    if duplicates or covered:
+        print(f"{img_name}: skipped {len(duplicates)} duplicate and {len(covered)} covered tiles "
+              f"({bytes_avoided / 1024 ** 2:.1f} MiB not read, net of {coverage_bytes_read / 1024 ** 2:.1f} MiB "
+              f"read to check coverage)")
+    return kept
@@ -0,0 +1,373 @@
+import json
+import os
+import time
+import numpy as np
+import rasterio as rio
+from raster_metadata import run_trace
+from file_manager.read_planner import plan_windows, record_plan
+
+
+# suffix of the JSON statistics sidecar written next to a raster file
+STATS_SIDECAR_SUFFIX = ".stats.json"
+
+# sidecars of rasters on GDAL virtual file systems (e.g. /vsimem), kept in memory
+_virtual_sidecars = {}
+
+
+class BandStatistics:
+    """
+    Streaming statistics of a single raster band.
+
+    Statistics are accumulated window by window, so they can be collected while
+    a band is being written without another pass over the data. The histogram
+    has a fixed number of bins whose range doubles whenever new values fall
+    outside of it, so the value range does not need to be known in advance.
+
+    Attributes
+    ----------
+    nodata : float or None
+        Nodata value excluded from the statistics (NaN is always excluded).
+    bins : int
+        Number of histogram bins (even).
+    """
+
+    def __init__(self, nodata=None, bins: int = 64):
+        self.nodata = nodata
+        self.bins = bins + bins % 2
+        self.total = 0
+        self.valid = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.hist_min = None
+        self.hist_width = None
+        self.hist_counts = np.zeros(self.bins, dtype=np.int64)
+
+    def update(self, data: np.ndarray) -> None:
+        """
+        Add a window of band values to the statistics.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Band values of the window.
+        """
+        data = np.asarray(data)
+        self.total += data.size
+        values = self._valid_values(data)
+        if values.size == 0:
+            return
+
+        # merge the window mean/variance into the running ones (Chan et al.)
+        count = values.size
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        delta = mean - self.mean
+        combined = self.valid + count
+        self.mean += delta * count / combined
+        self._m2 += m2 + delta ** 2 * self.valid * count / combined
+        self.valid = combined
+
+        low, high = values.min(), values.max()
+        self.minimum = min(self.minimum, low)
+        self.maximum = max(self.maximum, high)
+        self._update_histogram(values, low, high)
+
+    def remove(self, data: np.ndarray) -> None:
+        """
+        Remove a window of band values that was added before, e.g. when the window
+        is overwritten in place. The minimum and maximum cannot shrink without a
+        full pass, so they stay conservative bounds after a removal.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Band values of the window as they were added.
+        """
+        data = np.asarray(data)
+        self.total -= data.size
+        values = self._valid_values(data)
+        if values.size == 0:
+            return
+        count = values.size
+        remaining = self.valid - count
+        if remaining <= 0:
+            self.valid, self.mean, self._m2 = 0, 0.0, 0.0
+            self.hist_counts[:] = 0
+            return
+        # reverse of the merge in update()
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        remaining_mean = (self.valid * self.mean - count * mean) / remaining
+        delta = mean - remaining_mean
+        self._m2 = max(self._m2 - m2 - delta ** 2 * remaining * count / self.valid, 0.0)
+        self.mean = remaining_mean
+        self.valid = remaining
+        index = np.clip(((values - self.hist_min) / self.hist_width).astype(np.int64), 0, self.bins - 1)
+        self.hist_counts = np.maximum(self.hist_counts - np.bincount(index, minlength=self.bins), 0)
+
+    def _valid_values(self, data: np.ndarray) -> np.ndarray:
+        values = data.ravel().astype(np.float64)
+        valid = ~np.isnan(values)
+        if self.nodata is not None and not np.isnan(self.nodata):
+            valid &= values != self.nodata
+        return values[valid]
+
+    def _update_histogram(self, values, low, high):
+        if self.hist_min is None:
+            self.hist_min = low
+            span = high - low
+            self.hist_width = span / self.bins if span > 0 else max(abs(low), 1.0) / self.bins
+        # double the bin width until the histogram covers the new values
+        while low < self.hist_min or high > self.hist_min + self.hist_width * self.bins:
+            merged = self.hist_counts.reshape(-1, 2).sum(axis=1)
+            self.hist_counts = np.zeros(self.bins, dtype=np.int64)
+            if low < self.hist_min:
+                # keep the old range in the upper half
+                self.hist_counts[self.bins // 2:] = merged
+                self.hist_min -= self.hist_width * self.bins
+            else:
+                self.hist_counts[:self.bins // 2] = merged
+            self.hist_width *= 2
+        index = np.clip(((values - self.hist_min) / self.hist_width).astype(np.int64), 0, self.bins - 1)
+        self.hist_counts += np.bincount(index, minlength=self.bins)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self._m2 / self.valid)) if self.valid else None
+
+    @classmethod
+    def from_dict(cls, stats: dict, nodata=None) -> "BandStatistics":
+        """
+        Restore the statistics from the dictionary written by to_dict().
+        """
+        edges = stats["histogram"]["edges"]
+        band_stats = cls(nodata, bins=max(len(edges) - 1, 2))
+        band_stats.total = stats["count"]
+        band_stats.valid = stats["valid_count"]
+        if band_stats.valid:
+            band_stats.minimum, band_stats.maximum = stats["min"], stats["max"]
+            band_stats.mean = stats["mean"]
+            band_stats._m2 = stats["std"] ** 2 * band_stats.valid
+            band_stats.hist_min = edges[0]
+            band_stats.hist_width = edges[1] - edges[0]
+            band_stats.hist_counts = np.array(stats["histogram"]["counts"], dtype=np.int64)
+        return band_stats
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics as a JSON serialisable dictionary.
+        """
+        has_values = self.valid > 0
+        edges = (self.hist_min + self.hist_width * np.arange(self.bins + 1)).tolist() if has_values else []
+        return {
+            "min": float(self.minimum) if has_values else None,
+            "max": float(self.maximum) if has_values else None,
+            "mean": float(self.mean) if has_values else None,
+            "std": self.std,
+            "count": int(self.total),
+            "valid_count": int(self.valid),
+            "nodata_fraction": float(1 - self.valid / self.total) if self.total else None,
+            "histogram": {"edges": edges, "counts": self.hist_counts.tolist() if has_values else []}
+        }
+
+
+def write_with_statistics(dst, data: np.ndarray) -> list[dict]:
+    """
+    Write band data to an open dataset window by window while collecting statistics.
+
+    Windows follow the internal blocks of the destination, coalesced by the read
+    planner so that every block is written once. After writing, the
+    statistics are stored as GDAL statistics tags on each band and as a JSON
+    sidecar next to the file, and are added to the run trace.
+
+    Parameters
+    ----------
+    dst : rio.DatasetWriter
+        Destination dataset opened in write mode.
+    data : np.ndarray
+        Data of all bands with shape (count, height, width).
+
+    Returns
+    -------
+    list[dict]
+        Statistics of every band.
+    """
+    band_stats = [BandStatistics(dst.nodata) for _ in range(dst.count)]
+    for window in plan_windows(dst):
+        rows, cols = window.toslices()
+        write_window(dst, data[:, rows, cols], window, band_stats)
+    return finish_statistics(dst, band_stats)
+
+
+def compute_statistics(raster_file: str) -> list[dict]:
+    """
+    Collect the statistics of an existing raster that was not written through
+    write_with_statistics(), reading it through the planned windows, and store
+    them like a write would (GDAL tags, sidecar and run trace).
+
+    Parameters
+    ----------
+    raster_file : str
+        Path of the raster, which must be writable (tags are updated in place).
+
+    Returns
+    -------
+    list[dict]
+        Statistics of every band.
+    """
+    with rio.open(raster_file, 'r+') as dst:
+        start, nbytes = time.perf_counter(), 0
+        band_stats = [BandStatistics(dst.nodata) for _ in range(dst.count)]
+        windows = plan_windows(dst)
+        for window in windows:
+            data = dst.read(window=window)
+            nbytes += data.nbytes
+            for stats, band in zip(band_stats, data):
+                stats.update(band)
+        record_plan("statistics", dst, windows, nbytes, time.perf_counter() - start)
+        return finish_statistics(dst, band_stats)
+
+
+def write_window(dst, window_data: np.ndarray, window, band_stats: list[BandStatistics]) -> None:
+    """
+    Write the data of all bands to one window of a dataset and add it to the
+    running statistics of its bands.
+
+    Parameters
+    ----------
+    dst : rio.DatasetWriter
+        Destination dataset opened in write mode.
+    window_data : np.ndarray
+        Data of all bands in the window with shape (count, rows, cols).
+    window : rio.windows.Window
+        Window of the destination to write.
+    band_stats : list[BandStatistics]
+        Running statistics of every band of the destination.
+    """
+    window_data = window_data.astype(dst.dtypes[0], copy=False)
+    dst.write(window_data, window=window)
+    for stats, band in zip(band_stats, window_data):
+        stats.update(band)
+
+
+def finish_statistics(dst, band_stats: list[BandStatistics], raster_file: str = None) -> list[dict]:
+    """
+    Store the statistics collected by write_window() once all windows are written.
+
+    Parameters
+    ----------
+    dst : rio.DatasetWriter
+        Destination dataset opened in write mode.
+    band_stats : list[BandStatistics]
+        Running statistics of every band of the destination.
+    raster_file : str, optional
+        Final path of the raster if dst is written under a temporary name; the
+        sidecar and run trace refer to it. Defaults to the path of dst.
+
+    Returns
+    -------
+    list[dict]
+        Statistics of every band.
+    """
+    return _store_statistics(dst, [stats.to_dict() for stats in band_stats], raster_file)
+
+
+def update_window_statistics(dst, old_data: np.ndarray, new_data: np.ndarray) -> list[dict]:
+    """
+    Update the stored statistics of a dataset after a window was overwritten in place.
+
+    Parameters
+    ----------
+    dst : rio.DatasetWriter
+        Dataset opened in "r+" mode.
+    old_data : np.ndarray
+        Data of all bands in the window before it was overwritten.
+    new_data : np.ndarray
+        Data of all bands written to the window.
+
+    Returns
+    -------
+    list[dict] or None
+        Statistics of every band, or None if the dataset has no stored statistics.
+    """
+    stats_list = read_stats_sidecar(dst.name)
+    if stats_list is None:
+        return None
+    band_stats = [BandStatistics.from_dict(stats, dst.nodata) for stats in stats_list]
+    for stats, old_band, new_band in zip(band_stats, old_data, new_data):
+        stats.remove(old_band)
+        stats.update(new_band)
+    return _store_statistics(dst, [stats.to_dict() for stats in band_stats])
+
+
+def _store_statistics(dst, stats_list: list[dict], raster_file: str = None) -> list[dict]:
+    """
+    Store band statistics as GDAL tags, as a JSON sidecar and in the run trace.
+    """
+    raster_file = raster_file or dst.name
+    for bidx, stats in enumerate(stats_list, start=1):
+        if stats["valid_count"]:
+            # GDAL's own statistics metadata, read by gdalinfo and QGIS
+            dst.update_tags(bidx, STATISTICS_MINIMUM=stats["min"], STATISTICS_MAXIMUM=stats["max"],
+                            STATISTICS_MEAN=stats["mean"], STATISTICS_STDDEV=stats["std"],
+                            STATISTICS_VALID_PERCENT=100 * (1 - stats["nodata_fraction"]))
+    write_stats_sidecar(raster_file, stats_list)
+    run_trace.record("band_statistics", path=raster_file, bands=stats_list)
+    return stats_list
+
+
+def stats_sidecar_path(raster_file: str) -> str:
+    """Path of the statistics sidecar of a raster file."""
+    return raster_file + STATS_SIDECAR_SUFFIX
+
+
+def write_stats_sidecar(raster_file: str, stats_list: list[dict]) -> str:
+    """
+    Write band statistics to the JSON sidecar of a raster file.
+
+    Sidecars of rasters on GDAL virtual file systems are kept in memory until
+    the raster is materialised on disk.
+
+    Returns
+    -------
+    str
+        Path of the sidecar file.
+    """
+    sidecar = stats_sidecar_path(raster_file)
+    if raster_file.startswith("/vsi"): 
+        _virtual_sidecars[sidecar] = stats_list
+        return sidecar
+    with open(sidecar, "w") as json_file:
+        json.dump({"file": os.path.basename(raster_file), "bands": stats_list}, json_file)
+    return sidecar
+
+
+def read_stats_sidecar(raster_file: str) -> list[dict]:
+    """
+    Read the band statistics sidecar of a raster file.
+
+    Returns
+    -------
+    list[dict] or None
+        Statistics of every band, or None if the file has no sidecar.
+    """
+    sidecar = stats_sidecar_path(raster_file)
+    if raster_file.startswith("/vsi"): 
+        return _virtual_sidecars.get(sidecar)
+    if not os.path.exists(sidecar):
+        return None
+    with open(sidecar, "r") as json_file:
+        return json.load(json_file)["bands"]
+
+
+def discard_stats_sidecar(raster_file: str) -> None:
+    """
+    Delete the band statistics sidecar of a raster file, if any.
+    """
+    sidecar = stats_sidecar_path(raster_file)
+    if raster_file.startswith("/vsi"): 
+        _virtual_sidecars.pop(sidecar, None)
+    elif os.path.exists(sidecar): 
+        os.remove(sidecar)
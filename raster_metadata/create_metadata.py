@@ -1,7 +1,19 @@
 import rasterio as rio
+import numpy as np
+from file_manager.dataset_pool import dataset_pool
 from os.path import basename
 
 
+# header table columns and their array dtypes
+HEADER_FIELDS = {
+    "epsg": np.int64, "res_x": np.float64, "res_y": np.float64, "count": np.int64, 
+    "dtype": object, "nodata": np.float64, "has_nodata": bool, 
+    "left": np.float64, "bottom": np.float64, "right": np.float64, "top": np.float64, 
+    "origin_x": np.float64, "origin_y": np.float64, "width": np.int64, "height": np.int64, 
+    "block_rows": np.int64, "block_cols": np.int64
+}
+
+
 def get_rst_meta(rast_file): 
     """
     Extract metadata from a raster file.
@@ -59,3 +71,77 @@ def get_crs(rast_file):
         raise ValueError(f"Rasterio I/O error: {e}")
         
 
+def get_rst_header(rast_file): 
+    """
+    Extract the header fields used for schema validation from a raster file.
+
+    Parameters
+    ----------
+    rast_file : rio.DatasetReader
+        Raster file object.
+
+    Returns
+    -------
+    dict
+        Dictionary of scalar header fields (CRS as EPSG, resolution, band count,
+        dtype, nodata, bounds, grid origin and block shape of the first band).
+    """
+    epsg = rast_file.crs.to_epsg() if rast_file.crs is not None else None
+    block_rows, block_cols = rast_file.block_shapes[0]
+    header = {
+        "epsg": -1 if epsg is None else epsg, 
+        "res_x": rast_file.res[0], 
+        "res_y": rast_file.res[1], 
+        "count": rast_file.count, 
+        "dtype": rast_file.dtypes[0], 
+        "nodata": np.nan if rast_file.nodata is None else rast_file.nodata, 
+        "has_nodata": rast_file.nodata is not None, 
+        "left": rast_file.bounds.left, 
+        "bottom": rast_file.bounds.bottom, 
+        "right": rast_file.bounds.right, 
+        "top": rast_file.bounds.top, 
+        "origin_x": rast_file.transform.c, 
+        "origin_y": rast_file.transform.f, 
+        "width": rast_file.width, 
+        "height": rast_file.height, 
+        "block_rows": block_rows, 
+        "block_cols": block_cols
+    }
+    return header
+
+
+def get_header_table(raster_files: list[str]) -> dict: 
+    """
+    Build a columnar header table for a list of raster files.
+
+    Handles come from the shared dataset pool; the header fields are stored as one NumPy array
+    per field so that schema rules can be evaluated over all files at once.
+
+    Parameters
+    ----------
+    raster_files : list[str]
+        Paths to the raster files.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping "path" and every header field to a NumPy array
+        with one element per raster file.
+
+    Raises
+    ------
+    ValueError
+        If a raster file cannot be opened.
+    """
+    rows = []
+    for raster_file in raster_files: 
+        try: 
+            with dataset_pool.open(raster_file) as rast: 
+                rows.append(get_rst_header(rast))
+        except rio.errors.RasterioIOError as e: 
+            raise ValueError(f"Rasterio I/O error: {e}")
+    
+    table = {"path": np.array(raster_files, dtype=object)}
+    for field in HEADER_FIELDS: 
+        table[field] = np.array([row[field] for row in rows], dtype=HEADER_FIELDS[field])
+    return table
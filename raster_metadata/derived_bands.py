@@ -0,0 +1,257 @@
+import ast
+import os
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+import numpy as np
+import rasterio as rio
+from file_manager.dataset_pool import dataset_pool
+from file_manager.intermediate_store import IntermediateStore
+from file_manager.read_planner import plan_windows, record_plan
+from file_manager.transfer_engine import temporary_path
+from raster_metadata.band_statistics import BandStatistics, write_window, finish_statistics
+from raster_metadata import run_trace
+
+
+# NumPy functions that may be called in derived band expressions
+EXPRESSION_FUNCTIONS = {name: getattr(np, name) for name in
+                        ("abs", "sqrt", "log", "log10", "exp", "minimum", "maximum", "clip", "where")}
+
+# nodata value of derived rasters, set wherever an input is nodata or the result is not finite
+DERIVED_NODATA = -9999.0
+
+# arithmetic, comparisons and calls of EXPRESSION_FUNCTIONS on variables and numbers
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name,
+                  ast.Load, ast.Constant, ast.operator, ast.unaryop, ast.cmpop)
+
+
+@dataclass(frozen=True)
+class DerivedBand:
+    """
+    A raster derived from conformed variables by a NumPy expression,
+    e.g. ndvi = (nir - red) / (nir + red).
+
+    Attributes
+    ----------
+    name : str
+        Name of the derived raster (written as <name>.tif).
+    expression : str
+        The expression, over variable names (file names without extension).
+    variables : tuple
+        The variables the expression reads.
+    """
+    name: str
+    expression: str
+    variables: tuple
+    _code: object = field(compare=False, repr=False)
+
+    def evaluate(self, arrays: dict) -> np.ndarray:
+        """
+        Evaluate the expression on one window.
+
+        Parameters
+        ----------
+        arrays : dict
+            Dictionary mapping variable name to its (float) values in the window.
+
+        Returns
+        -------
+        np.ndarray
+            The derived values; divisions by zero give non-finite values.
+        """
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = eval(self._code, {"__builtins__": {}, **EXPRESSION_FUNCTIONS},
+                          {var: arrays[var] for var in self.variables})
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), next(iter(arrays.values())).shape)
+
+
+def parse_derived_band(name: str, expression: str, available: list[str]) -> DerivedBand:
+    """
+    Parse and check the expression of a derived band.
+
+    Raises
+    ------
+    ValueError
+        If the expression is not valid, uses anything but arithmetic, comparisons and
+        EXPRESSION_FUNCTIONS, or reads a variable that is not available.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression of derived band {name}: {e}")
+    variables = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"Derived band {name}: {type(node).__name__} is not allowed in '{expression}'")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name)
+                                               and node.func.id in EXPRESSION_FUNCTIONS):
+            raise ValueError(f"Derived band {name}: only {sorted(EXPRESSION_FUNCTIONS)} can be called")
+        if isinstance(node, ast.Name) and node.id not in EXPRESSION_FUNCTIONS:
+            variables.add(node.id)
+    unknown = variables - set(available)
+    if unknown:
+        raise ValueError(f"Derived band {name} reads unknown variables {sorted(unknown)}")
+    return DerivedBand(name, expression, tuple(sorted(variables)), compile(tree, name, "eval"))
+
+
+def compile_derived_bands(schema: dict, available: list[str]) -> list[DerivedBand]:
+    """
+    Compile the "derived_bands" of a schema, e.g.
+    {"derived_bands": {"ndvi": "(nir - red) / (nir + red)", "p99_p75": "_p99 / _p75"}}.
+
+    Parameters
+    ----------
+    schema : dict
+        The schema dictionary.
+    available : list[str]
+        Names of the variables the expressions can read.
+
+    Returns
+    -------
+    list[DerivedBand]
+        The derived bands, empty if the schema defines none.
+
+    Raises
+    ------
+    ValueError
+        If an expression is not valid or a derived band is named like a variable.
+    """
+    derived_bands = []
+    for name, expression in (schema.get("derived_bands") or {}).items():
+        if name.lower() in available:
+            raise ValueError(f"Derived band {name} has the name of a variable")
+        derived_bands.append(parse_derived_band(name, expression, available))
+    return derived_bands
+
+
+def _grid(src_rast) -> tuple:
+    crs = src_rast.crs.to_wkt() if src_rast.crs is not None else None
+    return (crs, tuple(src_rast.transform), src_rast.width, src_rast.height)
+
+
+def _invalid(src_rast, band: np.ndarray) -> np.ndarray:
+    invalid = np.isnan(band)
+    if src_rast.nodata is not None and not np.isnan(src_rast.nodata):
+        invalid |= band == src_rast.nodata
+    return invalid
+
+
+def _fused_pass(paths: dict, variables: list[str], derived_bands: list[DerivedBand], dest_dir: str) -> None:
+    """
+    Copy variables on one grid to dest_dir and write their derived bands, window by window.
+    Rasters are written under temporary names and renamed into place once complete.
+    """
+    start = time.perf_counter()
+    tmp_paths = {}  # final path : temporary path
+    try:
+        with ExitStack() as stack:
+            sources = {var: stack.enter_context(dataset_pool.open(paths[var])) for var in variables}
+            first = sources[variables[0]]
+            outputs = {}
+            for var, src in sources.items():
+                dest_path = os.path.join(dest_dir, os.path.basename(paths[var]))
+                tmp_paths[dest_path] = temporary_path(dest_path)
+                outputs[var] = stack.enter_context(rio.open(tmp_paths[dest_path], 'w', **src.profile))
+            derived_profile = first.profile.copy()
+            derived_profile.update({"count": 1, "dtype": "float32", "nodata": DERIVED_NODATA})
+            for band in derived_bands:
+                dest_path = os.path.join(dest_dir, band.name + ".tif")
+                tmp_paths[dest_path] = temporary_path(dest_path)
+                outputs[band.name] = stack.enter_context(rio.open(tmp_paths[dest_path], 'w', **derived_profile))
+            band_stats = {name: [BandStatistics(dst.nodata) for _ in range(dst.count)]
+                          for name, dst in outputs.items()}
+
+            # aligned to the blocks of every variable, as all of them are read window by window
+            windows = plan_windows(first, align_to=[src for src in sources.values() if src is not first])
+            read_bytes, read_seconds = dict.fromkeys(sources, 0), dict.fromkeys(sources, 0.0)
+            for window in windows:
+                arrays, invalid = {}, {}
+                for var, src in sources.items():
+                    read_start = time.perf_counter()
+                    data = src.read(window=window)
+                    read_seconds[var] += time.perf_counter() - read_start
+                    read_bytes[var] += data.nbytes
+                    write_window(outputs[var], data, window, band_stats[var])
+                    # expressions read the first band of a variable
+                    arrays[var] = data[0].astype(np.float64)
+                    invalid[var] = _invalid(src, arrays[var])
+                for band in derived_bands:
+                    result = band.evaluate(arrays)
+                    mask = ~np.isfinite(result)
+                    for var in band.variables:
+                        mask |= invalid[var]
+                    result = np.where(mask, DERIVED_NODATA, result)
+                    write_window(outputs[band.name], result[np.newaxis], window, band_stats[band.name])
+
+            # against windows aligned to the first variable only
+            baseline = plan_windows(first)
+            for var, src in sources.items():
+                record_plan("derived_bands", src, windows, read_bytes[var], read_seconds[var], baseline)
+            final_paths = {tmp_path: dest_path for dest_path, tmp_path in tmp_paths.items()}
+            for name, dst in outputs.items():
+                finish_statistics(dst, band_stats[name], raster_file=final_paths[dst.name])
+    except BaseException:
+        for tmp_path in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    for dest_path, tmp_path in tmp_paths.items():
+        dataset_pool.invalidate(dest_path)
+        os.replace(tmp_path, dest_path)
+    run_trace.record("derived_bands", bands={band.name: band.expression for band in derived_bands},
+                     variables=variables, windows=len(windows), seconds=time.perf_counter() - start)
+
+
+def write_conformed(store: IntermediateStore, dest_dir: str, derived_bands: list[DerivedBand]) -> list[str]:
+    """
+    Materialise the conformed variables of an intermediate store in a destination
+    directory, computing the derived bands in the same pass.
+
+    Variables read by derived bands are written window by window together with
+    the derived rasters, on the same grid and write path, so the derived bands
+    need no extra read of the final variables. All other variables are moved as
+    usual.
+
+    Parameters
+    ----------
+    store : IntermediateStore
+        Store holding the conformed variables.
+    dest_dir : str
+        The path to the destination directory.
+    derived_bands : list[DerivedBand]
+        The derived bands to compute.
+
+    Returns
+    -------
+    list[str]
+        Paths of the derived rasters.
+
+    Raises
+    ------
+    ValueError
+        If the variables read by a derived band are missing or not on the same grid.
+    """
+    paths = {os.path.splitext(os.path.basename(path))[0].lower(): path for path in store.paths()}
+    groups = {}  # grid : derived bands whose variables are on it
+    for band in derived_bands:
+        missing = [var for var in band.variables if var not in paths]
+        if missing:
+            raise ValueError(f"Derived band {band.name} reads missing variables {missing}")
+        grids = set()
+        for var in band.variables:
+            with dataset_pool.open(paths[var]) as src:
+                grids.add(_grid(src))
+        if len(grids) != 1:
+            raise ValueError(f"Variables {list(band.variables)} of derived band {band.name} are not on the same grid")
+        groups.setdefault(grids.pop(), []).append(band)
+
+    derived_paths = []
+    for bands in groups.values():
+        variables = sorted({var for band in bands for var in band.variables})
+        _fused_pass(paths, variables, bands, dest_dir)
+        for var in variables:
+            store.remove(os.path.basename(paths[var]))
+        derived_paths += [os.path.join(dest_dir, band.name + ".tif") for band in bands]
+    store.move_all(dest_dir)
+    return derived_paths
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+
+# process-wide list of trace records of the current run
+_records = []
+_trace_lock = threading.Lock()
+
+
+def record(stage: str, **fields) -> dict:
+    """
+    Add a record to the run trace.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the pipeline stage producing the record.
+    **fields
+        JSON serialisable values describing the event.
+
+    Returns
+    -------
+    dict
+        The stored record.
+    """
+    entry = {"stage": stage, "time": time.time(), **fields}
+    with _trace_lock:
+        _records.append(entry)
+    return entry
+
+
+def get_records(stage: str = None) -> list[dict]:
+    """
+    Get the records of the current run, optionally only those of one stage.
+    """
+    with _trace_lock:
+        return [entry for entry in _records if stage is None or entry["stage"] == stage]
+
+
+def reset() -> None:
+    """
+    Clear the run trace, e.g. at the start of a new run.
+    """
+    with _trace_lock:
+        _records.clear()
+
+
+def dump(trace_file: str) -> str:
+    """
+    Write the run trace to a JSON file.
+
+    Parameters
+    ----------
+    trace_file : str
+        Path of the JSON file.
+
+    Returns
+    -------
+    str
+        The path of the written file.
+    """
+    with open(trace_file, "w") as json_file:
+        json.dump(get_records(), json_file, indent=2, default=str)
+    return trace_file
@@ -2,44 +2,84 @@ from file_manager.raster_file_manager import RasterFileManager
 from validator.validate_raster_metadata import validate_raster_properties
 from validator.validate_file import validate_file_list
 from merge.merge_raster import stitch_tiffs_by_pattern
+from merge.incremental_mosaic import stitch_incremental, clear_pending_regions
 from os.path import join
 from os.path import dirname
 import os
+import sys
+import json
+import time
 import shutil
+from datetime import datetime, timezone
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from schema.schema_creator import update_schema
+from schema.schema_rules import load_schema, SCHEMA_FILE
 import tempfile
 import rasterio as rio
 from warper.raster_projector import project_raster
-import json
-from rasterio.crs import CRS
+from warper.region_update import update_region
+from raster_metadata import run_trace
+from file_manager.dataset_pool import dataset_pool
+from file_manager.intermediate_store import IntermediateStore, DEFAULT_MEMORY_THRESHOLD
+from file_manager.transfer_engine import TransferEngine, print_progress
+from file_manager.file_discovery import split_archive_path, split_vsizip_path
+from file_manager.site_watcher import SiteWatcher, write_status, DEFAULT_SETTLE_SECONDS
+from raster_metadata.derived_bands import compile_derived_bands, write_conformed
+from merge.tile_dedup import OVERLAP_RULES, DEFAULT_OVERLAP_RULE
+
+
+# schema shipped with the pipeline, independent of the working directory
+DEFAULT_SCHEMA_FILE = join(dirname(os.path.abspath(__file__)), "schema", "json_schema.json")
 
+# GDAL configuration shared by all sites of a batch (overridable by the batch config)
+DEFAULT_GDAL_OPTIONS = {"GDAL_CACHEMAX": 512}
 
-canopy_metrics_var_dir = ["C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/drive-download-20240509T134954Z-001/ept_NY5023/ept-data/canopy_metrics", 
-                          "C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/drive-download-20240509T134954Z-001/ept_NY5022/ept-data/canopy_metrics", 
-                          "C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/drive-download-20240509T134954Z-001/ept_NY5122/ept-data/canopy_metrics", 
-                          "C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/drive-download-20240509T134954Z-001/ept_NY5123/ept-data/canopy_metrics"]
+# GDAL environment kept open by batch worker processes
+_gdal_env = None
 
-# canopy_metrics_var_dir = "C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/canopy_metrics"
-rast_files = "C:/Users/khalsz/Documents/CarbonKeepers/lidar_data/raster_file"
+# seconds between two polls of the input roots in watch mode
+DEFAULT_POLL_INTERVAL = 10.0
 
+# stitched canopy metrics variable whose resolution the schema takes on
+SCHEMA_REFERENCE_VARIABLE = "agb"
 
 
-def AGB_raster_processor(canopy_metrics_var_dir: str, rast_files_dir: str) -> bool:
+def AGB_raster_processor(canopy_metrics_var_dir: list[str], rast_files_dir: str, 
+                         output_dir: str = None, schema_file: str = SCHEMA_FILE, 
+                         memory_threshold: int = DEFAULT_MEMORY_THRESHOLD, incremental: bool = False, 
+                         overlap_rule: str = DEFAULT_OVERLAP_RULE) -> bool:
     """
     Process raster files for AGB estimation.
 
     This function performs several steps:
-    1. Creates a schema.
-    2. Moves all other variables to the same location as the forest canopy metrics raster variable.
+    1. Stitches the forest canopy metrics rasters and updates the schema.
+    2. Moves all other variables to the same location (intermediate store) as the forest canopy metrics raster variable.
     3. Validates to ensure the right variables are in the canopy_metrics_var_dir.
     4. Validates the metadata of the raster variables.
+    5. Writes the conformed variables, and the derived bands configured in the
+       schema ("derived_bands"), to the final variable directory.
 
     Parameters
     ----------
-    canopy_metrics_var_dir : str
-        The path to the directory containing forest canopy metrics raster variables.
+    canopy_metrics_var_dir : list[str]
+        The paths to the directories containing forest canopy metrics raster variables.
+        Zip archives, or directories inside them, are read in place without extraction.
     rast_files : str
-        The path to the directory containing all raster files.
+        The path to the directory containing all raster files (may be inside a zip archive).
+    output_dir : str, optional
+        Directory receiving the 'final_variable' directory.
+        Defaults to the parent directory of rast_files_dir.
+    schema_file : str
+        The path to the JSON schema file.
+    memory_threshold : int
+        Size in bytes up to which intermediate rasters are kept in memory.
+    incremental : bool
+        Keep the stitched mosaics in 'lidar_raster' under output_dir and only update
+        them, and the outputs of the previous run, where new or changed tiles arrived.
+    overlap_rule : str
+        Which canopy metrics tiles are skipped before stitching besides byte-identical
+        duplicates, one of OVERLAP_RULES.
 
     Returns
     -------
@@ -52,63 +92,477 @@ def AGB_raster_processor(canopy_metrics_var_dir: str, rast_files_dir: str) -> bo
         If an error occurs during any of the processing steps.
     """
     
-    # create temporary directory to move all raster files
-    with tempfile.TemporaryDirectory() as temp_dir: 
-        
-        # creating temporary directory file instance
-        temp_dir_inst = RasterFileManager(temp_dir)
-        
-        # stitching together (by file name pattern) raster files from canopy metrics extrator
-        stiched_rast = stitch_tiffs_by_pattern(dirs = canopy_metrics_var_dir, dest_path=join(dirname(rast_files_dir), 'lidar_raster'))
-        
-        # creating file class instances
-        raster_dir_inst = RasterFileManager(rast_files_dir)
-        lidar_dir_inst = RasterFileManager(stiched_rast)
-        lidar_raster_dir = lidar_dir_inst.tif_ext_file()
+    # starting a new run trace (band statistics and other per-stage reports)
+    run_trace.reset()
+    
+    # loading the (cached) json schema
+    schema = load_schema(schema_file)
+    # checking the derived band expressions before any processing
+    derived_bands = compile_derived_bands(schema, RasterFileManager().file_list)
+    if output_dir is None: 
+        output_dir = _default_output_dir(rast_files_dir)
+    final_directory = os.path.join(output_dir, "final_variable")
+    
+    if incremental: 
+        # updating persistent mosaics only where new or changed tiles arrived
+        lidar_raster_dir = join(output_dir, 'lidar_raster')
+        dirty_regions = stitch_incremental(dirs=canopy_metrics_var_dir, dest_path=lidar_raster_dir, crs=schema['crs'], 
+                                           overlap_rule=overlap_rule)
+        if _update_final_regions(lidar_raster_dir, rast_files_dir, final_directory, dirty_regions, 
+                                 schema_file=schema_file, derived_bands=derived_bands): 
+            # only now are the rewritten mosaic regions no longer pending
+            _clear_pending(lidar_raster_dir, dirty_regions)
+            run_trace.record("dataset_pool", **dataset_pool.stats())
+            run_trace.dump(join(final_directory, "run_trace.json"))
+            print("Incremental update complete. Only regions covered by new tiles were rewritten!")
+            return
+    
+    # create temporary directory and intermediate store holding all raster files
+    # (in memory up to memory_threshold bytes each, spilled to the temporary directory above)
+    with tempfile.TemporaryDirectory() as temp_dir, IntermediateStore(temp_dir, memory_threshold) as store: 
+        # copying inputs into the store in parallel, with progress
+        engine = TransferEngine(progress=print_progress)
         
-        # initializing json file path
-        json_schema_file = os.path.abspath(os.path.join("schema", "json_schema.json"))
+        if incremental: 
+            # working on copies of the persistent mosaics
+            store.add_files([join(lidar_raster_dir, file_name) for file_name in dirty_regions], engine=engine)
+        else: 
+            # stitching together (by file name pattern) raster files from canopy metrics extrator,
+            # assigning the schema CRS to stitched files without one in the same write
+            stitch_tiffs_by_pattern(dirs = canopy_metrics_var_dir, dest_path=temp_dir, crs=schema['crs'], store=store, 
+                                    overlap_rule=overlap_rule)
         
-        with open(json_schema_file, 'r') as json_file: 
-            schema = json.load(json_file)
-            
-            
-        for file_name in lidar_raster_dir: 
-            file_path = join(lidar_dir_inst.raster_file_dir, file_name)
-            with rio.open(file_path, 'r+') as lid_rast:
-                # assigning CRS attribute for raster files with None CRS value
-                if lid_rast.crs is None: 
-                    lid_rast.crs = CRS.from_epsg(schema['crs'])
-                  
         # updating existing schema with attribute of forest canopy metrics raster variable
-        schema = update_schema(join(lidar_dir_inst.raster_file_dir, lidar_dir_inst.tif_ext_file()[0]))
+        schema = update_schema(_schema_reference(store.paths()), schema_file)
         
-        # copying all other tif file variables to the same location
-        raster_dir_inst.copy_files(dest_dir=temp_dir_inst.raster_file_dir)
-        lidar_dir_inst.copy_files(dest_dir=temp_dir_inst.raster_file_dir)
+        # adding all other tif file variables to the same intermediate store
+        # (straight out of the archive if rast_files_dir is inside one)
+        raster_dir_inst = RasterFileManager(rast_files_dir)
+        store.add_files([entry.path for entry in raster_dir_inst.tif_entries()], engine=engine)
         
         # creating raster variable files final destination
-        parent_dir = dirname(lidar_dir_inst.raster_file_dir)
-        final_directory = os.path.join(parent_dir, "final_variable")
         if os.path.exists(final_directory): 
+            dataset_pool.invalidate(final_directory)
             shutil.rmtree(final_directory)
-        os.mkdir(final_directory)
+        os.makedirs(final_directory)
         
         # validating to ensure the right variables are in the 
-        validate_file_list(temp_dir_inst.raster_file_dir)
+        validate_file_list(temp_dir, tif_files=store.paths())
         
         # validating the raster variable metadata. 
-        validat_result = validate_raster_properties(temp_dir_inst.raster_file_dir, schema)
+        validat_result = validate_raster_properties(temp_dir, schema, raster_files=store.paths())
         
         if validat_result: 
-            # moving all from the temporary storage
-            temp_dir_inst.move_file(dest_dir=final_directory)
+            # moving all from the intermediate storage, writing the derived bands in the same pass
+            write_conformed(store, final_directory, derived_bands)
+            if incremental: 
+                _clear_pending(lidar_raster_dir, dirty_regions)
+            run_trace.record("dataset_pool", **dataset_pool.stats())
+            run_trace.dump(join(final_directory, "run_trace.json"))
             print("Validation process complete. All data variable passed validation process!")
         else: 
             raise Exception(f"Error validating variables")
 
 
+def _update_final_regions(lidar_raster_dir: str, rast_files_dir: str, final_directory: str, 
+                          dirty_regions: dict, schema_file: str = SCHEMA_FILE, 
+                          derived_bands: list = None) -> bool: 
+    """
+    Bring the outputs of a previous run up to date by rewriting only the regions
+    of the mosaics that changed.
+
+    This is only possible if the previous run completed (its run trace exists),
+    neither the schema nor the other raster variables changed since, no derived
+    band reads a changed mosaic, and every changed region lies within the
+    existing output.
+
+    Parameters
+    ----------
+    lidar_raster_dir : str
+        The directory holding the persistent mosaics.
+    rast_files_dir : str
+        The path to the directory containing all other raster files.
+    final_directory : str
+        The directory holding the outputs of the previous run.
+    dirty_regions : dict
+        Dictionary mapping mosaic file name to the bounds of its pending regions
+        (rewritten since the outputs were last brought up to date).
+    schema_file : str
+        The path to the JSON schema file.
+    derived_bands : list[DerivedBand], optional
+        The derived bands written by the previous run.
+
+    Returns
+    -------
+    bool
+        True if the outputs were updated in place, False if a full run is needed.
+    """
+    marker = join(final_directory, "run_trace.json")
+    if not os.path.exists(marker): 
+        return False
+    last_run = os.path.getmtime(marker)
+    if os.path.getmtime(schema_file) >= last_run: 
+        return False
+    changed = {os.path.splitext(file_name)[0] for file_name, regions in dirty_regions.items() if regions}
+    if any(changed & set(band.variables) for band in derived_bands or []): 
+        # derived bands are only written by the full conformance pass
+        return False
+    raster_dir_inst = RasterFileManager(rast_files_dir)
+    if any(_modified_time(entry.path) >= last_run for entry in raster_dir_inst.tif_entries()): 
+        return False
+    if not all(os.path.exists(join(final_directory, file_name)) for file_name in dirty_regions): 
+        return False
+    
+    for file_name, regions in dirty_regions.items(): 
+        for bounds in regions: 
+            if not update_region(join(lidar_raster_dir, file_name), join(final_directory, file_name), bounds): 
+                return False
+    return True
+
+
+def _schema_reference(canopy_metrics_paths: list[str]) -> str: 
+    """
+    Pick the stitched canopy metrics raster the schema is updated from:
+    SCHEMA_REFERENCE_VARIABLE if it was stitched, otherwise the first by name.
+
+    Raises
+    ------
+    ValueError
+        If no canopy metrics raster was stitched.
+    """
+    if not canopy_metrics_paths: 
+        raise ValueError("No canopy metrics raster was stitched")
+    by_name = {os.path.splitext(os.path.basename(path))[0].lower(): path for path in canopy_metrics_paths}
+    return by_name.get(SCHEMA_REFERENCE_VARIABLE, by_name[min(by_name)])
+
+
+def _default_output_dir(rast_files_dir: str) -> str: 
+    """
+    Directory receiving 'final_variable' when none is given: next to the raster
+    directory, or next to the archive holding it.
+    """
+    archive, _ = split_archive_path(rast_files_dir)
+    return dirname(os.path.abspath(archive)) if archive else dirname(rast_files_dir)
+
+
+def _check_sites(sites: list[dict]) -> None: 
+    """
+    Reject sites that would overwrite each other's results or outputs when run together.
+
+    Raises
+    ------
+    ValueError
+        If two sites have the same name or the same output directory.
+    """
+    names, output_dirs = set(), {}  # output directory : site name
+    for site in sites: 
+        if site['name'] in names: 
+            raise ValueError(f"Duplicate site name {site['name']}")
+        names.add(site['name'])
+        output_dir = os.path.abspath(site.get('output_dir') or _default_output_dir(site['raster_dir']))
+        if output_dir in output_dirs: 
+            raise ValueError(f"Sites {output_dirs[output_dir]} and {site['name']} share the output directory "
+                             f"{output_dir}; give each site its own 'output_dir'")
+        output_dirs[output_dir] = site['name']
+
+
+def _clear_pending(lidar_raster_dir: str, dirty_regions: dict) -> None: 
+    """
+    Mark the pending regions of the mosaics as applied, once the outputs were updated.
+    """
+    for file_name in dirty_regions: 
+        clear_pending_regions(join(lidar_raster_dir, file_name))
+
+
+def _modified_time(path: str) -> float: 
+    """
+    Modification time of a discovered file, stat'ed now: the cached inventory
+    does not see files rewritten in place. Archive members count as modified
+    whenever their archive was rewritten, as the member timestamps are only
+    those recorded at zipping time.
+    """
+    archive, _ = split_vsizip_path(path)
+    return os.path.getmtime(archive if archive is not None else path)
+
+
+def _init_worker(gdal_options: dict) -> None: 
+    """
+    Enter a GDAL environment that stays active for the lifetime of the process.
+    """
+    global _gdal_env
+    _gdal_env = rio.Env(**gdal_options)
+    _gdal_env.__enter__()
+
+
+def _run_site(site: dict, schema_file: str) -> tuple: 
+    """
+    Run the pipeline for one site of a batch config.
+
+    Returns
+    -------
+    tuple
+        (site name, error message or None)
+    """
+    try: 
+        AGB_raster_processor(site['canopy_metrics_dirs'], site['raster_dir'], 
+                             output_dir=site.get('output_dir'), schema_file=schema_file, 
+                             memory_threshold=site.get('memory_threshold', DEFAULT_MEMORY_THRESHOLD), 
+                             incremental=site.get('incremental', False), 
+                             overlap_rule=site.get('overlap_rule', DEFAULT_OVERLAP_RULE))
+        return site['name'], None
+    except Exception as e: 
+        return site['name'], f"{e}" + (f" ({e.__cause__})" if e.__cause__ else "")
+
+
+def load_batch_config(config_file: str) -> dict: 
+    """
+    Load a batch config listing the sites to process.
+
+    The config is a JSON file of the form::
+
+        {"sites": [{"name": "NY50", "canopy_metrics_dirs": ["..."], "raster_dir": "...",
+                    "output_dir": "...", "memory_threshold": 268435456, "incremental": true, 
+                    "overlap_rule": "valid"}],
+         "jobs": 4, "schema": "schema/json_schema.json", "gdal": {"GDAL_CACHEMAX": 512},
+         "watch": {"status_file": "watch_status.json", "poll_interval": 10, "settle_seconds": 5}}
+
+    Only "sites" is required; relative paths are resolved against the config file's directory.
+    Sites without "output_dir" write next to their "raster_dir", so sites sharing
+    the parent of their raster directories need an explicit "output_dir".
+
+    Parameters
+    ----------
+    config_file : str
+        The path to the JSON config.
+
+    Returns
+    -------
+    dict
+        The config with absolute site paths and a name for every site.
+
+    Raises
+    ------
+    ValueError
+        If the config has no sites, a site misses its input directories, or two
+        sites have the same name or output directory.
+    """
+    with open(config_file, 'r') as json_file: 
+        config = json.load(json_file)
+    
+    base_dir = dirname(os.path.abspath(config_file))
+    resolve = lambda path: path if path is None else os.path.join(base_dir, path)
+    if not config.get('sites'): 
+        raise ValueError(f"Batch config {config_file} contains no sites")
+    for index, site in enumerate(config['sites']): 
+        if 'canopy_metrics_dirs' not in site or 'raster_dir' not in site: 
+            raise ValueError(f"Site {index} of {config_file} needs 'canopy_metrics_dirs' and 'raster_dir'")
+        site['canopy_metrics_dirs'] = [resolve(d) for d in site['canopy_metrics_dirs']]
+        site['raster_dir'] = resolve(site['raster_dir'])
+        site['output_dir'] = resolve(site.get('output_dir'))
+        site.setdefault('name', os.path.basename(site['raster_dir'].rstrip('/\\')) + f"-{index}")
+    _check_sites(config['sites'])
+    if config.get('schema'): 
+        config['schema'] = resolve(config['schema'])
+    if config.get('watch', {}).get('status_file'): 
+        config['watch']['status_file'] = resolve(config['watch']['status_file'])
+    return config
+
+
+def run_batch(sites: list[dict], jobs: int = 1, schema_file: str = SCHEMA_FILE, 
+              gdal_options: dict = None) -> dict: 
+    """
+    Process many sites in long-lived processes with shared warm state.
+
+    With jobs=1 all sites run in this process; otherwise they are spread over
+    `jobs` worker processes. Each process enters one GDAL environment and keeps
+    its file inventory, schema and dataset handle caches across the sites it runs.
+    A failing site does not stop the others.
+
+    Parameters
+    ----------
+    sites : list[dict]
+        Sites as returned by load_batch_config.
+    jobs : int
+        Number of worker processes.
+    schema_file : str
+        The path to the JSON schema file.
+    gdal_options : dict, optional
+        GDAL configuration options of the shared environment.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping site name to an error message, or None on success.
+
+    Raises
+    ------
+    ValueError
+        If two sites have the same name or output directory.
+    """
+    _check_sites(sites)
+    gdal_options = {**DEFAULT_GDAL_OPTIONS, **(gdal_options or {})}
+    results = {}
+    if jobs <= 1: 
+        with rio.Env(**gdal_options): 
+            for site in sites: 
+                name, error = _run_site(site, schema_file)
+                results[name] = error
+    else: 
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, 
+                                 initargs=(gdal_options,)) as executor: 
+            futures = [executor.submit(_run_site, site, schema_file) for site in sites]
+            for future in as_completed(futures): 
+                name, error = future.result()
+                results[name] = error
+    
+    for name, error in results.items(): 
+        print(f"Site {name}: {'OK' if error is None else 'FAILED - ' + error}")
+    return results
+
+
+def _timestamp() -> str: 
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def run_watch(sites: list[dict], schema_file: str = SCHEMA_FILE, gdal_options: dict = None, 
+              status_file: str = "watch_status.json", poll_interval: float = DEFAULT_POLL_INTERVAL, 
+              settle_seconds: float = DEFAULT_SETTLE_SECONDS, max_polls: int = None) -> dict: 
+    """
+    Watch the input roots of many sites and process a site whenever new or changed
+    files landed in them and have settled.
+
+    Sites run incrementally in this process, one after another, inside one GDAL
+    environment, so the file inventory, schema and dataset handle caches and the
+    GDAL block cache stay warm between batches, and only the mosaic regions and
+    outputs covered by the new tiles are rewritten. The state of every site is
+    written to a JSON status file after each change, e.g.::
+
+        {"updated": "...", "pending": ["NY51"],
+         "sites": {"NY50": {"state": "ok", "started": "...", "seconds": 2.1, "error": null, "runs": 3}}}
+
+    Parameters
+    ----------
+    sites : list[dict]
+        Sites as returned by load_batch_config.
+    schema_file : str
+        The path to the JSON schema file.
+    gdal_options : dict, optional
+        GDAL configuration options of the shared environment.
+    status_file : str
+        The path of the JSON status file.
+    poll_interval : float
+        Seconds between two polls of the input roots.
+    settle_seconds : float
+        Seconds the inputs of a site must stay unchanged before it is processed.
+    max_polls : int, optional
+        Stop after this many polls (runs until interrupted if None).
+
+    Returns
+    -------
+    dict
+        Dictionary mapping site name to its last status.
+    """
+    _check_sites(sites)
+    gdal_options = {**DEFAULT_GDAL_OPTIONS, **(gdal_options or {})}
+    sites = [{**site, 'incremental': True} for site in sites]
+    watcher = SiteWatcher(sites, settle_seconds=settle_seconds)
+    status = {"updated": _timestamp(), "pending": [], 
+              "sites": {site['name']: {"state": "idle", "runs": 0} for site in sites}}
+    
+    def publish(): 
+        status["updated"] = _timestamp()
+        status["pending"] = watcher.pending()
+        write_status(status_file, status)
+    
+    polls = 0
+    with rio.Env(**gdal_options): 
+        try: 
+            while max_polls is None or polls < max_polls: 
+                polls += 1
+                for site in watcher.poll(): 
+                    site_status = status["sites"][site['name']]
+                    site_status.update({"state": "running", "started": _timestamp()})
+                    publish()
+                    start = time.perf_counter()
+                    _, error = _run_site(site, schema_file)
+                    site_status.update({"state": "ok" if error is None else "failed", "error": error, 
+                                        "seconds": time.perf_counter() - start, 
+                                        "runs": site_status["runs"] + 1})
+                    # a failed site is retried a few times with growing delays, then waits for new inputs
+                    watcher.done(site, error is None)
+                    print(f"Site {site['name']}: {'OK' if error is None else 'FAILED - ' + error}")
+                publish()
+                if max_polls is None or polls < max_polls: 
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt: 
+            print("Watch stopped")
+    return status["sites"]
+
+
+def main(argv: list[str] = None) -> int: 
+    """
+    Command line entry point.
+
+    Returns
+    -------
+    int
+        Exit status: 0 if every site was processed (in watch mode, if the last run of
+        every site succeeded), 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Raster data ETL pipeline for AGB estimation.")
+    parser.add_argument("--canopy-metrics", nargs="+", metavar="DIR", 
+                        help="directories containing forest canopy metrics rasters (single site)")
+    parser.add_argument("--raster-dir", help="directory containing the other raster variables (single site)")
+    parser.add_argument("--output-dir", help="directory receiving final_variable/ (single site)")
+    parser.add_argument("--config", help="JSON batch config listing many sites")
+    parser.add_argument("--jobs", type=int, help="number of worker processes for batch mode")
+    parser.add_argument("--schema", help="path to the JSON schema file")
+    parser.add_argument("--incremental", action="store_true", 
+                        help="keep mosaics in lidar_raster/ and only update regions covered by new tiles")
+    parser.add_argument("--overlap-rule", choices=OVERLAP_RULES, 
+                        help="tiles skipped before stitching besides exact duplicates: 'exact' none, "
+                             "'valid' tiles whose pixels earlier tiles already filled (default), "
+                             "'footprint' tiles covered by earlier tiles")
+    parser.add_argument("--watch", action="store_true", 
+                        help="keep running and process sites incrementally whenever new files land in their inputs")
+    parser.add_argument("--status-file", help="JSON status file written in watch mode (default: watch_status.json)")
+    parser.add_argument("--poll-interval", type=float, help="seconds between polls in watch mode")
+    parser.add_argument("--settle", type=float, help="seconds new files must stay unchanged in watch mode")
+    args = parser.parse_args(argv)
+    
+    if args.config: 
+        config = load_batch_config(args.config)
+        sites = config['sites']
+    elif args.canopy_metrics and args.raster_dir: 
+        config = {}
+        sites = [{'name': os.path.basename(args.raster_dir.rstrip('/\\')), 'canopy_metrics_dirs': args.canopy_metrics, 
+                  'raster_dir': args.raster_dir, 'output_dir': args.output_dir}]
+    else: 
+        parser.error("either --config or both --canopy-metrics and --raster-dir are required")
+    if args.incremental: 
+        for site in sites: 
+            site['incremental'] = True
+    if args.overlap_rule: 
+        for site in sites: 
+            site['overlap_rule'] = args.overlap_rule
+    
+    schema_file = args.schema or config.get('schema') or DEFAULT_SCHEMA_FILE
+    if args.watch: 
+        watch = config.get('watch', {})
+        statuses = run_watch(sites, schema_file=schema_file, gdal_options=config.get('gdal'), 
+                             status_file=args.status_file or watch.get('status_file', "watch_status.json"), 
+                             poll_interval=args.poll_interval or watch.get('poll_interval', DEFAULT_POLL_INTERVAL), 
+                             settle_seconds=args.settle if args.settle is not None else 
+                             watch.get('settle_seconds', DEFAULT_SETTLE_SECONDS))
+        # the last run of every site decides, as for a batch
+        return 0 if all(site_status["state"] != "failed" for site_status in statuses.values()) else 1
+    
+    results = run_batch(sites, jobs=args.jobs or config.get('jobs', 1), 
+                        schema_file=schema_file, gdal_options=config.get('gdal'))
+    return 0 if all(error is None for error in results.values()) else 1
+
+
 if __name__ == "__main__": 
-    AGB_raster_processor(canopy_metrics_var_dir, rast_files)
+    sys.exit(main())
     
      
\ No newline at end of file
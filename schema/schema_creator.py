@@ -1,23 +1,26 @@
 
 import rasterio as rio
-import os
 from raster_metadata.create_metadata import get_rst_meta
-import json
+from file_manager.dataset_pool import dataset_pool
+from schema.schema_rules import load_schema, SCHEMA_FILE
 
 
 
-def update_schema (raster_file) -> dict:
+def update_schema (raster_file, json_schema_file: str = SCHEMA_FILE) -> dict:
     """
     Update the schema with metadata from a raster file.
 
     This function reads the metadata from the raster file specified by `raster_file`
-    and updates the schema dictionary with the Coordinate Reference System (CRS)
-    and spatial resolution extracted from the raster file.
+    and updates the schema dictionary with the spatial resolution extracted from
+    the raster file. The schema file on disk is left unchanged; the updated schema
+    only lives in the returned dictionary.
 
     Parameters
     ----------
     raster_file : str
         The path to the raster file from which to extract metadata.
+    json_schema_file : str
+        The path to the JSON schema file.
 
     Returns
     -------
@@ -29,23 +32,14 @@ def update_schema (raster_file) -> dict:
     FileNotFoundError
         If the specified `raster_file` does not exist or cannot be found.
     """
-    # Load JSON schema file
-    json_schema_file = os.path.abspath(os.path.join("schema", "json_schema.json"))
-    with rio.open(raster_file) as raster_data: 
+    with dataset_pool.open(raster_file) as raster_data: 
         # extracting metadata (json) from the rasterio format file
         raster_metadata = get_rst_meta(raster_data)
         
-    # Read raster metadata    
-    with open(json_schema_file, 'r') as json_file: 
-        schema = json.load(json_file)
+    # Load (cached) JSON schema file
+    schema = load_schema(json_schema_file)
         
     # Update schema spatial resolution
-    schema['spatial_resolution'] = raster_data.res
-
-    # Write updated schema back to JSON file
-    with open(json_schema_file, "w") as json_file: 
-        json.dump(schema, json_file)
+    schema['spatial_resolution'] = raster_metadata['res']
     
     return schema
-
-
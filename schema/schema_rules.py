@@ -0,0 +1,300 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+
+# default location of the JSON schema file
+SCHEMA_FILE = os.path.join("schema", "json_schema.json")
+
+# cache of loaded schema files: absolute path : (mtime_ns, schema)
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+
+def load_schema(json_schema_file: str = SCHEMA_FILE) -> dict:
+    """
+    Load the JSON schema file.
+
+    The parsed schema is cached and only re-read when the file's mtime changes,
+    so callers can load it freely without repeated disk reads.
+
+    Parameters
+    ----------
+    json_schema_file : str
+        Path to the JSON schema file.
+
+    Returns
+    -------
+    dict
+        A copy of the schema, safe for callers to modify.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the schema file does not exist.
+    """
+    json_schema_file = os.path.abspath(json_schema_file)
+    mtime = os.stat(json_schema_file).st_mtime_ns
+    with _schema_lock:
+        cached = _schema_cache.get(json_schema_file)
+        if cached is None or cached[0] != mtime:
+            with open(json_schema_file, 'r') as json_file:
+                cached = (mtime, json.load(json_file))
+            _schema_cache[json_schema_file] = cached
+    return json.loads(json.dumps(cached[1]))
+
+
+@dataclass(frozen=True)
+class SchemaRule(ABC):
+    """
+    Base class of a compiled schema rule.
+
+    A rule is evaluated over a whole header table (see
+    raster_metadata.create_metadata.get_header_table) and returns a boolean
+    array with True for every raster file that passes. Rules must implement
+    both methods, so an incomplete rule fails when it is constructed.
+    """
+    name = "rule"
+
+    @abstractmethod
+    def evaluate(self, table: dict) -> np.ndarray:
+        """Check every raster file of the header table; True where it passes."""
+
+    @abstractmethod
+    def message(self, table: dict, index: int) -> str:
+        """Explain why the raster file at index of the header table fails the rule."""
+
+
+@dataclass(frozen=True)
+class CrsRule(SchemaRule):
+    epsg: int
+    name = "crs"
+
+    def evaluate(self, table):
+        return table["epsg"] == self.epsg
+
+    def message(self, table, index):
+        found = table["epsg"][index]
+        return f"wrong CRS. Expected CRS: {self.epsg}, found: {None if found < 0 else found}"
+
+
+@dataclass(frozen=True)
+class ResolutionRule(SchemaRule):
+    res: tuple
+    name = "spatial_resolution"
+
+    def evaluate(self, table):
+        return np.isclose(table["res_x"], self.res[0]) & np.isclose(table["res_y"], self.res[1])
+
+    def message(self, table, index):
+        return (f"wrong Spatial Resolution. Expected: {self.res}, "
+                f"found: {(table['res_x'][index], table['res_y'][index])}")
+
+
+@dataclass(frozen=True)
+class MaxBandsRule(SchemaRule):
+    max_bands: int
+    name = "number of bands"
+
+    def evaluate(self, table):
+        return table["count"] <= self.max_bands
+
+    def message(self, table, index):
+        return f"exceeds the max band limit. Expected max bands: {self.max_bands}, found: {table['count'][index]}"
+
+
+@dataclass(frozen=True)
+class DtypeRule(SchemaRule):
+    dtypes: tuple
+    name = "dtype"
+
+    def evaluate(self, table):
+        return np.isin(table["dtype"], self.dtypes)
+
+    def message(self, table, index):
+        return f"wrong data type. Expected one of: {list(self.dtypes)}, found: {table['dtype'][index]}"
+
+
+@dataclass(frozen=True)
+class NodataRule(SchemaRule):
+    # expected nodata value; None only requires a nodata value to be set
+    nodata: float = None
+    name = "nodata"
+
+    def evaluate(self, table):
+        if self.nodata is None:
+            return table["has_nodata"].copy()
+        if np.isnan(self.nodata):
+            return table["has_nodata"] & np.isnan(table["nodata"])
+        return table["has_nodata"] & (table["nodata"] == self.nodata)
+
+    def message(self, table, index):
+        found = table["nodata"][index] if table["has_nodata"][index] else None
+        expected = "a nodata value" if self.nodata is None else self.nodata
+        return f"wrong nodata. Expected: {expected}, found: {found}"
+
+
+@dataclass(frozen=True)
+class GridAlignmentRule(SchemaRule):
+    # reference grid origin; the first raster file is the reference if None
+    origin: tuple = None
+    tolerance: float = 1e-6
+    name = "grid_alignment"
+
+    def evaluate(self, table):
+        if len(table["path"]) == 0:
+            return np.ones(0, dtype=bool)
+        ref_x, ref_y = self.origin if self.origin is not None else (table["origin_x"][0], table["origin_y"][0])
+        # offset of every origin from the reference origin, in pixels
+        offset_x = (table["origin_x"] - ref_x) / table["res_x"]
+        offset_y = (table["origin_y"] - ref_y) / table["res_y"]
+        return ((np.abs(offset_x - np.round(offset_x)) <= self.tolerance)
+                & (np.abs(offset_y - np.round(offset_y)) <= self.tolerance))
+
+    def message(self, table, index):
+        origin = (table["origin_x"][index], table["origin_y"][index])
+        return f"not aligned to the reference grid. Grid origin {origin} is not a whole number of pixels from the reference"
+
+
+@dataclass(frozen=True)
+class ExtentOverlapRule(SchemaRule):
+    # area of interest as (left, bottom, right, top)
+    bounds: tuple
+    # minimum fraction of the raster footprint inside the area of interest
+    min_overlap: float = 0.0
+    name = "extent"
+
+    def overlap(self, table):
+        left, bottom, right, top = self.bounds
+        inter_x = np.clip(np.minimum(table["right"], right) - np.maximum(table["left"], left), 0, None)
+        inter_y = np.clip(np.minimum(table["top"], top) - np.maximum(table["bottom"], bottom), 0, None)
+        area = (table["right"] - table["left"]) * (table["top"] - table["bottom"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(area > 0, inter_x * inter_y / area, 0.0)
+
+    def evaluate(self, table):
+        overlap = self.overlap(table)
+        if self.min_overlap <= 0:
+            return overlap > 0
+        return overlap >= self.min_overlap
+
+    def message(self, table, index):
+        return (f"does not overlap the schema extent {self.bounds} enough. "
+                f"Expected overlap: {self.min_overlap}, found: {self.overlap(table)[index]:.3f}")
+
+
+@dataclass(frozen=True)
+class BlockShapeRule(SchemaRule):
+    # expected (rows, cols) of the internal blocks
+    block_shape: tuple
+    name = "block_shape"
+
+    def evaluate(self, table):
+        return (table["block_rows"] == self.block_shape[0]) & (table["block_cols"] == self.block_shape[1])
+
+    def message(self, table, index):
+        return (f"wrong block shape. Expected: {self.block_shape}, "
+                f"found: {(table['block_rows'][index], table['block_cols'][index])}")
+
+
+@dataclass(frozen=True)
+class CompiledSchema:
+    """
+    A schema compiled into in-memory rule objects.
+
+    Attributes
+    ----------
+    rules : tuple[SchemaRule]
+        The rules in evaluation order.
+    """
+    rules: tuple
+
+    def evaluate(self, table: dict) -> dict:
+        """
+        Evaluate every rule over a header table.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping rule name to a boolean pass array.
+        """
+        return {rule.name: rule.evaluate(table) for rule in self.rules}
+
+    def failures(self, table: dict) -> dict:
+        """
+        Collect the raster files that fail any rule.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping failing raster file path to its list of error messages.
+        """
+        results = self.evaluate(table)
+        failures = {}
+        for rule in self.rules:
+            for index in np.flatnonzero(~results[rule.name]):
+                path = table["path"][index]
+                failures.setdefault(path, []).append(f"{rule.name}: {rule.message(table, index)}")
+        return failures
+
+
+def _build_rules(schema: dict) -> tuple:
+    """Translate schema keys into rule objects. Keys that are not present add no rule."""
+    rules = []
+    if schema.get("number of bands", {}).get("max") is not None:
+        rules.append(MaxBandsRule(int(schema["number of bands"]["max"])))
+    if schema.get("crs") is not None:
+        rules.append(CrsRule(int(schema["crs"])))
+    if schema.get("spatial_resolution") is not None:
+        rules.append(ResolutionRule(tuple(float(r) for r in schema["spatial_resolution"])))
+    if schema.get("dtype") is not None:
+        dtypes = schema["dtype"]
+        rules.append(DtypeRule(tuple([dtypes] if isinstance(dtypes, str) else dtypes)))
+    if "nodata" in schema:
+        nodata = schema["nodata"]
+        rules.append(NodataRule(None if nodata is None else float(nodata)))
+    if schema.get("grid_alignment"):
+        alignment = schema["grid_alignment"]
+        origin = alignment.get("origin") if isinstance(alignment, dict) else None
+        rules.append(GridAlignmentRule(None if origin is None else tuple(origin)))
+    if schema.get("extent") is not None:
+        extent = schema["extent"]
+        if isinstance(extent, dict):
+            rules.append(ExtentOverlapRule(tuple(extent["bounds"]), float(extent.get("min_overlap", 0.0))))
+        else:
+            rules.append(ExtentOverlapRule(tuple(extent)))
+    if schema.get("block_shape") is not None:
+        rules.append(BlockShapeRule(tuple(int(b) for b in schema["block_shape"])))
+    return tuple(rules)
+
+
+@lru_cache(maxsize=32)
+def _compile_cached(schema_key: str) -> CompiledSchema:
+    return CompiledSchema(_build_rules(json.loads(schema_key)))
+
+
+def compile_schema(schema: dict) -> CompiledSchema:
+    """
+    Compile a schema dictionary into rule objects.
+
+    Supported keys are "crs", "spatial_resolution" and "number of bands", plus the
+    optional "dtype" (str or list), "nodata" (value or null for "any value set"),
+    "grid_alignment" (true, or {"origin": [x, y]}), "extent" ([left, bottom, right, top]
+    or {"bounds": [...], "min_overlap": fraction}) and "block_shape" ([rows, cols]).
+    Compilation is cached, so compiling the same schema again is free.
+
+    Parameters
+    ----------
+    schema : dict
+        The schema dictionary.
+
+    Returns
+    -------
+    CompiledSchema
+        The compiled schema.
+    """
+    return _compile_cached(json.dumps(schema, sort_keys=True))
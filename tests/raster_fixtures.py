@@ -0,0 +1,46 @@
+import numpy as np
+import rasterio as rio
+from rasterio.transform import from_origin
+
+
+def write_test_raster(path: str, data=None, origin=(500000.0, 200000.0), res=5.0, 
+                      crs=27700, nodata=None, dtype="float32", **profile) -> str: 
+    """
+    Write a small synthetic GeoTIFF for tests.
+
+    Parameters
+    ----------
+    path : str
+        Destination path.
+    data : np.ndarray, optional
+        Band data as (bands, rows, cols) or (rows, cols). Defaults to a 20x30 ramp.
+    origin : tuple
+        Upper left corner (x, y) of the raster.
+    res : float
+        Square pixel size.
+    crs : int or None
+        EPSG code of the raster CRS.
+    nodata : float, optional
+        Nodata value.
+    dtype : str
+        Data type of the raster.
+
+    Returns
+    -------
+    str
+        The destination path.
+    """
+    if data is None: 
+        data = np.arange(20 * 30, dtype=dtype).reshape(20, 30)
+    data = np.asarray(data, dtype=dtype)
+    if data.ndim == 2: 
+        data = data[np.newaxis]
+    meta = {
+        "driver": "GTiff", "count": data.shape[0], "height": data.shape[1], "width": data.shape[2], 
+        "dtype": dtype, "transform": from_origin(origin[0], origin[1], res, res), 
+        "crs": None if crs is None else rio.crs.CRS.from_epsg(crs), "nodata": nodata
+    }
+    meta.update(profile)
+    with rio.open(path, "w", **meta) as dst: 
+        dst.write(data)
+    return path
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from raster_metadata.band_statistics import BandStatistics, read_stats_sidecar
+from warper.resample import resample_raster
+from tests.raster_fixtures import write_test_raster
+
+
+class TestBandStatistics(unittest.TestCase): 
+    """
+    A test case class for the streaming band statistics collected by the writers.
+    """
+    
+    def test_streaming_matches_full_pass(self): 
+        """
+        Test that window-by-window statistics equal the statistics of the whole band.
+        """
+        rng = np.random.default_rng(0)
+        data = rng.normal(50, 10, size=(100, 80))
+        data[:5] = -9999.0
+        stats = BandStatistics(nodata=-9999.0, bins=16)
+        for rows in np.array_split(np.arange(100), 7): 
+            stats.update(data[rows])
+        
+        valid = data[data != -9999.0]
+        result = stats.to_dict()
+        self.assertAlmostEqual(result["mean"], valid.mean())
+        self.assertAlmostEqual(result["std"], valid.std())
+        self.assertEqual(result["min"], valid.min())
+        self.assertEqual(result["max"], valid.max())
+        self.assertAlmostEqual(result["nodata_fraction"], 0.05)
+        self.assertEqual(sum(result["histogram"]["counts"]), valid.size)
+        self.assertLessEqual(result["histogram"]["edges"][0], valid.min())
+        self.assertGreaterEqual(result["histogram"]["edges"][-1], valid.max())
+    
+    def test_resample_writes_sidecar_and_tags(self): 
+        """
+        Test that resampling stores the statistics as a sidecar and as GDAL tags.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir: 
+            raster_file = write_test_raster(os.path.join(temp_dir, "agb.tif"), res=2.5, nodata=-9999.0)
+            resample_raster(raster_file, (5.0, 5.0), raster_file)
+            
+            stats = read_stats_sidecar(raster_file)
+            with rio.open(raster_file) as rast: 
+                data = rast.read(1)
+                tags = rast.tags(1)
+            self.assertEqual(len(stats), 1)
+            self.assertAlmostEqual(stats[0]["mean"], data.mean(), places=3)
+            self.assertAlmostEqual(float(tags["STATISTICS_MAXIMUM"]), data.max(), places=3)
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from warper.batch_reprojector import group_by_grid, project_rasters
+from warper.raster_projector import project_raster
+from tests.raster_fixtures import write_test_raster
+
+
+class TestBatchReprojector(unittest.TestCase): 
+    """
+    A test case class for the shared-grid batched reprojection.
+    """
+    
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        self.files = {}
+        for name in ("red", "nir", "ref_red", "ref_nir"): 
+            self.files[name] = write_test_raster(os.path.join(self.temp_dir.name, f"{name}.tif"), 
+                                                 data=rng.random((30, 30)) if name in ("red", "ref_red") else rng.random((30, 30)) + 1, 
+                                                 origin=(-1.5, 52.0), res=0.0001, crs=4326, nodata=-9999.0)
+        # reference copies hold the same data as the batched files
+        for name in ("red", "nir"): 
+            with rio.open(self.files[name]) as src: 
+                data = src.read()
+            write_test_raster(self.files["ref_" + name], data=data, origin=(-1.5, 52.0), res=0.0001, crs=4326, nodata=-9999.0)
+        self.other_grid = write_test_raster(os.path.join(self.temp_dir.name, "blue.tif"), 
+                                            origin=(-1.4, 52.0), res=0.0001, crs=4326, nodata=-9999.0)
+    
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+    
+    def test_group_by_grid(self): 
+        """
+        Test that files are grouped by identical source grid.
+        """
+        groups = group_by_grid([self.files["red"], self.files["nir"], self.other_grid])
+        self.assertEqual(sorted(len(group) for group in groups.values()), [1, 2])
+    
+    def test_batched_matches_per_file_projection(self): 
+        """
+        Test that warping a band stack gives the same result as projecting each file.
+        """
+        project_rasters(27700, [self.files["red"], self.files["nir"], self.other_grid])
+        for name in ("red", "nir"): 
+            project_raster(27700, self.files["ref_" + name], self.files["ref_" + name])
+            with rio.open(self.files[name]) as batched, rio.open(self.files["ref_" + name]) as reference: 
+                self.assertEqual(batched.crs.to_epsg(), 27700)
+                self.assertEqual(batched.transform, reference.transform)
+                np.testing.assert_array_equal(batched.read(), reference.read())
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import raster_process_main
+from raster_process_main import load_batch_config, run_batch, main
+
+
+class TestBatchRunner(unittest.TestCase):
+    """
+    A test case class for the batch config, the command line entry point and the batch runner.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.temp_dir.name, "sites.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def write_config(self, config: dict) -> str:
+        with open(self.config_file, "w") as json_file:
+            json.dump(config, json_file)
+        return self.config_file
+
+    def test_config_paths_and_names(self):
+        """
+        Test that relative paths are resolved against the config directory and sites get default names.
+        """
+        config = load_batch_config(self.write_config({
+            "sites": [{"canopy_metrics_dirs": ["a/canopy_metrics"], "raster_dir": "a/raster_file"},
+                      {"name": "b", "canopy_metrics_dirs": ["b/cm"], "raster_dir": "b/raster_file", "output_dir": "out/b"}],
+            "schema": "schema.json", "watch": {"status_file": "status.json"}}))
+        base = self.temp_dir.name
+        self.assertEqual(config["sites"][0]["name"], "raster_file-0")
+        self.assertEqual(config["sites"][0]["canopy_metrics_dirs"], [os.path.join(base, "a/canopy_metrics")])
+        self.assertIsNone(config["sites"][0]["output_dir"])
+        self.assertEqual(config["sites"][1]["output_dir"], os.path.join(base, "out/b"))
+        self.assertEqual(config["schema"], os.path.join(base, "schema.json"))
+        self.assertEqual(config["watch"]["status_file"], os.path.join(base, "status.json"))
+
+    def test_config_rejects_conflicting_sites(self):
+        """
+        Test that configs without sites, with duplicate names or with sites sharing an output directory are rejected.
+        """
+        site = {"canopy_metrics_dirs": ["cm"], "raster_dir": "x/raster_file"}
+        bad_configs = [
+            {"sites": []},
+            {"sites": [{"raster_dir": "x/raster_file"}]},
+            {"sites": [{**site, "name": "a", "output_dir": "a"}, {**site, "name": "a", "output_dir": "b"}]},
+            # both default to the parent of x/raster_file
+            {"sites": [{**site, "name": "a"}, {**site, "name": "b", "raster_dir": "x/other_raster"}]},
+            {"sites": [{**site, "name": "a", "output_dir": "out"}, {**site, "name": "b", "output_dir": "out/"}]},
+        ]
+        for config in bad_configs:
+            with self.assertRaises(ValueError, msg=config):
+                load_batch_config(self.write_config(config))
+        config = load_batch_config(self.write_config(
+            {"sites": [{**site, "name": "a"}, {**site, "name": "b", "raster_dir": "y/raster_file"}]}))
+        self.assertEqual(len(config["sites"]), 2)
+
+    @mock.patch.object(raster_process_main, "run_watch")
+    @mock.patch.object(raster_process_main, "run_batch", return_value={"a": None})
+    def test_main_merges_arguments(self, run_batch_mock, run_watch_mock):
+        """
+        Test that command line arguments override the batch config, which overrides the defaults.
+        """
+        self.write_config({"sites": [{"name": "a", "canopy_metrics_dirs": ["cm"], "raster_dir": "r"}],
+                           "jobs": 3, "schema": "schema.json", "gdal": {"GDAL_CACHEMAX": 64},
+                           "watch": {"poll_interval": 30, "settle_seconds": 0}})
+        self.assertEqual(main(["--config", self.config_file, "--incremental", "--overlap-rule", "exact"]), 0)
+        sites = run_batch_mock.call_args.args[0]
+        self.assertEqual((sites[0]["incremental"], sites[0]["overlap_rule"]), (True, "exact"))
+        self.assertEqual(run_batch_mock.call_args.kwargs, {
+            "jobs": 3, "schema_file": os.path.join(self.temp_dir.name, "schema.json"),
+            "gdal_options": {"GDAL_CACHEMAX": 64}})
+
+        main(["--config", self.config_file, "--jobs", "2", "--schema", "other.json"])
+        self.assertEqual(run_batch_mock.call_args.kwargs["jobs"], 2)
+        self.assertEqual(run_batch_mock.call_args.kwargs["schema_file"], "other.json")
+        self.assertNotIn("incremental", run_batch_mock.call_args.args[0][0])
+
+        run_watch_mock.return_value = {"a": {"state": "ok"}}
+        self.assertEqual(main(["--canopy-metrics", "cm1", "cm2", "--raster-dir", "site/raster_file", "--watch",
+                               "--poll-interval", "5"]), 0)
+        sites = run_watch_mock.call_args.args[0]
+        self.assertEqual((sites[0]["name"], sites[0]["canopy_metrics_dirs"]), ("raster_file", ["cm1", "cm2"]))
+        kwargs = run_watch_mock.call_args.kwargs
+        self.assertEqual((kwargs["poll_interval"], kwargs["status_file"], kwargs["schema_file"]),
+                         (5.0, "watch_status.json", raster_process_main.DEFAULT_SCHEMA_FILE))
+
+        with self.assertRaises(SystemExit):
+            main(["--raster-dir", "r"])
+
+    @mock.patch.object(raster_process_main, "run_batch", return_value={"a": None, "b": "failed"})
+    def test_main_exit_status(self, run_batch_mock):
+        """
+        Test that main returns 1 when any site failed, in batch and in watch mode.
+        """
+        self.write_config({"sites": [{"name": "a", "canopy_metrics_dirs": ["cm"], "raster_dir": "a/r"},
+                                     {"name": "b", "canopy_metrics_dirs": ["cm"], "raster_dir": "b/r"}]})
+        self.assertEqual(main(["--config", self.config_file]), 1)
+        with mock.patch.object(raster_process_main, "run_watch",
+                               return_value={"a": {"state": "ok"}, "b": {"state": "failed"}}):
+            self.assertEqual(main(["--config", self.config_file, "--watch"]), 1)
+
+    def test_run_batch_reports_failures(self):
+        """
+        Test that a failing site is reported with its cause and does not stop the other sites.
+        """
+        def process(canopy_metrics_dirs, raster_dir, **kwargs):
+            if raster_dir == "b/r":
+                raise Exception("Error stitching raster file") from FileNotFoundError("missing tile")
+
+        sites = [{"name": name, "canopy_metrics_dirs": ["cm"], "raster_dir": f"{name}/r"} for name in "abc"]
+        with mock.patch.object(raster_process_main, "AGB_raster_processor", side_effect=process) as processor:
+            results = run_batch(sites)
+        self.assertEqual(processor.call_count, 3)
+        self.assertEqual(results, {"a": None, "b": "Error stitching raster file (missing tile)", "c": None})
+        with self.assertRaises(ValueError):
+            run_batch(sites + [{**sites[0], "output_dir": "elsewhere"}])
+
+    def test_schema_reference(self):
+        """
+        Test that the schema is updated from the stitched AGB raster, whatever the order of the stitched paths.
+        """
+        paths = ["/vsimem/x/int.tif", "/vsimem/x/AGB.tif", "/vsimem/x/_p75.tif"]
+        self.assertEqual(raster_process_main._schema_reference(paths), "/vsimem/x/AGB.tif")
+        self.assertEqual(raster_process_main._schema_reference(paths[::2]), "/vsimem/x/_p75.tif")
+        with self.assertRaises(ValueError):
+            raster_process_main._schema_reference([])
+
+
+if __name__ == "__main__":
+    unittest.main()
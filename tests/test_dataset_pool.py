@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from file_manager.dataset_pool import DatasetPool
+from tests.raster_fixtures import write_test_raster
+
+
+class TestDatasetPool(unittest.TestCase): 
+    """
+    A test case class for the LRU dataset handle pool.
+    """
+    
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.paths = [write_test_raster(os.path.join(self.temp_dir.name, f"{name}.tif")) 
+                      for name in ("agb", "int", "ele")]
+        self.pool = DatasetPool(max_size=2)
+    
+    def tearDown(self) -> None: 
+        self.pool.clear()
+        self.temp_dir.cleanup()
+    
+    def test_hits_and_eviction(self): 
+        """
+        Test that repeated opens are served from the pool and the least recently used handle is evicted.
+        """
+        first = self.pool.get(self.paths[0])
+        self.assertIs(self.pool.get(self.paths[0]), first)
+        self.pool.get(self.paths[1])
+        self.pool.get(self.paths[2])
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()["hits"], 1)
+        self.assertEqual(self.pool.stats()["misses"], 3)
+        self.assertEqual(self.pool.stats()["evictions"], 1)
+    
+    def test_invalidated_on_write(self): 
+        """
+        Test that rewriting a file, or invalidating it, gives a fresh handle.
+        """
+        first = self.pool.get(self.paths[0])
+        write_test_raster(self.paths[0], res=10.0)
+        second = self.pool.get(self.paths[0])
+        self.assertIsNot(second, first)
+        self.assertEqual(second.res, (10.0, 10.0))
+        
+        self.pool.invalidate(self.temp_dir.name)
+        self.assertTrue(second.closed)
+        self.assertEqual(self.pool.stats()["open_handles"], 0)
+
+    
+    def test_archive_member_reopened_when_archive_changes(self): 
+        """
+        Test that the handle of a zip archive member is reopened once its archive was rewritten.
+        """
+        archive = os.path.join(self.temp_dir.name, "s.zip")
+        path = f"/vsizip/{archive}/agb.tif"
+        for origin, res in [((50.0, 200.0), 5.0), ((100.0, 200.0), 10.0)]: 
+            write_test_raster(self.paths[0], origin=origin, res=res)
+            with zipfile.ZipFile(archive, "w") as zip_file: 
+                zip_file.write(self.paths[0], "agb.tif")
+            self.assertEqual(self.pool.get(path).bounds.left, origin[0])
+        self.assertEqual(self.pool.stats()["misses"], 2)
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from file_manager.intermediate_store import IntermediateStore
+from raster_metadata.band_statistics import read_stats_sidecar
+from raster_metadata.derived_bands import compile_derived_bands, write_conformed, DERIVED_NODATA
+from tests.raster_fixtures import write_test_raster
+
+
+VARIABLES = ['red', 'nir', 'agb']
+
+
+class TestDerivedBands(unittest.TestCase): 
+    """
+    A test case class for the derived bands written in the final conformance pass.
+    """
+
+    def setUp(self) -> None: 
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, "src")
+        self.final_dir = os.path.join(self.temp_dir.name, "final")
+        os.makedirs(self.src_dir)
+        os.makedirs(self.final_dir)
+        rng = np.random.default_rng(0)
+        self.red = rng.random((20, 30)) + 0.5
+        self.nir = rng.random((20, 30)) + 0.5
+        self.red[0, 0] = -9999.0
+        self.nir[1, 1], self.red[1, 1] = 1.0, -1.0
+        write_test_raster(os.path.join(self.src_dir, "red.tif"), data=self.red, nodata=-9999.0)
+        write_test_raster(os.path.join(self.src_dir, "nir.tif"), data=self.nir, nodata=-9999.0)
+        write_test_raster(os.path.join(self.src_dir, "agb.tif"), origin=(500100.0, 200000.0))
+
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+
+    def test_invalid_expressions_rejected(self): 
+        """
+        Test that expressions with unknown variables, attribute access or other calls are rejected.
+        """
+        for expression in ["nir - blue", "nir.__class__", "open('x')", "nir +"]: 
+            with self.assertRaises(ValueError): 
+                compile_derived_bands({"derived_bands": {"bad": expression}}, VARIABLES)
+        with self.assertRaises(ValueError): 
+            compile_derived_bands({"derived_bands": {"red": "nir * 2"}}, VARIABLES)
+        self.assertEqual(compile_derived_bands({"crs": 27700}, VARIABLES), [])
+
+    def test_derived_band_written_with_variables(self): 
+        """
+        Test that derived values are written on the variables' grid, nodata where an input is nodata
+        or the result is not finite, and that the other variables are moved as usual.
+        """
+        derived_bands = compile_derived_bands({"derived_bands": {"ndvi": "(nir - red) / (nir + red)"}}, VARIABLES)
+        with IntermediateStore(self.temp_dir.name) as store: 
+            for name in ["red.tif", "nir.tif", "agb.tif"]: 
+                store.add_file(os.path.join(self.src_dir, name))
+            paths = write_conformed(store, self.final_dir, derived_bands)
+            self.assertEqual(store.paths(), [])
+
+        self.assertEqual(paths, [os.path.join(self.final_dir, "ndvi.tif")])
+        nir, red = self.nir.astype("float32").astype(float), self.red.astype("float32").astype(float)
+        with np.errstate(divide="ignore"): 
+            expected = ((nir - red) / (nir + red)).astype("float32")
+        expected[0, 0] = expected[1, 1] = DERIVED_NODATA
+        with rio.open(paths[0]) as ndvi, rio.open(os.path.join(self.final_dir, "red.tif")) as red: 
+            self.assertEqual((ndvi.transform, ndvi.shape), (red.transform, red.shape))
+            np.testing.assert_allclose(ndvi.read(1), expected, rtol=1e-6)
+            np.testing.assert_array_equal(red.read(1), self.red.astype("float32"))
+        self.assertEqual(read_stats_sidecar(paths[0])[0]["valid_count"], 20 * 30 - 2)
+        self.assertTrue(os.path.exists(os.path.join(self.final_dir, "agb.tif")))
+
+    def test_inputs_on_different_grids_rejected(self): 
+        """
+        Test that a derived band reading variables on different grids is rejected.
+        """
+        derived_bands = compile_derived_bands({"derived_bands": {"ratio": "agb / nir"}}, VARIABLES)
+        with IntermediateStore(self.temp_dir.name) as store: 
+            for name in ["nir.tif", "agb.tif"]: 
+                store.add_file(os.path.join(self.src_dir, name))
+            with self.assertRaises(ValueError): 
+                write_conformed(store, self.final_dir, derived_bands)
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+from unittest import mock
+import numpy as np
+import rasterio as rio
+from file_manager import file_discovery
+from file_manager.file_discovery import discover_files, invalidate_inventory
+from file_manager.raster_file_manager import RasterFileManager
+from merge.merge_raster import stitch_tiffs_by_pattern
+from tests.raster_fixtures import write_test_raster
+
+
+class TestFileDiscovery(unittest.TestCase): 
+    """
+    A test case class for the cached, recursive raster file discovery.
+    """
+    
+    def setUp(self) -> None:
+        """
+        Create a temporary tree with TIFF files in several site directories.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        for rel_path in ["ept_a/canopy_metrics/agb.tif", "ept_b/canopy_metrics/AGB.TIF",
+                         "ept_b/canopy_metrics/int.tiff", "ept_b/notes.txt", "ept_c/scratch/ele.tif"]: 
+            path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f: 
+                f.write(b"0" * 10)
+    
+    def tearDown(self) -> None: 
+        invalidate_inventory()
+        self.temp_dir.cleanup()
+    
+    def test_recursive_case_insensitive(self): 
+        """
+        Test that .tif/.TIF/.tiff files are found in all sub-directories with their size.
+        """
+        entries = discover_files([self.root])
+        names = sorted(entry.name for entry in entries)
+        self.assertEqual(names, ["AGB.TIF", "agb.tif", "ele.tif", "int.tiff"])
+        self.assertTrue(all(entry.size == 10 for entry in entries))
+    
+    def test_exclude_pattern(self): 
+        """
+        Test that excluded directories and files are skipped.
+        """
+        entries = discover_files([self.root], exclude=("scratch", "int.*"))
+        self.assertEqual(sorted(entry.name for entry in entries), ["AGB.TIF", "agb.tif"])
+    
+    def test_cache_invalidated_by_directory_mtime(self): 
+        """
+        Test that the cached inventory is reused until a scanned directory changes.
+        """
+        site_dir = os.path.join(self.root, "ept_a", "canopy_metrics")
+        first = discover_files([self.root])
+        self.assertEqual(discover_files([self.root]), first)
+        
+        new_file = os.path.join(site_dir, "red.tif")
+        with open(new_file, "wb") as f: 
+            f.write(b"0")
+        # make sure the directory mtime moves even on coarse-grained filesystems
+        later = time.time() + 5
+        os.utime(site_dir, (later, later))
+        self.assertIn(new_file, [entry.path for entry in discover_files([self.root])])
+    
+    def test_raster_file_manager_relative_paths(self): 
+        """
+        Test that RasterFileManager lists TIFF files relative to its directory,
+        descending into sub-directories only when asked to.
+        """
+        self.assertEqual(RasterFileManager(os.path.join(self.root, "ept_b")).tif_ext_file(), [])
+        tif_files = RasterFileManager(os.path.join(self.root, "ept_b"), recursive=True).tif_ext_file()
+        self.assertEqual(sorted(tif_files), [os.path.join("canopy_metrics", "AGB.TIF"),
+                                             os.path.join("canopy_metrics", "int.tiff")])
+    
+    def test_recursive_copy_keeps_relative_paths(self): 
+        """
+        Test that same-named files in different sub-directories do not overwrite each other when copied.
+        """
+        with open(os.path.join(self.root, "ept_c", "agb.tif"), "wb") as f: 
+            f.write(b"1" * 20)
+        dest = os.path.join(self.root, "copies")
+        RasterFileManager(self.root, recursive=True).copy_files(dest)
+        self.assertEqual(os.path.getsize(os.path.join(dest, "ept_c", "agb.tif")), 20)
+        self.assertEqual(os.path.getsize(os.path.join(dest, "ept_a", "canopy_metrics", "agb.tif")), 10)
+    
+    def test_symlinked_directory_not_followed(self): 
+        """
+        Test that a symlink pointing back up the tree is not descended into.
+        """
+        os.symlink(self.root, os.path.join(self.root, "ept_a", "loop"))
+        self.assertEqual(len(discover_files([self.root])), 4)
+    
+    def test_inventory_cache_bounded(self): 
+        """
+        Test that the least recently used inventories are dropped once the cache is full.
+        """
+        roots = [os.path.join(self.root, name) for name in ["ept_a", "ept_b", "ept_c"]]
+        with mock.patch.object(file_discovery, "MAX_CACHED_INVENTORIES", 2): 
+            for root in roots: 
+                discover_files([root])
+        self.assertEqual([key[0] for key in file_discovery._inventory_cache], roots[1:])
+    
+    def test_missing_root(self): 
+        """
+        Test that a missing root raises FileNotFoundError.
+        """
+        with self.assertRaises(FileNotFoundError): 
+            discover_files([os.path.join(self.root, "missing")])
+
+    
+    def test_zip_archive_root(self): 
+        """
+        Test that TIFF members of a zip archive are discovered and stitched in place, without extraction.
+        """
+        archive = os.path.join(self.root, "drive-download.zip")
+        left = write_test_raster(os.path.join(self.root, "left.tif"), data=np.ones((4, 4)))
+        right = write_test_raster(os.path.join(self.root, "right.tif"), data=np.full((4, 4), 2.0), 
+                                  origin=(500020.0, 200000.0))
+        with zipfile.ZipFile(archive, "w") as zip_file: 
+            zip_file.write(left, "ept_a/canopy_metrics/agb.tif")
+            zip_file.write(right, "ept_b/canopy_metrics/agb.tif")
+            zip_file.write(left, "ept_b/notes/ele.tif")
+        
+        entries = discover_files([archive + "/ept_b"])
+        self.assertEqual(sorted(entry.rel_path for entry in entries), ["canopy_metrics/agb.tif", "notes/ele.tif"])
+        self.assertTrue(all(entry.path.startswith("/vsizip/") for entry in entries))
+        self.assertEqual(RasterFileManager(archive + "/ept_a", recursive=True).tif_ext_file(), 
+                         ["canopy_metrics/agb.tif"])
+        
+        dest = os.path.join(self.root, "stitched")
+        stitch_tiffs_by_pattern([archive + "/ept_a/canopy_metrics", archive + "/ept_b/canopy_metrics"], dest)
+        with rio.open(os.path.join(dest, "agb.tif")) as mosaic: 
+            self.assertEqual(mosaic.shape, (4, 8))
+            np.testing.assert_array_equal(mosaic.read(1)[:, :4], 1)
+            np.testing.assert_array_equal(mosaic.read(1)[:, 4:], 2)
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from merge.incremental_mosaic import stitch_incremental, clear_pending_regions
+from merge.merge_raster import get_all_tiff_paths, merge_img_by_name
+from raster_metadata import run_trace
+from raster_metadata.band_statistics import read_stats_sidecar
+from tests.raster_fixtures import write_test_raster
+
+
+class TestIncrementalMosaic(unittest.TestCase): 
+    """
+    A test case class for the incremental mosaic update.
+    """
+    
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.rng = np.random.default_rng(0)
+        self.mosaic_dir = os.path.join(self.temp_dir.name, "lidar_raster")
+        self.dirs = [self.add_tile(0, (500000.0, 200000.0)), self.add_tile(1, (500150.0, 200000.0))]
+    
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+    
+    def add_tile(self, index: int, origin: tuple) -> str: 
+        tile_dir = os.path.join(self.temp_dir.name, f"ept_{index}", "canopy_metrics")
+        os.makedirs(tile_dir)
+        write_test_raster(os.path.join(tile_dir, "agb.tif"), data=self.rng.random((20, 30)), 
+                          origin=origin, crs=None, nodata=-9999.0)
+        return tile_dir
+    
+    def test_incremental_update_matches_full_rebuild(self): 
+        """
+        Test that only new tiles are merged, the extent grows, and the result equals a full rebuild.
+        """
+        first = stitch_incremental(self.dirs, self.mosaic_dir, crs=27700)
+        self.assertEqual(len(first["agb.tif"]), 1)
+        clear_pending_regions(os.path.join(self.mosaic_dir, "agb.tif"))
+        self.assertEqual(stitch_incremental(self.dirs, self.mosaic_dir, crs=27700), {"agb.tif": []})
+        
+        # one tile inside and beyond the southern edge, one beyond the north-west corner
+        self.dirs += [self.add_tile(2, (500100.0, 199950.0)), self.add_tile(3, (499900.0, 200100.0))]
+        dirty = stitch_incremental(self.dirs, self.mosaic_dir, crs=27700)["agb.tif"]
+        self.assertEqual(dirty, [(500100.0, 199850.0, 500250.0, 199950.0), (499900.0, 200000.0, 500050.0, 200100.0)])
+        
+        reference = os.path.join(self.temp_dir.name, "reference.tif")
+        merge_img_by_name(get_all_tiff_paths(self.dirs), reference, "agb", crs=27700)
+        mosaic = os.path.join(self.mosaic_dir, "agb.tif")
+        with rio.open(mosaic) as updated, rio.open(reference) as rebuilt: 
+            self.assertEqual(updated.bounds, rebuilt.bounds)
+            self.assertEqual(updated.crs.to_epsg(), 27700)
+            np.testing.assert_array_equal(updated.read(), rebuilt.read())
+        for key in ("mean", "std", "valid_count", "count"): 
+            self.assertAlmostEqual(read_stats_sidecar(mosaic)[0][key], read_stats_sidecar(reference)[0][key])
+
+    
+    def assert_matches_rebuild(self, dirs: list[str]): 
+        reference = os.path.join(self.temp_dir.name, "reference.tif")
+        merge_img_by_name(get_all_tiff_paths(dirs), reference, "agb")
+        with rio.open(os.path.join(self.mosaic_dir, "agb.tif")) as updated, rio.open(reference) as rebuilt: 
+            self.assertEqual(updated.bounds, rebuilt.bounds)
+            np.testing.assert_array_equal(updated.read(), rebuilt.read())
+    
+    def test_duplicate_tile_rewrites_nothing(self): 
+        """
+        Test that a duplicate arriving after its original, and leaving again, rewrites nothing, that
+        one arriving ahead of it only rewrites its window, and that a change of the original while it
+        is skipped shows once it is no longer hidden.
+        """
+        mosaic = os.path.join(self.mosaic_dir, "agb.tif")
+        stitch_incremental(self.dirs, self.mosaic_dir)
+        clear_pending_regions(mosaic)
+        copy_dir = os.path.join(self.temp_dir.name, "ept_copy", "canopy_metrics")
+        os.makedirs(copy_dir)
+        shutil.copy2(os.path.join(self.dirs[1], "agb.tif"), os.path.join(copy_dir, "agb.tif"))
+        tile_bounds = (500150.0, 199900.0, 500300.0, 200000.0)
+        
+        run_trace.reset()
+        for dirs in [self.dirs + [copy_dir], self.dirs]: 
+            self.assertEqual(stitch_incremental(dirs, self.mosaic_dir), {"agb.tif": []})
+        self.assertEqual(run_trace.get_records("incremental_stitch"), [])
+        
+        # ahead of its original the copy changes the merge order: its window is merged again, without a rebuild
+        self.assertEqual(stitch_incremental([copy_dir] + self.dirs, self.mosaic_dir), {"agb.tif": [tile_bounds]})
+        self.assertEqual(run_trace.get_records("incremental_stitch")[-1]["mode"], "incremental")
+        self.assert_matches_rebuild(self.dirs)
+        clear_pending_regions(mosaic)
+        
+        # the original, skipped as a duplicate of the copy, changes: still hidden behind the copy
+        write_test_raster(os.path.join(self.dirs[1], "agb.tif"), data=self.rng.random((20, 30)), 
+                          origin=(500150.0, 200000.0), crs=None, nodata=-9999.0)
+        self.assertEqual(stitch_incremental([copy_dir] + self.dirs, self.mosaic_dir), {"agb.tif": []})
+        self.assert_matches_rebuild([copy_dir] + self.dirs)
+        
+        # once the copy is removed, the change shows
+        os.remove(os.path.join(copy_dir, "agb.tif"))
+        self.assertEqual(stitch_incremental(self.dirs, self.mosaic_dir), {"agb.tif": [tile_bounds]})
+        self.assertEqual(run_trace.get_records("incremental_stitch")[-1]["mode"], "incremental")
+        self.assert_matches_rebuild(self.dirs)
+    
+    def test_removed_and_moved_tiles_leave_empty_windows(self): 
+        """
+        Test that the window of a removed or moved tile that no other tile reaches becomes nodata,
+        as in a full rebuild, instead of failing the merge.
+        """
+        self.dirs.append(self.add_tile(2, (500300.0, 200000.0)))
+        stitch_incremental(self.dirs, self.mosaic_dir)
+        
+        # the middle tile is removed: the tiles left still span the mosaic
+        os.remove(os.path.join(self.dirs[1], "agb.tif"))
+        self.assertEqual(stitch_incremental(self.dirs, self.mosaic_dir)["agb.tif"][-1], 
+                         (500150.0, 199900.0, 500300.0, 200000.0))
+        self.assertEqual(run_trace.get_records("incremental_stitch")[-1]["mode"], "incremental")
+        self.assert_matches_rebuild(self.dirs)
+        
+        # the last tile moves north, away from its old window
+        write_test_raster(os.path.join(self.dirs[2], "agb.tif"), data=self.rng.random((20, 30)), 
+                          origin=(500300.0, 200100.0), crs=None, nodata=-9999.0)
+        stitch_incremental(self.dirs, self.mosaic_dir)
+        self.assertEqual(run_trace.get_records("incremental_stitch")[-1]["mode"], "incremental")
+        self.assert_matches_rebuild(self.dirs)
+    
+    def test_pending_regions_replayed_until_cleared(self): 
+        """
+        Test that rewritten regions are returned again by later runs until the outputs were updated.
+        """
+        mosaic = os.path.join(self.mosaic_dir, "agb.tif")
+        stitch_incremental(self.dirs, self.mosaic_dir)
+        clear_pending_regions(mosaic)
+        self.dirs.append(self.add_tile(2, (500100.0, 199950.0)))
+        dirty = stitch_incremental(self.dirs, self.mosaic_dir)
+        self.assertEqual(len(dirty["agb.tif"]), 1)
+        # the downstream update failed: nothing changed on disk, but the region is still pending
+        self.assertEqual(stitch_incremental(self.dirs, self.mosaic_dir), dirty)
+        clear_pending_regions(mosaic)
+        self.assertEqual(stitch_incremental(self.dirs, self.mosaic_dir), {"agb.tif": []})
+        
+        # a rebuild (tile removed) also leaves the old extent pending
+        self.dirs.pop()
+        os.remove(os.path.join(self.temp_dir.name, "ept_2", "canopy_metrics", "agb.tif"))
+        with rio.open(mosaic) as old: 
+            old_bounds = tuple(old.bounds)
+        regions = stitch_incremental(self.dirs, self.mosaic_dir)["agb.tif"]
+        with rio.open(mosaic) as new: 
+            self.assertEqual(regions, [old_bounds, tuple(new.bounds)])
+
+
+if __name__ == "__main__": 
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from file_manager.intermediate_store import IntermediateStore
+from file_manager.transfer_engine import TransferEngine
+from merge.merge_raster import merge_img_by_name
+from raster_metadata.band_statistics import read_stats_sidecar
+from tests.raster_fixtures import write_test_raster
+
+
+class TestIntermediateStore(unittest.TestCase): 
+    """
+    A test case class for the in-memory/spill intermediate store.
+    """
+    
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        join = lambda *names: os.path.join(self.temp_dir.name, *names)
+        os.makedirs(join("a"))
+        os.makedirs(join("b"))
+        self.tiles = [write_test_raster(join("a", "agb.tif"), crs=None), 
+                      write_test_raster(join("b", "agb.tif"), crs=None, origin=(500150.0, 200000.0))]
+        self.final_dir = join("final")
+        os.makedirs(self.final_dir)
+    
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+    
+    def test_stitch_in_memory_with_crs(self): 
+        """
+        Test that a small stitched image stays in memory, gets the CRS in the stitch write
+        and is materialised with its statistics sidecar.
+        """
+        with IntermediateStore(self.temp_dir.name) as store: 
+            path = merge_img_by_name(self.tiles, os.path.join(self.temp_dir.name, "agb.tif"), "agb", 
+                                     crs=27700, store=store)
+            self.assertTrue(path.startswith("/vsimem/"))
+            with rio.open(path) as rast: 
+                self.assertEqual(rast.crs.to_epsg(), 27700)
+                self.assertEqual(rast.shape, (20, 60))
+            store.move_all(self.final_dir)
+            self.assertEqual(store.paths(), [])
+        
+        final_file = os.path.join(self.final_dir, "agb.tif")
+        with rio.open(final_file) as rast: 
+            self.assertEqual(rast.crs.to_epsg(), 27700)
+        self.assertIsNotNone(read_stats_sidecar(final_file))
+    
+    def test_spill_above_threshold(self): 
+        """
+        Test that intermediates above the memory threshold are written to the spill directory.
+        """
+        spill_dir = os.path.join(self.temp_dir.name, "spill")
+        with IntermediateStore(spill_dir, memory_threshold=100) as store: 
+            path = store.add_file(self.tiles[0])
+            self.assertEqual(path, os.path.join(spill_dir, "agb.tif"))
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path))
+    
+    def test_threshold_on_uncompressed_size(self): 
+        """
+        Test that a raster small on disk but large once decompressed is spilled.
+        """
+        path = write_test_raster(os.path.join(self.temp_dir.name, "zeros.tif"), data=np.zeros((200, 200)), 
+                                 compress="deflate")
+        self.assertLess(os.path.getsize(path), 10000)
+        with IntermediateStore(os.path.join(self.temp_dir.name, "spill"), memory_threshold=10000) as store: 
+            self.assertFalse(store.add_file(path).startswith("/vsimem/"))
+        with IntermediateStore(os.path.join(self.temp_dir.name, "spill"), memory_threshold=200 * 200 * 4) as store: 
+            self.assertTrue(store.add_file(path).startswith("/vsimem/"))
+    
+    def test_add_files_through_engine(self): 
+        """
+        Test that inputs are copied in parallel by the transfer engine, in memory and spilled,
+        with progress reported for every file.
+        """
+        red = write_test_raster(os.path.join(self.temp_dir.name, "red.tif"), data=np.zeros((200, 200)))
+        calls = []
+        engine = TransferEngine(streams=2, verify=True, progress=lambda *args: calls.append(args))
+        spill_dir = os.path.join(self.temp_dir.name, "spill")
+        with IntermediateStore(spill_dir, memory_threshold=10000) as store: 
+            paths = store.add_files([self.tiles[0], red], engine=engine)
+            self.assertTrue(paths[0].startswith("/vsimem/"))
+            self.assertEqual(paths[1], os.path.join(spill_dir, "red.tif"))
+            for src_path, path in zip([self.tiles[0], red], paths): 
+                with rio.open(src_path) as src, rio.open(path) as copy: 
+                    np.testing.assert_array_equal(copy.read(), src.read())
+        self.assertEqual([call[0] for call in calls], [1, 2])
+        self.assertEqual(calls[-1][2], os.path.getsize(self.tiles[0]) + os.path.getsize(red))
+    
+    def test_statistics_for_copied_inputs(self): 
+        """
+        Test that rasters added without statistics get them in the final pass, in memory or spilled.
+        """
+        for memory_threshold in [10 ** 6, 100]: 
+            with IntermediateStore(os.path.join(self.temp_dir.name, "spill"), memory_threshold) as store: 
+                store.add_file(self.tiles[0])
+                store.move_all(self.final_dir)
+            dest_path = os.path.join(self.final_dir, "agb.tif")
+            stats = read_stats_sidecar(dest_path)
+            self.assertEqual((stats[0]["valid_count"], stats[0]["max"]), (20 * 30, 599.0))
+            with rio.open(dest_path) as rast: 
+                self.assertEqual(float(rast.tags(1)["STATISTICS_MAXIMUM"]), 599.0)
+            os.remove(dest_path)
+            os.remove(dest_path + ".stats.json")
+
+
+if __name__ == "__main__": 
+    unittest.main()
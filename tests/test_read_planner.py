@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from rasterio.windows import Window
+from file_manager.read_planner import plan_windows, count_block_reads, record_plan
+from raster_metadata import run_trace
+from tests.raster_fixtures import write_test_raster
+
+
+class TestReadPlanner(unittest.TestCase): 
+    """
+    A test case class for the block-aligned read planner.
+    """
+
+    def setUp(self) -> None: 
+        self.temp_dir = tempfile.TemporaryDirectory()
+        data = np.arange(3 * 100 * 90, dtype="float32").reshape(3, 100, 90)
+        self.tiled = write_test_raster(os.path.join(self.temp_dir.name, "tiled.tif"), data=data,
+                                       tiled=True, blockxsize=32, blockysize=32)
+        self.striped = write_test_raster(os.path.join(self.temp_dir.name, "striped.tif"), data=data,
+                                         blockysize=8)
+        run_trace.reset()
+
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+
+    def assert_covers_once(self, dataset, windows): 
+        coverage = np.zeros(dataset.shape, dtype=int)
+        for window in windows: 
+            rows, cols = window.toslices()
+            coverage[rows, cols] += 1
+        np.testing.assert_array_equal(coverage, 1)
+
+    def test_tiled_windows_aligned_and_within_budget(self): 
+        """
+        Test that windows of a tiled raster are runs of whole tiles within the byte budget.
+        """
+        with rio.open(self.tiled) as src: 
+            # 32x32 tiles of 3 float32 bands are 12 KiB, a row of 3 tiles does not fit in 25 KiB
+            windows = plan_windows(src, max_bytes=25 * 1024)
+            self.assert_covers_once(src, windows)
+            self.assertTrue(all(w.col_off % 32 == 0 and w.row_off % 32 == 0 for w in windows))
+            self.assertTrue(all(w.width * w.height * 3 * 4 <= 25 * 1024 for w in windows))
+            self.assertEqual(count_block_reads(windows, src.block_shapes[0]), 4 * 3)
+
+    def test_striped_windows_coalesced(self): 
+        """
+        Test that strips are coalesced into whole-width windows.
+        """
+        with rio.open(self.striped) as src: 
+            windows = plan_windows(src, max_bytes=8 * 90 * 3 * 4 * 5)
+            self.assert_covers_once(src, windows)
+            self.assertEqual([w.height for w in windows], [40, 40, 20])
+            self.assertTrue(all(w.width == 90 for w in windows))
+
+    def test_fewer_block_reads_than_unaligned_grid(self): 
+        """
+        Test that the plan decompresses every block once while an unaligned grid does not.
+        """
+        with rio.open(self.tiled) as src: 
+            planned = count_block_reads(plan_windows(src), src.block_shapes[0])
+            unaligned = [Window(col, row, 25, 25) for row in range(0, 100, 25) for col in range(0, 90, 25)]
+            self.assertEqual(planned, 4 * 3)
+            self.assertGreater(count_block_reads(unaligned, src.block_shapes[0]), planned)
+
+    def test_aligned_to_several_layouts(self): 
+        """
+        Test that windows read from rasters with different block layouts decompress every block of
+        each raster once, unlike windows planned on one of them, and that both are reported.
+        """
+        with rio.open(self.tiled) as tiled, rio.open(self.striped) as striped: 
+            windows = plan_windows(tiled, max_bytes=25 * 1024, align_to=[striped])
+            baseline = plan_windows(tiled, max_bytes=25 * 1024)
+            self.assert_covers_once(tiled, windows)
+            self.assertEqual(count_block_reads(windows, tiled.block_shapes[0]), 4 * 3)
+            self.assertEqual(count_block_reads(windows, striped.block_shapes[0]), 100 // 8 + 1)
+            self.assertGreater(count_block_reads(baseline, striped.block_shapes[0]), 100 // 8 + 1)
+            
+            record_plan("test", striped, windows, 0, 0.0, baseline=baseline)
+        record = run_trace.get_records("read_plan")[0]
+        self.assertEqual((record["reader"], record["blocks"], record["block_reads"]), ("test", 13, 13))
+        self.assertGreater(record["baseline_block_reads"], 13)
+
+
+if __name__ == "__main__": 
+    unittest.main()
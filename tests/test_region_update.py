@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import numpy as np
+import rasterio as rio
+from rasterio.warp import reproject, Resampling
+from rasterio.windows import Window
+import raster_process_main
+from file_manager.file_discovery import invalidate_inventory
+from file_manager.raster_file_manager import RasterFileManager
+from raster_metadata.band_statistics import compute_statistics, read_stats_sidecar
+from tests.raster_fixtures import write_test_raster
+from warper.region_update import update_region
+
+
+class TestRegionUpdate(unittest.TestCase):
+    """
+    A test case class for the in-place update of conformed rasters in the regions where their mosaics changed.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        join = lambda *names: os.path.join(self.temp_dir.name, *names)
+        self.lidar_dir, self.final_dir, self.raster_dir = join("lidar_raster"), join("final_variable"), join("raster_file")
+        for d in [self.lidar_dir, self.final_dir, self.raster_dir]:
+            os.makedirs(d)
+        rng = np.random.default_rng(0)
+        self.mosaic = write_test_raster(join("lidar_raster", "agb.tif"), data=rng.random((40, 60)), nodata=-9999.0)
+        self.output = join("final_variable", "agb.tif")
+        shutil.copyfile(self.mosaic, self.output)
+        compute_statistics(self.output)
+        # new values within a window of the mosaic
+        self.window = Window(20, 10, 10, 10)
+        with rio.open(self.mosaic, "r+") as mosaic:
+            mosaic.write(np.full((1, 10, 10), 5.0, dtype="float32"), window=self.window)
+            self.bounds = mosaic.window_bounds(self.window)
+
+    def tearDown(self) -> None:
+        invalidate_inventory()
+        self.temp_dir.cleanup()
+
+    def assert_output_matches_mosaic(self):
+        with rio.open(self.mosaic) as mosaic, rio.open(self.output) as output:
+            np.testing.assert_array_equal(output.read(), mosaic.read())
+        expected = compute_statistics(self.mosaic)[0]
+        stats = read_stats_sidecar(self.output)[0]
+        self.assertEqual(stats["valid_count"], expected["valid_count"])
+        self.assertAlmostEqual(stats["mean"], expected["mean"], places=5)
+        self.assertAlmostEqual(stats["max"], 5.0)
+
+    def test_same_grid_copy(self):
+        """
+        Test that a region on the same grid is copied and the statistics updated, and that a
+        region beyond the output is refused.
+        """
+        self.assertTrue(update_region(self.mosaic, self.output, self.bounds))
+        self.assert_output_matches_mosaic()
+        self.assertFalse(update_region(self.mosaic, self.output, (499000.0, 199000.0, 500100.0, 200000.0)))
+
+    def test_reprojected_region(self):
+        """
+        Test that a region of an output on another grid is reprojected like a full reprojection.
+        """
+        output = write_test_raster(os.path.join(self.final_dir, "coarse.tif"), data=np.zeros((20, 30)),
+                                   res=10.0, origin=(500002.5, 199997.5), nodata=-9999.0)
+        self.assertTrue(update_region(self.mosaic, output, self.bounds))
+        with rio.open(self.mosaic) as mosaic, rio.open(output) as updated:
+            expected = np.zeros((20, 30))
+            reproject(mosaic.read(1).astype(np.float64), expected, src_transform=mosaic.transform,
+                      src_crs=mosaic.crs, dst_transform=updated.transform, dst_crs=updated.crs,
+                      src_nodata=-9999.0, dst_nodata=-9999.0, resampling=Resampling.bilinear)
+            # the changed region in the coarse grid, away from the edges of the rewritten window
+            np.testing.assert_allclose(updated.read(1)[6:10, 11:15], expected[6:10, 11:15], rtol=1e-6)
+
+    def write_inputs(self, age: float) -> None:
+        """Write the schema and the other raster variables, age seconds before the previous run ended."""
+        self.schema_file = os.path.join(self.temp_dir.name, "schema.json")
+        with open(self.schema_file, "w") as json_file:
+            json.dump({"crs": 27700}, json_file)
+        red = write_test_raster(os.path.join(self.raster_dir, "red.tif"))
+        marker = os.path.join(self.final_dir, "run_trace.json")
+        with open(marker, "w") as json_file:
+            json.dump([], json_file)
+        for path in [self.schema_file, red]:
+            os.utime(path, (time.time() - age, time.time() - age))
+
+    def update_final(self) -> bool:
+        return raster_process_main._update_final_regions(self.lidar_dir, self.raster_dir, self.final_dir,
+                                                         {"agb.tif": [self.bounds]}, schema_file=self.schema_file)
+
+    def test_update_final_regions(self):
+        """
+        Test that the outputs of a previous run are updated in place when nothing else changed.
+        """
+        self.write_inputs(age=60)
+        self.assertTrue(self.update_final())
+        self.assert_output_matches_mosaic()
+
+    def test_update_final_regions_needs_full_run(self):
+        """
+        Test that a full run is requested when the previous run did not complete or its other inputs changed.
+        """
+        self.write_inputs(age=-60)
+        self.assertFalse(self.update_final())
+        self.write_inputs(age=60)
+        os.remove(os.path.join(self.final_dir, "run_trace.json"))
+        self.assertFalse(self.update_final())
+
+    def test_update_final_regions_sees_files_rewritten_in_place(self):
+        """
+        Test that a raster variable rewritten in place after it was discovered requests a full run,
+        although its directory did not change.
+        """
+        self.write_inputs(age=60)
+        RasterFileManager(self.raster_dir).tif_entries()
+        dir_stat = os.stat(self.raster_dir)
+        red = write_test_raster(os.path.join(self.raster_dir, "red.tif"), data=np.ones((20, 30)))
+        os.utime(red, (time.time() + 10, time.time() + 10))
+        os.utime(self.raster_dir, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+        self.assertFalse(self.update_final())
+
+    def test_update_final_regions_failure_propagates(self):
+        """
+        Test that a failing region update is raised, so the pending regions are kept for the next run.
+        """
+        self.write_inputs(age=60)
+        with mock.patch.object(raster_process_main, "update_region", side_effect=ValueError("disk full")):
+            with self.assertRaises(ValueError):
+                self.update_final()
+
+
+if __name__ == "__main__":
+    unittest.main()
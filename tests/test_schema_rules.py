@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from raster_metadata.create_metadata import get_header_table
+from schema.schema_rules import compile_schema, load_schema, SchemaRule
+from tests.raster_fixtures import write_test_raster
+
+
+class TestSchemaRules(unittest.TestCase): 
+    """
+    A test case class for the compiled schema rule engine.
+    """
+    
+    def setUp(self) -> None:
+        """
+        Write a set of rasters that conform to, or break, individual rules.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        join = lambda name: os.path.join(self.temp_dir.name, name)
+        self.good = write_test_raster(join("good.tif"), nodata=-9999.0, tiled=True, blockxsize=16, blockysize=16)
+        self.bad_crs = write_test_raster(join("bad_crs.tif"), crs=4326, res=0.0001, origin=(-1.0, 52.0), nodata=-9999.0)
+        self.bad_res = write_test_raster(join("bad_res.tif"), res=10.0, nodata=-9999.0)
+        self.shifted = write_test_raster(join("shifted.tif"), origin=(500002.5, 200000.0), nodata=-9999.0)
+        self.int_raster = write_test_raster(join("int.tif"), dtype="int16")
+        self.table = get_header_table([self.good, self.bad_crs, self.bad_res, self.shifted, self.int_raster])
+    
+    def tearDown(self) -> None: 
+        self.temp_dir.cleanup()
+    
+    def test_default_schema_rules(self): 
+        """
+        Test the CRS, resolution and band rules of the shipped schema over the whole table.
+        """
+        schema = load_schema(os.path.join(os.path.dirname(__file__), "..", "schema", "json_schema.json"))
+        results = compile_schema(schema).evaluate(self.table)
+        np.testing.assert_array_equal(results["crs"], [True, False, True, True, True])
+        np.testing.assert_array_equal(results["spatial_resolution"], [True, False, False, True, True])
+        self.assertTrue(results["number of bands"].all())
+    
+    def test_extended_rules(self): 
+        """
+        Test the dtype, nodata, grid alignment, extent and block shape rules.
+        """
+        schema = {"dtype": "float32", "nodata": -9999.0, "grid_alignment": True, 
+                  "extent": {"bounds": [500000.0, 199900.0, 500150.0, 200000.0], "min_overlap": 1.0}, 
+                  "block_shape": [16, 16]}
+        failures = compile_schema(schema).failures(self.table)
+        self.assertNotIn(self.good, failures)
+        self.assertTrue(any(e.startswith("grid_alignment") for e in failures[self.shifted]))
+        self.assertTrue(any(e.startswith("dtype") for e in failures[self.int_raster]))
+        self.assertTrue(any(e.startswith("nodata") for e in failures[self.int_raster]))
+        self.assertTrue(any(e.startswith("extent") for e in failures[self.bad_crs]))
+        self.assertTrue(any(e.startswith("block_shape") for e in failures[self.bad_res]))
+    
+    def test_incomplete_rule_rejected(self): 
+        """
+        Test that a rule missing one of the rule methods can not be constructed.
+        """
+        class EvaluateOnly(SchemaRule): 
+            def evaluate(self, table): 
+                return np.ones(len(table["epsg"]), dtype=bool)
+        
+        with self.assertRaises(TypeError): 
+            EvaluateOnly()
+        with self.assertRaises(TypeError): 
+            SchemaRule()
+    
+    def test_compile_is_cached(self): 
+        """
+        Test that compiling an equal schema returns the same compiled object.
+        """
+        self.assertIs(compile_schema({"crs": 27700}), compile_schema({"crs": 27700}))
+
+
+if __name__ == "__main__": 
+    unittest.main()
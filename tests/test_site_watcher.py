@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from file_manager.file_discovery import invalidate_inventory
+from file_manager.site_watcher import SiteWatcher, write_status
+
+
+class TestSiteWatcher(unittest.TestCase):
+    """
+    A test case class for the polling site watcher used by watch mode.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.canopy_dir = os.path.join(self.temp_dir.name, "ept_a", "canopy_metrics")
+        self.raster_dir = os.path.join(self.temp_dir.name, "raster_file")
+        os.makedirs(self.canopy_dir)
+        os.makedirs(self.raster_dir)
+        self.site = {"name": "site", "canopy_metrics_dirs": [self.canopy_dir], "raster_dir": self.raster_dir}
+        self.write(os.path.join(self.raster_dir, "red.tif"), b"0" * 10, age=60)
+
+    def tearDown(self) -> None:
+        invalidate_inventory()
+        self.temp_dir.cleanup()
+
+    def write(self, path: str, content: bytes, age: float = 0) -> None:
+        with open(path, "wb") as f:
+            f.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        # move the directory mtime too, as coarse-grained filesystems may not
+        os.utime(os.path.dirname(path), (time.time() + 5, time.time() + 5))
+
+    def test_settled_inputs_due_on_first_poll(self):
+        """
+        Test that a site whose inputs are old enough is due on the first poll, and only once.
+        """
+        watcher = SiteWatcher([self.site], settle_seconds=5)
+        self.assertEqual(watcher.poll(), [self.site])
+        # not handed out again while running
+        self.assertEqual(watcher.poll(), [])
+        watcher.done(self.site, succeeded=True)
+        self.assertEqual(watcher.poll(), [])
+
+    def test_new_tile_debounced_until_stable(self):
+        """
+        Test that a landing tile is processed only after it stayed unchanged for the settle period.
+        """
+        watcher = SiteWatcher([self.site], settle_seconds=5)
+        watcher.done(*watcher.poll(), succeeded=True)
+        now = time.time()
+        tile = os.path.join(self.canopy_dir, "agb.tif")
+        self.write(tile, b"0" * 10)
+        self.assertEqual(watcher.poll(now), [])
+        self.assertEqual(watcher.pending(), ["site"])
+
+        # still growing: the settle period restarts
+        self.write(tile, b"0" * 20)
+        self.assertEqual(watcher.poll(now + 4), [])
+        self.assertEqual(watcher.poll(now + 8), [])
+        self.assertEqual(watcher.poll(now + 9), [self.site])
+        self.assertEqual(watcher.pending(), [])
+
+    def test_failed_site_retried_with_backoff(self):
+        """
+        Test that a failed site is retried with doubling delays up to the retry limit, then only
+        once its inputs change, and that a success ends the retries.
+        """
+        watcher = SiteWatcher([self.site], settle_seconds=5, max_retries=2, retry_delay=10)
+        now = time.time()
+        watcher.done(*watcher.poll(now), succeeded=False, now=now)
+        self.assertEqual(watcher.pending(), ["site"])
+        self.assertEqual(watcher.poll(now + 9), [])
+        self.assertEqual(watcher.poll(now + 10), [self.site])
+        watcher.done(self.site, succeeded=False, now=now + 10)
+        self.assertEqual(watcher.poll(now + 29), [])
+        self.assertEqual(watcher.poll(now + 30), [self.site])
+        watcher.done(self.site, succeeded=False, now=now + 30)
+        # retries exhausted: nothing until the inputs change
+        self.assertEqual(watcher.pending(), [])
+        self.assertEqual(watcher.poll(now + 1000), [])
+
+        self.write(os.path.join(self.canopy_dir, "agb.tif"), b"0" * 10)
+        self.assertEqual(watcher.poll(now + 1000), [])
+        self.assertEqual(watcher.poll(now + 1005), [self.site])
+        watcher.done(self.site, succeeded=False, now=now + 1005)
+        self.assertEqual(watcher.poll(now + 1015), [self.site])
+        watcher.done(self.site, succeeded=True)
+        self.assertEqual(watcher.poll(now + 2000), [])
+
+    def test_status_written_atomically(self):
+        """
+        Test that the status file is replaced as a whole, without leftovers.
+        """
+        status_file = os.path.join(self.temp_dir.name, "status.json")
+        write_status(status_file, {"sites": {"site": {"state": "ok"}}})
+        with open(status_file) as json_file:
+            self.assertEqual(json.load(json_file)["sites"]["site"]["state"], "ok")
+        self.assertEqual(os.listdir(self.temp_dir.name).count("status.json"), 1)
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.temp_dir.name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
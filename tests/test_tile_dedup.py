@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import rasterio as rio
+from rasterio.merge import merge
+from rasterio.windows import Window
+from merge.merge_raster import stitch_tiffs_by_pattern
+from merge.tile_dedup import deduplicate_tiles, find_duplicates
+from raster_metadata import run_trace
+from tests.raster_fixtures import write_test_raster
+
+
+class TestTileDedup(unittest.TestCase):
+    """
+    A test case class for the duplicate and covered tile detection run before stitching.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dirs = [os.path.join(self.temp_dir.name, f"ept_{x}", "canopy_metrics") for x in "abc"]
+        for d in self.dirs:
+            os.makedirs(d)
+        rng = np.random.default_rng(0)
+        # a: two compressed tiled tiles side by side, b: an exact copy of the first, c: a tile within the two
+        tiled = {"compress": "deflate", "tiled": True, "blockxsize": 16, "blockysize": 16}
+        self.left = write_test_raster(os.path.join(self.dirs[0], "agb.tif"), data=rng.integers(1, 5, (20, 30)),
+                                      **tiled)
+        self.right = write_test_raster(os.path.join(self.dirs[0], "AGB.TIF"), data=rng.integers(1, 5, (20, 30)),
+                                       origin=(500150.0, 200000.0), **tiled)
+        self.copy = os.path.join(self.dirs[1], "agb.tif")
+        shutil.copyfile(self.left, self.copy)
+        self.inner = write_test_raster(os.path.join(self.dirs[2], "agb.tif"), data=rng.random((10, 40)),
+                                       origin=(500050.0, 199975.0))
+        run_trace.reset()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_exact_duplicates_found(self):
+        """
+        Test that only the byte-identical tile is a duplicate, and that only tiles alike in
+        header and block layout are hashed.
+        """
+        duplicates, bytes_hashed = find_duplicates([self.left, self.right, self.copy, self.inner])
+        self.assertEqual(duplicates, {self.copy: self.left})
+        self.assertEqual(bytes_hashed, os.path.getsize(self.left) + os.path.getsize(self.copy))
+
+    def assert_stitch_unchanged(self, paths: list[str], overlap_rule: str = "valid"):
+        """Assert that merging the tiles kept by the overlap rule gives the merge of all tiles."""
+        datasets = [rio.open(p) for p in paths]
+        kept = [ds for ds in datasets if ds.name in deduplicate_tiles(paths, "agb", overlap_rule)]
+        try:
+            expected, transform = merge(datasets)
+            merged, kept_transform = merge(kept)
+        finally:
+            for ds in datasets:
+                ds.close()
+        self.assertEqual(kept_transform, transform)
+        np.testing.assert_array_equal(merged, expected)
+
+    def test_overlap_rules(self):
+        """
+        Test that covered tiles are skipped under "valid" only if the covering tiles hold
+        valid data in all their pixels, and under "footprint" whatever the covering tiles hold.
+        """
+        paths = [self.left, self.right, self.copy, self.inner]
+        self.assertEqual(deduplicate_tiles(paths, "agb", "exact"), [self.left, self.right, self.inner])
+        self.assertEqual(deduplicate_tiles(paths, "agb", "valid"), [self.left, self.right])
+        report = run_trace.get_records("tile_dedup")[-1]
+        self.assertEqual((report["duplicates"], report["covered"], report["coverage_reads"]), (1, 1, 2))
+        # only the blocks under the inner tile: the first row of blocks of both tiles
+        with rio.open(self.left) as left, rio.open(self.right) as right:
+            blocks_read = sum(src.block_size(1, 0, j) for src in (left, right) for j in (0, 1))
+        self.assertEqual(report["coverage_bytes_read"], blocks_read)
+        self.assertEqual(report["bytes_avoided"],
+                         os.path.getsize(self.copy) + os.path.getsize(self.inner) - blocks_read)
+
+        # declaring nodata does not matter as long as no pixel under the inner tile is nodata
+        with rio.open(self.right, "r+") as dst:
+            dst.nodata = -9999.0
+        self.assertEqual(deduplicate_tiles(paths, "agb", "valid"), [self.left, self.right])
+        with rio.open(self.right, "r+") as dst:
+            dst.write(np.full((1, 1, 1), -9999.0, dtype="float32"), window=Window(2, 6, 1, 1))
+        self.assertEqual(deduplicate_tiles(paths, "agb", "valid"), [self.left, self.right, self.inner])
+        self.assertEqual(deduplicate_tiles(paths, "agb", "footprint"), [self.left, self.right])
+        self.assert_stitch_unchanged(paths)
+        with self.assertRaises(ValueError):
+            deduplicate_tiles(paths, "agb", "largest")
+
+    def test_coverage_not_checked_when_dearer(self):
+        """
+        Test that a covered tile smaller than the covering blocks it would take to check it is kept unread.
+        """
+        # one uncompressed strip holding the whole covering tile
+        cover = write_test_raster(os.path.join(self.dirs[1], "small.tif"))
+        small = write_test_raster(os.path.join(self.dirs[2], "small.tif"), data=np.ones((2, 2)),
+                                  origin=(500050.0, 199975.0))
+        self.assertEqual(deduplicate_tiles([cover, small], "small", "valid"), [cover, small])
+        report = run_trace.get_records("tile_dedup")[-1]
+        self.assertEqual((report["coverage_reads"], report["coverage_bytes_read"]), (0, 0))
+
+    def test_empty_pixels_of_covering_tile(self):
+        """
+        Test that a covered tile is kept where the covering tile holds values the merge treats
+        as empty: 0 when the first tile has no nodata, or its nodata value.
+        """
+        for nodata, empty in [(None, 0.0), (-9999.0, -9999.0), (-9999.0, 0.0)]:
+            data = np.ones((20, 30))
+            data[:, :15] = empty
+            cover = write_test_raster(os.path.join(self.dirs[0], "cover.tif"), data=data, nodata=nodata,
+                                      compress="deflate", tiled=True, blockxsize=16, blockysize=16)
+            inner = write_test_raster(os.path.join(self.dirs[1], "cover.tif"), data=np.full((10, 10), 7.0),
+                                      origin=(500025.0, 199975.0), nodata=nodata)
+            expected = [cover, inner] if empty == (0.0 if nodata is None else nodata) else [cover]
+            self.assertEqual(deduplicate_tiles([cover, inner], "cover", "valid"), expected, msg=(nodata, empty))
+            self.assert_stitch_unchanged([cover, inner])
+
+    def test_stitch_unchanged(self):
+        """
+        Test that the stitched mosaic is identical to a merge of all tiles.
+        """
+        dest = os.path.join(self.temp_dir.name, "stitched")
+        stitch_tiffs_by_pattern(self.dirs, dest)
+        datasets = [rio.open(p) for p in [self.left, self.right, self.copy, self.inner]]
+        try:
+            expected, transform = merge(datasets)
+        finally:
+            for ds in datasets:
+                ds.close()
+        with rio.open(os.path.join(dest, "agb.tif")) as mosaic:
+            self.assertEqual(mosaic.transform, transform)
+            np.testing.assert_array_equal(mosaic.read(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+from file_manager.file_discovery import invalidate_inventory
+from file_manager.raster_file_manager import RasterFileManager
+from file_manager.transfer_engine import TransferEngine
+
+
+class _CorruptingEngine(TransferEngine):
+    # reads back something else than what was copied
+    def _file_digest(self, path: str) -> bytes:
+        return b"corrupt"
+
+
+class TestTransferEngine(unittest.TestCase):
+    """
+    A test case class for the concurrent bulk transfer engine behind RasterFileManager.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.temp_dir.name, "src")
+        self.dest_dir = os.path.join(self.temp_dir.name, "final_variable")
+        os.makedirs(self.src_dir)
+        os.makedirs(self.dest_dir)
+        self.contents = {}
+        for index, name in enumerate(["agb.tif", "red.tif", "nir.tif", "agb.tif.stats.json"]):
+            self.contents[name] = os.urandom(1000 + 37 * index)
+            with open(os.path.join(self.src_dir, name), "wb") as f:
+                f.write(self.contents[name])
+
+    def tearDown(self) -> None:
+        invalidate_inventory()
+        self.temp_dir.cleanup()
+
+    def assert_transferred(self):
+        self.assertEqual(sorted(os.listdir(self.dest_dir)), sorted(self.contents))
+        for name, content in self.contents.items():
+            with open(os.path.join(self.dest_dir, name), "rb") as f:
+                self.assertEqual(f.read(), content)
+
+    def test_copy_files_verified(self):
+        """
+        Test that rasters and their sidecars are copied in parallel with small buffers and verified.
+        """
+        manager = RasterFileManager(self.src_dir, streams=3, buffer_size=64, verify=True)
+        manager.copy_files(self.dest_dir)
+        self.assert_transferred()
+        self.assertEqual(len(os.listdir(self.src_dir)), 4)
+
+    def test_move_file(self):
+        """
+        Test that moved files leave the source directory.
+        """
+        RasterFileManager(self.src_dir).move_file(self.dest_dir)
+        self.assert_transferred()
+        self.assertEqual(os.listdir(self.src_dir), [])
+
+    def test_progress_reported(self):
+        """
+        Test that progress is reported after every file and summarised in the report.
+        """
+        calls = []
+        engine = TransferEngine(streams=2, progress=lambda *args: calls.append(args))
+        jobs = [(os.path.join(self.src_dir, name), os.path.join(self.dest_dir, name)) for name in self.contents]
+        report = engine.copy(jobs)
+        self.assertEqual([call[0] for call in calls], [1, 2, 3, 4])
+        self.assertEqual(report["bytes"], sum(len(content) for content in self.contents.values()))
+        self.assertEqual(calls[-1][2], report["bytes"])
+
+    def test_failed_verification_leaves_no_file(self):
+        """
+        Test that a copy failing verification is neither renamed into place nor left behind.
+        """
+        src = os.path.join(self.src_dir, "agb.tif")
+        with self.assertRaises(IOError):
+            _CorruptingEngine(verify=True).copy([(src, os.path.join(self.dest_dir, "agb.tif"))])
+        self.assertEqual(os.listdir(self.dest_dir), [])
+
+    def test_cross_device_move_verified(self):
+        """
+        Test that a move across filesystems verifies the copy before deleting the source, even without verify.
+        """
+        src = os.path.join(self.src_dir, "agb.tif")
+        replace = os.replace
+
+        def cross_device_replace(src_path, dest_path):
+            if src_path == src:
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            replace(src_path, dest_path)
+
+        with mock.patch("file_manager.transfer_engine.os.replace", side_effect=cross_device_replace):
+            with self.assertRaises(IOError):
+                _CorruptingEngine().move([(src, os.path.join(self.dest_dir, "agb.tif"))])
+            self.assertTrue(os.path.exists(src))
+            self.assertEqual(os.listdir(self.dest_dir), [])
+            TransferEngine().move([(src, os.path.join(self.dest_dir, "agb.tif"))])
+        self.assertFalse(os.path.exists(src))
+        with open(os.path.join(self.dest_dir, "agb.tif"), "rb") as f:
+            self.assertEqual(f.read(), self.contents["agb.tif"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import os
 from file_manager.raster_file_manager import RasterFileManager
 
-def validate_file_list(file_dir: str) -> None: 
+def validate_file_list(file_dir: str, tif_files: list[str] = None) -> None: 
         
     """
     Validate the variable sets in a directory containing raster files.
@@ -10,6 +10,9 @@ def validate_file_list(file_dir: str) -> None:
     ----------
     file_dir : str
         The path to the directory containing different file format.
+    tif_files : list[str], optional
+        Paths of the raster files to validate instead of the TIFF files in file_dir
+        (e.g. intermediates that are not in a single directory).
     var_list : list
         A list of predefined variable names.
 
@@ -27,18 +30,20 @@ def validate_file_list(file_dir: str) -> None:
         If there is a mismatch between the raster file names and the predefined variable names.
     """
         
-    # initializing lenght of files in the raster variable directory
-    raster_file_len = len([file for file in os.listdir(file_dir) if file.endswith('.tif')])
-    
     # raster file manager instance
-    raster_file = RasterFileManager()
+    raster_file = RasterFileManager(file_dir, recursive=False)
+    if tif_files is None: 
+        tif_files = raster_file.tif_ext_file()
+    
+    # initializing lenght of files in the raster variable directory
+    raster_file_len = len(tif_files)
     
     # initializing length of the listed predefined variables 
     raster_file_list = raster_file.file_list
     var_len = len(raster_file_list)
     
     # extracting file names from the raster variable directory
-    raster_files_names = [os.path.splitext(file)[0].lower() for file in os.listdir(file_dir) if file.endswith('.tif')] 
+    raster_files_names = [os.path.splitext(os.path.basename(file))[0].lower() for file in tif_files] 
     
     # validating the lenght of the variables in raster variable directory
     if raster_file_len != var_len: 
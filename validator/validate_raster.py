@@ -1,4 +1,5 @@
 import rasterio as rio
+from file_manager.dataset_pool import dataset_pool
 from raster_metadata.create_metadata import get_rst_meta
 
 
@@ -95,7 +96,7 @@ def raster_validation(raster_file:str, schema_json:dict, filename:str):
     ValueError
         If any of the raster properties do not conform to the schema.
     """
-    with rio.open(raster_file) as raster_data:      
+    with dataset_pool.open(raster_file) as raster_data:      
         metadata = get_rst_meta(raster_data)
         # validating the max band count of the raster file. 
         validate_maxband_count(raster_data, schema_json, filename)
@@ -1,69 +1,67 @@
 from os.path import join as path_join
-from warper.raster_projector import project_raster
+from os.path import basename
+from warper.batch_reprojector import project_rasters
 from warper.resample import resample_raster
 from file_manager.raster_file_manager import RasterFileManager
-from validator.validate_raster import raster_validation
+from raster_metadata.create_metadata import get_header_table
+from schema.schema_rules import compile_schema
 
 
-def validate_raster_properties(rast_path: str, schema_json: dict):
+def validate_raster_properties(rast_path: str, schema_json: dict, raster_files: list[str] = None):
     """
     Validate properties of raster datasets based on a user-defined JSON schema.
 
+    The schema is compiled once into rule objects and evaluated over a header
+    table of all raster files at once. Only the files that fail are projected
+    (in batches of files sharing a source grid) and resampled, after which their headers are re-read and re-validated.
+
     Parameters
     ----------
     rast_path : str
         Path to the directory containing raster files to be validated.
     schema_json : dict
         JSON schema defining the expected properties of raster datasets.
+    raster_files : list[str], optional
+        Paths of the raster files to validate instead of the TIFF files in rast_path
+        (e.g. intermediates that are not in a single directory).
 
     Returns
     -------
     bool or None
         True if all raster files conform to the defined schema, None otherwise.
+
+    Raises
+    ------
+    ValueError
+        If a raster file does not conform to the schema after projection and resampling.
     """
     # extracting only tif file from the list of files in the raster directory instance class
-    raster_files = RasterFileManager(rast_path).tif_ext_file()
+    if raster_files is None: 
+        raster_files = [path_join(rast_path, filename) for filename in RasterFileManager(rast_path).tif_ext_file()]
+    compiled_schema = compile_schema(schema_json)
     
-    for filename in raster_files:   
-        # initializing the value of validation error to be false
-        validation_error = False  
-           
-        try: 
-             # Validate raster properties
-            raster_validation(path_join(rast_path, filename), schema_json, filename)
-        except ValueError as e: 
-            # Set validation error flag and print error message
-            validation_error = True
-            print(f"Error validating raster file: {filename}: {e}")
-        
-        if validation_error: 
-             # Project raster if validation error occurs
-            project_raster(tgt_crs=schema_json['crs'], 
-                            src_rast_file=path_join(rast_path, filename),
-                            dst_path=path_join(rast_path, filename))
-            
-            # Resample raster if validation error occurs
-            resample_raster(src_rast_file=path_join(rast_path, filename), 
-                            tgt_res=schema_json['spatial_resolution'], 
-                            dst_path=path_join(rast_path, filename))
-        
-        try: 
-            # Re-validate raster properties after projection and resampling
-            raster_validation(path_join(rast_path, filename), schema_json, filename)
- 
-        except ValueError as e: 
-            # Set validation error flag and print error message
-            validation_error = True
-            print(f"Error validating ratser file {filename} after reprojection/resampling: {e}")
-        else: 
-            validation_error = False
-                
-        if validation_error:
-            raise ValueError(f"Raster file {filename} properties does not conform with schema")
+    # Validate raster properties of all files at once
+    failures = compiled_schema.failures(get_header_table(raster_files))
     
-    if not validation_error:
-        # Raise ValueError if validation error occurs
-        print("Success validating raster files. Data conforms with the defined schema: OK")
-        return True
-
-
+    for raster_file, errors in failures.items(): 
+        print(f"Error validating raster file: {basename(raster_file)}: {'; '.join(errors)}")
+    
+    # Project rasters if validation error occurs, warping files that share a source grid together
+    project_rasters(tgt_crs=schema_json['crs'], raster_files=list(failures))
+    
+    for raster_file in failures: 
+        # Resample raster if validation error occurs
+        resample_raster(src_rast_file=raster_file, 
+                        tgt_res=schema_json['spatial_resolution'], 
+                        dst_path=raster_file)
+    
+    if failures: 
+        # Re-validate raster properties after projection and resampling
+        failures = compiled_schema.failures(get_header_table(list(failures)))
+        for raster_file, errors in failures.items(): 
+            print(f"Error validating ratser file {basename(raster_file)} after reprojection/resampling: {'; '.join(errors)}")
+        if failures: 
+            raise ValueError(f"Raster file {basename(next(iter(failures)))} properties does not conform with schema")
+    
+    print("Success validating raster files. Data conforms with the defined schema: OK")
+    return True
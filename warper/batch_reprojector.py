@@ -0,0 +1,146 @@
+import time
+from collections import defaultdict
+from os.path import basename
+import numpy as np
+import rasterio as rio
+from rasterio.warp import reproject, Resampling
+from file_manager.dataset_pool import dataset_pool
+from raster_metadata.band_statistics import write_with_statistics
+from raster_metadata import run_trace
+from warper.crs_transformer import transformer
+
+
+# upper bound of the band stack warped in one call; larger groups are split
+DEFAULT_MAX_STACK_BYTES = 1024 ** 3
+
+
+def grid_key(src_rst: rio.io.DatasetReader) -> tuple:
+    """
+    Key identifying the source grid of a raster file.
+
+    Files with the same key share CRS, transform and shape (and nodata, since the
+    warp takes a single destination nodata value), so they can be warped together.
+    """
+    crs = src_rst.crs.to_wkt() if src_rst.crs is not None else None
+    return (crs, tuple(src_rst.transform), src_rst.width, src_rst.height, src_rst.nodata)
+
+
+def group_by_grid(raster_files: list[str]) -> dict:
+    """
+    Group raster files by identical source grid.
+
+    Parameters
+    ----------
+    raster_files : list[str]
+        Paths to the raster files.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping grid key to the list of raster files on that grid.
+    """
+    groups = defaultdict(list)
+    for raster_file in raster_files:
+        with dataset_pool.open(raster_file) as src_rst:
+            groups[grid_key(src_rst)].append(raster_file)
+    return dict(groups)
+
+
+def _split_by_size(raster_files: list[str], max_stack_bytes: int) -> list[list[str]]:
+    """Split a group into stacks whose float64 band data stays within max_stack_bytes."""
+    stacks, stack, stack_bytes = [], [], 0
+    for raster_file in raster_files:
+        with dataset_pool.open(raster_file) as src_rst:
+            nbytes = src_rst.count * src_rst.width * src_rst.height * 8
+        if stack and stack_bytes + nbytes > max_stack_bytes:
+            stacks.append(stack)
+            stack, stack_bytes = [], 0
+        stack.append(raster_file)
+        stack_bytes += nbytes
+    if stack:
+        stacks.append(stack)
+    return stacks
+
+
+def project_rasters(tgt_crs: int, raster_files: list[str],
+                    max_stack_bytes: int = DEFAULT_MAX_STACK_BYTES) -> list[str]:
+    """
+    Reproject many raster files in place, paying the projection math once per source grid.
+
+    Files are grouped by identical (CRS, transform, shape, nodata). For each group
+    the target grid is calculated once, and the bands of all its files are warped
+    together as one band stack, so GDAL builds the coordinate transformation
+    (and its approximation) once for the whole group. Each file is then written
+    back with its own profile.
+
+    Parameters
+    ----------
+    tgt_crs : int
+        Target CRS to which the rasters will be projected.
+    raster_files : list[str]
+        Paths to the raster files; each is overwritten with its projected data.
+    max_stack_bytes : int
+        Maximum size of a band stack warped in one call.
+
+    Returns
+    -------
+    list[str]
+        The raster files that were reprojected.
+
+    Raises
+    ------
+    ValueError
+        If an error occurs during the conversion process.
+    """
+    projected = []
+    try:
+        for key, group in group_by_grid(raster_files).items():
+            with dataset_pool.open(group[0]) as first:
+                if first.crs is not None and first.crs.to_epsg() == tgt_crs:
+                    print(f"Skipping projection stage. {len(group)} raster files in the same CRS with target's {tgt_crs}")
+                    continue
+                # target grid, computed once for the whole group
+                first_profile, tgt_transform = transformer(first, tgt_crs)
+                height, width = first_profile['height'], first_profile['width']
+                src_crs = first.crs
+
+            start = time.perf_counter()
+            for stack in _split_by_size(group, max_stack_bytes):
+                profiles, source = [], []
+                for raster_file in stack:
+                    with dataset_pool.open(raster_file) as src_rst:
+                        # the file's own metadata on the shared target grid
+                        profile = src_rst.meta.copy()
+                        profile.update({'crs': tgt_crs, 'transform': tgt_transform, 
+                                        'width': width, 'height': height})
+                        profiles.append(profile)
+                        source.append(src_rst.read())
+                source = np.concatenate(source)
+                data, _ = reproject(
+                    source=source,
+                    destination=np.zeros((source.shape[0], height, width)),
+                    src_transform=rio.Affine(*key[1][:6]),
+                    src_crs=src_crs,
+                    dst_transform=tgt_transform,
+                    dst_crs=tgt_crs,
+                    dst_nodata=key[4],
+                    resampling=Resampling.bilinear
+                )
+
+                band = 0
+                for raster_file, profile in zip(stack, profiles):
+                    # Close pooled handles of the source raster to overwrite it
+                    dataset_pool.invalidate(raster_file)
+                    with rio.open(raster_file, 'w', **profile) as proj_rst:
+                        write_with_statistics(proj_rst, data[band:band + profile['count']])
+                    band += profile['count']
+                    projected.append(raster_file)
+                    print(f"raster file {basename(raster_file)} successfully reprojected to {tgt_crs} projection")
+
+            run_trace.record("batch_reprojection", files=group, tgt_crs=tgt_crs,
+                             seconds=time.perf_counter() - start)
+    except FileNotFoundError as e:
+        raise ValueError(f"File Error: {e}")
+    except rio.errors.RasterioIOError as e:
+        raise ValueError(f"Rasterio I/O error: {e}")
+    return projected
@@ -2,6 +2,8 @@ import rasterio as rio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 import numpy as np
 import rasterio
+from raster_metadata.band_statistics import write_with_statistics
+from file_manager.dataset_pool import dataset_pool
 
 
 
@@ -84,12 +86,12 @@ def reprojector (src_rst:rasterio.io.DatasetReader, kwargs: dict, tgt_transform,
             resampling=Resampling.bilinear
             )
         
-        # Close the source raster to overwrite it
-        src_rst.close()
+        # Close pooled handles of the destination (possibly the source raster) to overwrite it
+        dataset_pool.invalidate(dst_path)
         
-        # Write the reprojected data to the destination raster
+        # Write the reprojected data to the destination raster, collecting band statistics on the way
         with rio.open(dst_path, 'w', **kwargs) as proj_rst: 
-            proj_rst.write(data)
+            write_with_statistics(proj_rst, data)
             
         print(f"Raster source file reprojection and resample process completed successfully.")
         return True 
@@ -2,6 +2,7 @@ import rasterio as rio
 from os.path import basename
 from raster_metadata.create_metadata import get_crs
 from warper.crs_transformer import transformer, reprojector
+from file_manager.dataset_pool import dataset_pool
 
 
 
@@ -32,8 +33,8 @@ def project_raster(tgt_crs: int, src_rast_file:str, dst_path: str):
         If an error occurs during the conversion process.
     """
     try:
-        # opening raster file
-        with rio.open(src_rast_file) as src_rast: 
+        # opening raster file (shared handle from the dataset pool)
+        with dataset_pool.open(src_rast_file) as src_rast: 
         
         # extracting source and target raster crs info
             if src_rast.crs is None: 
@@ -0,0 +1,92 @@
+import math
+import numpy as np
+import rasterio as rio
+from rasterio.warp import reproject, transform_bounds, Resampling
+from rasterio.windows import Window, from_bounds
+from file_manager.dataset_pool import dataset_pool
+from raster_metadata.band_statistics import update_window_statistics
+
+
+def _on_same_grid(src_transform, dst_transform) -> bool:
+    """Check whether two north-up transforms of equal resolution share pixel edges."""
+    offset_x = (dst_transform.c - src_transform.c) / src_transform.a
+    offset_y = (dst_transform.f - src_transform.f) / src_transform.e
+    return abs(offset_x - round(offset_x)) < 1e-6 and abs(offset_y - round(offset_y)) < 1e-6
+
+
+def update_region(src_rast_file: str, dst_path: str, bounds: tuple) -> bool:
+    """
+    Update an existing conformed raster only within a region that changed in its source.
+
+    The region is transformed to the destination CRS and widened by one pixel for
+    the bilinear kernel. Within it the source is either copied (same CRS and pixel
+    grid) or reprojected onto the destination grid, and the destination statistics
+    are updated for the rewritten window only.
+
+    Parameters
+    ----------
+    src_rast_file : str
+        Path to the source raster (e.g. an incrementally updated mosaic).
+    dst_path : str
+        Path to the existing conformed raster derived from the source.
+    bounds : tuple
+        Changed region (left, bottom, right, top) in the source CRS.
+
+    Returns
+    -------
+    bool
+        True if the region was updated, False if it lies outside of the destination
+        (the destination then needs a full rebuild).
+
+    Raises
+    ------
+    ValueError
+        If an error occurs while updating the region.
+    """
+    try:
+        with dataset_pool.open(src_rast_file) as src_rast:
+            dataset_pool.invalidate(dst_path)
+            with rio.open(dst_path, 'r+') as dst_rast:
+                if src_rast.crs != dst_rast.crs:
+                    bounds = transform_bounds(src_rast.crs, dst_rast.crs, *bounds)
+                left, bottom, right, top = dst_rast.bounds
+                if bounds[0] < left or bounds[1] < bottom or bounds[2] > right or bounds[3] > top:
+                    return False
+
+                window = from_bounds(*bounds, transform=dst_rast.transform)
+                # one extra pixel on every side for the bilinear kernel, clipped to the raster
+                col_off = max(math.floor(round(window.col_off, 6)) - 1, 0)
+                row_off = max(math.floor(round(window.row_off, 6)) - 1, 0)
+                col_end = min(math.ceil(round(window.col_off + window.width, 6)) + 1, dst_rast.width)
+                row_end = min(math.ceil(round(window.row_off + window.height, 6)) + 1, dst_rast.height)
+                window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+                window_transform = dst_rast.window_transform(window)
+
+                if src_rast.crs == dst_rast.crs and src_rast.res == dst_rast.res \
+                        and _on_same_grid(src_rast.transform, dst_rast.transform):
+                    # same pixel grid: plain windowed copy
+                    # same resolution: the source window has exactly the shape of the destination window
+                    src_window = from_bounds(*dst_rast.window_bounds(window), transform=src_rast.transform)
+                    src_window = Window(round(src_window.col_off), round(src_window.row_off),
+                                        window.width, window.height)
+                    data = src_rast.read(window=src_window, boundless=True, fill_value=dst_rast.nodata or 0)
+                else:
+                    data = np.full((dst_rast.count, window.height, window.width),
+                                   dst_rast.nodata if dst_rast.nodata is not None else 0, dtype=np.float64)
+                    reproject(
+                        source=rio.band(src_rast, list(range(1, src_rast.count + 1))),
+                        destination=data,
+                        src_transform=src_rast.transform,
+                        src_crs=src_rast.crs,
+                        dst_transform=window_transform,
+                        dst_crs=dst_rast.crs,
+                        dst_nodata=dst_rast.nodata,
+                        resampling=Resampling.bilinear
+                    )
+                data = data.astype(dst_rast.dtypes[0], copy=False)
+                old_data = dst_rast.read(window=window)
+                dst_rast.write(data, window=window)
+                update_window_statistics(dst_rast, old_data, data)
+        return True
+    except (FileNotFoundError, rio.errors.RasterioIOError) as e:
+        raise ValueError(f"Error updating region of {dst_path}: {e}")
@@ -1,6 +1,8 @@
 import rasterio as rio
 from rasterio.enums import Resampling
 from os.path import basename
+from raster_metadata.band_statistics import write_with_statistics
+from file_manager.dataset_pool import dataset_pool
 
 def resample_raster(src_rast_file:str, tgt_res: tuple, dst_path:str):
     """
@@ -25,8 +27,8 @@ def resample_raster(src_rast_file:str, tgt_res: tuple, dst_path:str):
         If an error occurs during the resampling process.
     """
     try: 
-        # Open the source raster file
-        src_data = rio.open(src_rast_file)
+        # Open the source raster file (shared handle from the dataset pool)
+        src_data = dataset_pool.get(src_rast_file)
         
         # Check if the source raster resolution matches the target resolution
         if src_data.res != tgt_res: 
@@ -59,12 +61,12 @@ def resample_raster(src_rast_file:str, tgt_res: tuple, dst_path:str):
                 'width': data.shape[-1]
             })
             
-            # Close the source raster to overwrite it  
-            src_data.close()
+            # Close pooled handles of the destination (possibly the source raster) to overwrite it  
+            dataset_pool.invalidate(dst_path)
             
-            # Write resampled data to destination raster file
+            # Write resampled data to destination raster file, collecting band statistics on the way
             with rio.open(dst_path, 'w',  **profile) as resampled_data: 
-                resampled_data.write(data)
+                write_with_statistics(resampled_data, data)
             print(f"Successfully resampled {basename(src_data.name)} to target resolution: {tgt_res}")
         else: 
             print(f"Skipping resample stage. Raster file {basename(src_data.name)} in the same resolution {src_data.res} with target's {tgt_res}")